@@ -2,7 +2,8 @@
 
 import os
 import datetime
-from typing import Dict
+from pathlib import Path
+from typing import Any, Dict
 
 
 def get_db_url() -> str:
@@ -10,6 +11,190 @@ def get_db_url() -> str:
     return os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
 
+def get_async_db_url() -> str:
+    """Получить URL базы данных для асинхронного драйвера.
+
+    Можно задать явно через ASYNC_DATABASE_URL, иначе драйвер
+    подставляется в DATABASE_URL (asyncpg для PostgreSQL, aiosqlite для SQLite).
+    """
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+
+    url = get_db_url()
+    for prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+def _get_bool_env(name: str, default: bool) -> bool:
+    """Прочитать логический флаг из переменной окружения."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_web_concurrency() -> int:
+    """Получить число воркеров uvicorn (WEB_CONCURRENCY, как у uvicorn --workers)."""
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def get_db_pool_settings() -> Dict[str, Any]:
+    """Получить настройки пула соединений для одного движка.
+
+    Бюджет соединений DB_MAX_CONNECTIONS делится между воркерами
+    и двумя пулами каждого воркера (синхронным и асинхронным):
+    половина доли — постоянные соединения, остальное — overflow.
+    DB_POOL_SIZE и DB_MAX_OVERFLOW задают размеры явно.
+    """
+    budget = int(os.getenv("DB_MAX_CONNECTIONS", "80"))
+    per_engine = max(2, budget // (get_web_concurrency() * 2))
+    pool_size = int(os.getenv("DB_POOL_SIZE", max(1, per_engine // 2)))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", max(0, per_engine - pool_size)))
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _get_bool_env("DB_POOL_PRE_PING", True),
+    }
+
+
+def get_db_statement_timeout_ms() -> int:
+    """Получить таймаут выполнения запроса в PostgreSQL, мс (0 — без таймаута)."""
+    return int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def is_pgbouncer_mode() -> bool:
+    """Подключение идёт через PgBouncer в режиме transaction pooling."""
+    return _get_bool_env("DB_PGBOUNCER", False)
+
+
+def get_candidate_pool_size() -> int:
+    """Получить максимальное число кандидатов для ранжирования моделью."""
+    return int(os.getenv("RECS_CANDIDATE_POOL", "1000"))
+
+
+def get_candidate_index_refresh_seconds() -> int:
+    """Получить период перестроения индекса кандидатов в секундах."""
+    return int(os.getenv("RECS_CANDIDATE_INDEX_REFRESH", "300"))
+
+
+def get_popularity_refresh_seconds() -> int:
+    """Получить период перестроения рейтинга популярности в секундах."""
+    return int(os.getenv("RECS_POPULARITY_REFRESH", "300"))
+
+
+def get_popularity_half_life_hours() -> float:
+    """Получить период полураспада затухающей популярности в часах."""
+    return float(os.getenv("RECS_POPULARITY_HALF_LIFE_HOURS", "168"))
+
+
+def get_cold_start_ranking() -> str:
+    """Получить рейтинг для холодного старта: weighted или decayed."""
+    return os.getenv("RECS_COLD_START_RANKING", "weighted").strip().lower()
+
+
+def get_recommendation_serving_mode() -> str:
+    """Получить режим выдачи рекомендаций по умолчанию: online или precomputed."""
+    return os.getenv("RECS_SERVING_MODE", "online").strip().lower()
+
+
+def get_precomputed_max_age_seconds() -> int:
+    """Получить срок, в течение которого предрассчитанные рекомендации свежие."""
+    return int(os.getenv("RECS_PRECOMPUTED_MAX_AGE", "86400"))
+
+
+def get_search_backend() -> str:
+    """Получить бэкенд поиска каталога: auto, memory или database.
+
+    auto — триграммный индекс в PostgreSQL, иначе инвертированный индекс в памяти.
+    """
+    return os.getenv("SEARCH_BACKEND", "auto").strip().lower()
+
+
+def get_search_index_refresh_seconds() -> int:
+    """Получить период перестроения поискового индекса в памяти в секундах."""
+    return int(os.getenv("SEARCH_INDEX_REFRESH", "300"))
+
+
+def get_stats_refresh_seconds() -> int:
+    """Получить период сверки системной статистики с таблицами в секундах."""
+    return int(os.getenv("STATS_REFRESH", "60"))
+
+
+def get_event_ingest_mode() -> str:
+    """Получить режим записи событий: sync (сразу в БД) или queue (через очередь)."""
+    return os.getenv("EVENT_INGEST_MODE", "sync").strip().lower()
+
+
+def get_event_queue_settings() -> Dict[str, Any]:
+    """Получить настройки очереди записи событий.
+
+    EVENT_QUEUE_MAX — ёмкость очереди, EVENT_FLUSH_BATCH и EVENT_FLUSH_MS —
+    запись пачкой по достижении M событий или через N мс после первого,
+    EVENT_QUEUE_TIMEOUT_MS — ожидание места в полной очереди до отказа.
+    """
+    return {
+        "max_size": int(os.getenv("EVENT_QUEUE_MAX", "10000")),
+        "batch_size": int(os.getenv("EVENT_FLUSH_BATCH", "500")),
+        "flush_ms": int(os.getenv("EVENT_FLUSH_MS", "50")),
+        "put_timeout_ms": int(os.getenv("EVENT_QUEUE_TIMEOUT_MS", "1000")),
+    }
+
+
+def get_model_registry_dir() -> Path:
+    """Получить каталог реестра версий модели."""
+    default = Path(__file__).parent / "recommend" / "models"
+    return Path(os.getenv("MODEL_REGISTRY_DIR", default))
+
+
+def get_model_registry_poll_seconds() -> int:
+    """Получить период опроса реестра моделей в секундах."""
+    return int(os.getenv("MODEL_REGISTRY_POLL", "30"))
+
+
+def get_redis_url() -> str:
+    """Получить URL Redis."""
+    return os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def get_recommendation_cache_backend() -> str:
+    """Получить бэкенд кэша рекомендаций: memory, redis или none."""
+    return os.getenv("RECS_CACHE_BACKEND", "memory").strip().lower()
+
+
+def get_recommendation_cache_ttl() -> int:
+    """Получить срок жизни закэшированных рекомендаций в секундах."""
+    return int(os.getenv("RECS_CACHE_TTL", "300"))
+
+
+def get_recommendation_cache_max_users() -> int:
+    """Получить максимум пользователей в кэше рекомендаций процесса."""
+    return int(os.getenv("RECS_CACHE_MAX_USERS", "10000"))
+
+
+def get_user_features_backend() -> str:
+    """Получить хранилище кэша признаков пользователей: memory, redis или none."""
+    return os.getenv("USER_FEATURES_BACKEND", "memory").strip().lower()
+
+
+def get_user_features_ttl() -> int:
+    """Получить срок жизни записи кэша признаков пользователя в секундах."""
+    return int(os.getenv("USER_FEATURES_TTL", "600"))
+
+
+def get_user_features_max_users() -> int:
+    """Получить максимум пользователей в кэше признаков процесса."""
+    return int(os.getenv("USER_FEATURES_MAX_USERS", "100000"))
+
+
 def get_temporal_features() -> Dict[str, int]:
     """Получить временные признаки для модели."""
     now = datetime.datetime.now()
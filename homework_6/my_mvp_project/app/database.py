@@ -3,16 +3,109 @@
 
 import os
 import asyncio
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 import logging
 
-from app.common_utils import get_db_url
+from app.common_utils import (
+    get_async_db_url,
+    get_db_pool_settings,
+    get_db_statement_timeout_ms,
+    get_db_url,
+    is_pgbouncer_mode,
+)
 
 logger = logging.getLogger(__name__)
 
+
+class PoolMetrics:
+    """Счётчики ожидания соединения из пула."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        """Учесть одно получение соединения и время ожидания."""
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущие значения счётчиков."""
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / waits * 1000, 3) if waits else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class _MeteredPoolMixin:
+    """Замер времени ожидания свободного соединения в QueuePool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    """QueuePool с метриками ожидания соединения."""
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool с метриками ожидания соединения."""
+
+
+def _postgres_connect_args(is_async: bool) -> Dict[str, Any]:
+    """Параметры подключения к PostgreSQL для psycopg2 или asyncpg.
+
+    В режиме PgBouncer (transaction pooling) соединение с сервером
+    меняется между транзакциями, поэтому asyncpg не должен кэшировать
+    подготовленные запросы, а параметры сессии не передаются при
+    подключении — PgBouncer их не принимает, statement_timeout в этом
+    случае задаётся на роли (ALTER ROLE ... SET statement_timeout).
+    """
+    if is_pgbouncer_mode():
+        if is_async:
+            return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return {}
+
+    timeout_ms = get_db_statement_timeout_ms()
+    if not timeout_ms:
+        return {}
+    if is_async:
+        return {"server_settings": {"statement_timeout": str(timeout_ms)}}
+    return {"options": f"-c statement_timeout={timeout_ms}"}
+
 # Настройка движка базы данных
 SQLALCHEMY_DATABASE_URL = get_db_url()
 
@@ -25,16 +118,52 @@ if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
         poolclass=StaticPool,
     )
 else:
-    # Для других БД (PostgreSQL, MySQL)
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    # Для других БД (PostgreSQL, MySQL): пул по числу воркеров, см. get_db_pool_settings
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        poolclass=MeteredQueuePool,
+        connect_args=_postgres_connect_args(is_async=False),
+        **get_db_pool_settings(),
+    )
 
 # Сессия для работы с БД
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для эндпоинтов чтения (asyncpg / aiosqlite)
+SQLALCHEMY_ASYNC_DATABASE_URL = get_async_db_url()
+
+if SQLALCHEMY_ASYNC_DATABASE_URL.startswith("sqlite"):
+    # Без StaticPool: конкурентные сессии не должны делить одно соединение
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL,
+        connect_args={"check_same_thread": False},
+    )
+else:
+    async_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_DATABASE_URL,
+        poolclass=MeteredAsyncQueuePool,
+        connect_args=_postgres_connect_args(is_async=True),
+        **get_db_pool_settings(),
+    )
+
+# Асинхронная сессия; объекты не истекают после commit, чтобы их можно было
+# сериализовать в ответ без повторного обращения к БД
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 # Базовый класс для моделей
 Base = declarative_base()
 
 
+def dialect_insert(db, table):
+    """INSERT с ON CONFLICT для PostgreSQL и SQLite; db — сессия или соединение."""
+    dialect = getattr(db, "dialect", None) or db.get_bind().dialect
+    if dialect.name == "postgresql":
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
 def get_db() -> Session:
     """Создание сессии базы данных."""
     db = SessionLocal()
@@ -44,6 +173,31 @@ def get_db() -> Session:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Создание асинхронной сессии базы данных."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_pool_status() -> Dict[str, Dict[str, Any]]:
+    """Состояние пулов соединений синхронного и асинхронного движков."""
+    status = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        info: Dict[str, Any] = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            info.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                checked_in=pool.checkedin(),
+            )
+        metrics = getattr(pool, "metrics", None)
+        if metrics is not None:
+            info.update(metrics.snapshot())
+        status[name] = info
+    return status
+
+
 async def init_db():
     """Инициализация базы данных."""
     from app.models import User, Item, Category, Event, ItemProperty
@@ -0,0 +1,352 @@
+"""Отложенная запись событий через очередь в памяти процесса.
+
+В режиме EVENT_INGEST_MODE=queue эндпоинты создания событий проверяют
+существование пользователя и товара (иначе 400), кладут событие
+в ограниченную очередь и сразу отвечают 202. Фоновый поток забирает
+события пачками (EVENT_FLUSH_BATCH событий или EVENT_FLUSH_MS после
+первого) и записывает их crud.create_events — одним многострочным
+INSERT и одним коммитом на пачку. События, которые база всё же
+отклонила (например, пользователь удалён после приёма), отбрасываются
+с записью в лог и учитываются в счётчике failed.
+
+Если очередь полна, запрос ждёт место EVENT_QUEUE_TIMEOUT_MS, затем
+получает 503. При остановке приложения очередь дописывается в БД.
+События в очереди теряются только при аварийном завершении процесса;
+вызывающим, которым нужен ID события, доступна синхронная запись (sync).
+
+Пакетная загрузка (POST /events/bulk) проверяет весь пакет по столбцам
+(pandas) вместо валидаторов EventCreate на каждое событие, проверяет
+существование пользователей и товаров одним запросом на пакет
+и записывает корректные строки одним INSERT; ошибки возвращаются
+по строкам, не отменяя остальной пакет.
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .models import EventTypeEnum
+from .common_utils import get_event_ingest_mode, get_event_queue_settings
+from .routers import crud
+
+
+class EventQueueFull(Exception):
+    """Очередь событий заполнена."""
+
+
+class EventReferenceNotFound(Exception):
+    """Пользователь или товар события не найден."""
+
+
+class EventIngestQueue:
+    """Ограниченная очередь событий с записью пачками в фоновом потоке."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_ms: int = 50,
+        put_timeout_ms: int = 1000,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.put_timeout = put_timeout_ms / 1000
+        self.flushed = 0
+        self.failed = 0
+        self._queue: "queue.Queue[schemas.EventCreate]" = queue.Queue(max_size)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Очередь принимает события."""
+        return self._thread is not None and self._thread.is_alive() and not self._stopping.is_set()
+
+    def start(self):
+        """Запустить поток записи."""
+        self._thread = threading.Thread(target=self._run, name="event-ingest", daemon=True)
+        self._thread.start()
+
+    def put(self, event: schemas.EventCreate):
+        """Поставить событие в очередь, подождав место не дольше put_timeout."""
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            raise EventQueueFull(f"Очередь событий заполнена ({self._queue.maxsize})")
+
+    def qsize(self) -> int:
+        """Число событий, ожидающих записи."""
+        return self._queue.qsize()
+
+    def _collect(self, wait: float) -> List[schemas.EventCreate]:
+        """Пачка событий: до batch_size или до flush_seconds после первого."""
+        try:
+            batch = [self._queue.get(timeout=wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[schemas.EventCreate]):
+        """Записать пачку; при ошибке — по одному, чтобы отбросить только плохие события."""
+        with self.session_factory() as db:
+            try:
+                self.flushed += crud.create_events(db, batch)
+                return
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Пачка из {len(batch)} событий не записана ({e}), запись по одному")
+            for event in batch:
+                try:
+                    crud.create_event(db, event)
+                    self.flushed += 1
+                except Exception as e:
+                    db.rollback()
+                    self.failed += 1
+                    logger.error(f"Событие пользователя {event.user_id} и товара {event.item_id} отброшено: {e}")
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect(wait=0.1)
+            if batch:
+                self._flush(batch)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Остановить поток и записать оставшиеся в очереди события."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        while True:
+            batch = self._collect(wait=0)
+            if not batch:
+                break
+            self._flush(batch)
+        logger.info(f"Очередь событий остановлена: записано {self.flushed}, отброшено {self.failed}.")
+
+
+_queue: Optional[EventIngestQueue] = None
+
+
+def start_event_queue(session_factory: Callable[[], Session]) -> Optional[EventIngestQueue]:
+    """Запустить очередь, если включён режим EVENT_INGEST_MODE=queue."""
+    global _queue
+    if get_event_ingest_mode() != "queue":
+        return None
+    _queue = EventIngestQueue(session_factory, **get_event_queue_settings())
+    _queue.start()
+    logger.info("Запись событий через очередь включена.")
+    return _queue
+
+
+def stop_event_queue():
+    """Остановить очередь, дописав события в БД."""
+    global _queue
+    if _queue is not None:
+        _queue.stop()
+        _queue = None
+
+
+def configure_event_queue(event_queue: Optional[EventIngestQueue]):
+    """Заменить очередь событий (используется в тестах)."""
+    global _queue
+    _queue = event_queue
+
+
+def _check_event_references(db: Session, event: schemas.EventCreate):
+    """Проверить, что пользователь и товар события существуют."""
+    if db.query(models.User.id).filter(models.User.id == event.user_id).first() is None:
+        raise EventReferenceNotFound("Пользователь не найден")
+    if db.query(models.Item.id).filter(models.Item.id == event.item_id).first() is None:
+        raise EventReferenceNotFound("Товар не найден")
+
+
+def submit_event(db: Session, event: schemas.EventCreate, sync: bool = False) -> Optional[models.Event]:
+    """Записать событие сразу (возвращает строку с ID) или поставить в очередь (None).
+
+    Событие для очереди проверяется до ответа 202: пачку с ним отклонила бы
+    база, и событие было бы отброшено уже после подтверждения приёма.
+    Время события без timestamp — момент приёма, а не записи пачки.
+    """
+    event_queue = _queue
+    if sync or event_queue is None or not event_queue.running:
+        return crud.create_event(db, event)
+    _check_event_references(db, event)
+    if event.timestamp is None:
+        event = event.model_copy(update={"timestamp": int(time.time() * 1000)})
+    event_queue.put(event)
+    return None
+
+
+def queued_response() -> JSONResponse:
+    """Ответ 202 для события, поставленного в очередь записи."""
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"detail": "Событие принято в очередь"})
+
+
+def reference_error(error: EventReferenceNotFound) -> HTTPException:
+    """Ошибка 400 для события с несуществующим пользователем или товаром."""
+    logger.warning(f"Событие не принято в очередь: {error}")
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+
+
+def queue_full_error(error: EventQueueFull) -> HTTPException:
+    """Ошибка 503 при заполненной очереди событий."""
+    logger.warning(str(error))
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Очередь событий заполнена, повторите позже",
+        headers={"Retry-After": "1"},
+    )
+
+
+# Максимум событий в одном пакетном запросе
+MAX_BULK_EVENTS = 10000
+# Допустимое опережение timestamp события, как в EventBase
+_MAX_FUTURE_MS = 86400000
+# Верхняя граница ID (Integer в PostgreSQL)
+_MAX_ID = 2**31 - 1
+# Максимум ID в одном IN (...)
+_IN_CHUNK_SIZE = 10000
+_EVENT_COLUMNS = ["user_id", "item_id", "event_type", "timestamp", "transaction_id"]
+_EVENT_TYPES = [event_type.value for event_type in EventTypeEnum]
+
+
+def parse_event_payload(body: bytes, ndjson: bool) -> Tuple[List[Any], Dict[int, str]]:
+    """Разобрать тело пакетного запроса: JSON массив или NDJSON.
+
+    Возвращает записи и ошибки разбора по номерам строк NDJSON. Тело,
+    которое не является JSON массивом, — ValueError.
+    """
+    if not ndjson:
+        records = json.loads(body)
+        if not isinstance(records, list):
+            raise ValueError("Ожидается JSON массив событий")
+        return records, {}
+
+    records: List[Any] = []
+    errors: Dict[int, str] = {}
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            errors[len(records)] = f"Некорректный JSON: {e.msg}"
+            records.append(None)
+    return records, errors
+
+
+def _existing_ids(db: Session, model, ids: np.ndarray) -> np.ndarray:
+    """ID из ids, которые есть в таблице модели."""
+    ids = np.unique(ids).tolist()
+    found: List[int] = []
+    for start in range(0, len(ids), _IN_CHUNK_SIZE):
+        found.extend(
+            row_id for (row_id,) in db.query(model.id).filter(model.id.in_(ids[start:start + _IN_CHUNK_SIZE]))
+        )
+    return np.asarray(found, dtype=np.int64)
+
+
+def validate_event_batch(
+    db: Session, records: List[Any], parse_errors: Optional[Dict[int, str]] = None
+) -> Tuple[List[dict], List[schemas.BulkEventError]]:
+    """Проверить пакет событий по столбцам.
+
+    Правила те же, что у EventCreate, плюс существование пользователя
+    и товара. Возвращает строки для crud.create_event_rows и ошибки
+    отклонённых строк (по первой нарушенной проверке).
+    """
+    now_ms = int(time.time() * 1000)
+    is_object = np.fromiter((isinstance(record, dict) for record in records), dtype=bool, count=len(records))
+    frame = pd.DataFrame.from_records(
+        [record if ok else {} for record, ok in zip(records, is_object)], columns=_EVENT_COLUMNS
+    )
+    errors = pd.Series(None, index=frame.index, dtype=object)
+
+    def reject(mask, message: str):
+        errors[np.asarray(mask) & errors.isna().to_numpy()] = message
+
+    for index, message in (parse_errors or {}).items():
+        errors[index] = message
+    reject(~is_object, "Ожидается JSON объект события")
+
+    numbers = {}
+    for column in ("user_id", "item_id", "timestamp"):
+        raw = frame[column]
+        value = pd.to_numeric(raw, errors="coerce")
+        if column != "timestamp":
+            reject(raw.isna(), f"{column}: обязательное поле")
+        reject(raw.notna() & (value.isna() | (value % 1 != 0)), f"{column}: ожидается целое число")
+        numbers[column] = value
+    for column in ("user_id", "item_id"):
+        reject(numbers[column] <= 0, f"{column}: должно быть больше 0")
+        reject(numbers[column] > _MAX_ID, f"{column}: слишком большое значение")
+    reject(numbers["timestamp"] < 0, "timestamp: не может быть отрицательной")
+    reject(numbers["timestamp"] > now_ms + _MAX_FUTURE_MS, "timestamp: более чем на 24 часа в будущем")
+
+    event_type = frame["event_type"]
+    reject(event_type.isna(), "event_type: обязательное поле")
+    reject(~event_type.isin(_EVENT_TYPES), f"event_type: ожидается одно из {', '.join(_EVENT_TYPES)}")
+    transaction_id = frame["transaction_id"]
+    reject(
+        transaction_id.notna() & ~transaction_id.map(lambda value: isinstance(value, str)),
+        "transaction_id: ожидается строка",
+    )
+
+    valid = errors.isna().to_numpy()
+    user_ids = numbers["user_id"].to_numpy()
+    item_ids = numbers["item_id"].to_numpy()
+    if valid.any():
+        # Существование пользователей и товаров — по одному запросу на пакет
+        known_users = _existing_ids(db, models.User, user_ids[valid].astype(np.int64))
+        reject(valid & ~np.isin(user_ids, known_users), "Пользователь не найден")
+        known_items = _existing_ids(db, models.Item, item_ids[valid].astype(np.int64))
+        reject(valid & ~np.isin(item_ids, known_items), "Товар не найден")
+        valid = errors.isna().to_numpy()
+
+    timestamps = numbers["timestamp"].fillna(now_ms)
+    rows = [
+        {
+            "user_id": user_id,
+            "item_id": item_id,
+            "event_type": event_type_value,
+            "timestamp": timestamp,
+            "transaction_id": transaction,
+        }
+        for user_id, item_id, event_type_value, timestamp, transaction in zip(
+            user_ids[valid].astype(np.int64).tolist(),
+            item_ids[valid].astype(np.int64).tolist(),
+            event_type[valid].tolist(),
+            timestamps[valid].astype(np.int64).tolist(),
+            transaction_id[valid].where(transaction_id[valid].notna(), None).tolist(),
+        )
+    ]
+    rejected = errors.dropna()
+    return rows, [schemas.BulkEventError(index=int(index), error=error) for index, error in rejected.items()]
+
+
+def ingest_event_batch(
+    db: Session, records: List[Any], parse_errors: Optional[Dict[int, str]] = None
+) -> schemas.BulkEventResult:
+    """Проверить пакет и записать корректные события одним INSERT."""
+    rows, errors = validate_event_batch(db, records, parse_errors)
+    accepted = crud.create_event_rows(db, rows)
+    return schemas.BulkEventResult(accepted=accepted, rejected=len(errors), errors=errors)
@@ -8,8 +8,6 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from loguru import logger
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
@@ -18,19 +16,147 @@ from sqlalchemy.exc import OperationalError, IntegrityError
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import ValidationError
 
-from .database import Base, engine, init_db as db_init_db
+from .common_utils import (
+    get_candidate_index_refresh_seconds,
+    get_model_registry_poll_seconds,
+    get_popularity_refresh_seconds,
+    get_search_index_refresh_seconds,
+    get_stats_refresh_seconds,
+)
+from .database import Base, SessionLocal, engine, get_pool_status, init_db as db_init_db
+from .ingest import start_event_queue, stop_event_queue
 from .limiter import limiter
-from .routers import analytics, catalog, categories, events, item_properties, items, recommendations, users
+from .recommend.candidates import refresh_candidate_index
+from .recommend.item_stats import ensure_item_stats
+from .recommend.popularity import refresh_leaderboard
+from .recommend.property_snapshot import ensure_item_properties_current
+from .recommend.registry import ModelValidationError, model_registry
+from .recommend.utils import is_model_ready
+from .rollups import ensure_event_rollups
+from .search import refresh_search_index
+from .stats import refresh_stats
+from .routers import admin, analytics, catalog, categories, events, export, item_properties, items, recommendations, users
+
+
+def _rebuild_candidate_index():
+    """Перестроить индекс кандидатов в отдельной сессии."""
+    with SessionLocal() as db:
+        refresh_candidate_index(db)
+
+
+async def refresh_candidate_index_periodically():
+    """Периодически перестраивать индекс кандидатов в фоне."""
+    interval = get_candidate_index_refresh_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_rebuild_candidate_index)
+        except Exception as e:
+            logger.error(f"Ошибка перестроения индекса кандидатов: {e}")
+
+
+def _rebuild_popularity():
+    """Перестроить рейтинг популярности в отдельной сессии."""
+    with SessionLocal() as db:
+        refresh_leaderboard(db)
+
+
+async def refresh_popularity_periodically():
+    """Периодически перестраивать рейтинг популярности в фоне."""
+    interval = get_popularity_refresh_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_rebuild_popularity)
+        except Exception as e:
+            logger.error(f"Ошибка перестроения рейтинга популярности: {e}")
+
+
+def _rebuild_search_index():
+    """Перестроить поисковый индекс в памяти в отдельной сессии."""
+    with SessionLocal() as db:
+        refresh_search_index(db)
+
+
+async def refresh_search_index_periodically():
+    """Периодически перестраивать поисковый индекс в фоне."""
+    interval = get_search_index_refresh_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_rebuild_search_index)
+        except Exception as e:
+            logger.error(f"Ошибка перестроения поискового индекса: {e}")
+
+
+def _rebuild_stats():
+    """Сверить системную статистику с таблицами в отдельной сессии."""
+    with SessionLocal() as db:
+        refresh_stats(db)
+
+
+async def refresh_stats_periodically():
+    """Периодически сверять системную статистику в фоне."""
+    interval = get_stats_refresh_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_rebuild_stats)
+        except Exception as e:
+            logger.error(f"Ошибка сверки системной статистики: {e}")
+
+
+async def watch_model_registry():
+    """Периодически проверять реестр моделей и подхватывать новую версию."""
+    interval = get_model_registry_poll_seconds()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(model_registry.reload_if_changed, recommendations.validate_model)
+        except Exception as e:
+            logger.error(f"Ошибка обновления модели из реестра: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Инициализация приложения."""
     logger.info("Запуск приложения...")
     await db_init_db()
-    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    with SessionLocal() as db:
+        rebuilt = ensure_item_stats(db)
+        if rebuilt:
+            logger.info(f"Статистика товаров пересчитана: {rebuilt} товаров.")
+        rebuilt = ensure_item_properties_current(db)
+        if rebuilt:
+            logger.info(f"Срез свойств товаров пересчитан: {rebuilt} строк.")
+        rebuilt = ensure_event_rollups(db)
+        if rebuilt:
+            logger.info(f"Агрегаты событий пересчитаны: {rebuilt} строк.")
+    await asyncio.to_thread(_rebuild_candidate_index)
+    await asyncio.to_thread(_rebuild_popularity)
+    await asyncio.to_thread(_rebuild_search_index)
+    await asyncio.to_thread(_rebuild_stats)
+    try:
+        await asyncio.to_thread(recommendations.preload_model)
+    except FileNotFoundError:
+        logger.warning("Модель рекомендаций не найдена, сервис не будет готов к рекомендациям.")
+    except ModelValidationError as e:
+        logger.error(f"Модель не прошла проверку при старте: {e}")
+    start_event_queue(SessionLocal)
+    background_tasks = [
+        asyncio.create_task(refresh_candidate_index_periodically()),
+        asyncio.create_task(refresh_popularity_periodically()),
+        asyncio.create_task(refresh_search_index_periodically()),
+        asyncio.create_task(refresh_stats_periodically()),
+        asyncio.create_task(watch_model_registry()),
+    ]
     logger.info("Сервис успешно запущен.")
     yield
     logger.info("Остановка приложения...")
+    for task in background_tasks:
+        task.cancel()
+    # События из очереди дописываются в БД до остановки
+    await asyncio.to_thread(stop_event_queue)
 
 
 app = FastAPI(
@@ -103,7 +229,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         status_code=exc.status_code,
         content={
             "detail": exc.detail
-        }
+        },
+        headers=exc.headers,
     )
 
 @app.exception_handler(Exception)
@@ -131,6 +258,8 @@ app.include_router(events.router)
 app.include_router(recommendations.router)
 app.include_router(analytics.router)
 app.include_router(catalog.router)
+app.include_router(admin.router)
+app.include_router(export.router)
 
 
 async def init_db():
@@ -167,20 +296,27 @@ async def root(request: Request):
     return FileResponse("app/static/index.html")
 
 
+def _check_database() -> None:
+    """Проверить соединение с БД."""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
 @app.get("/health", tags=["System"])
 @limiter.limit("100/minute")
 async def health_check(request: Request):
     """Проверка работоспособности сервиса."""
     try:
         # Проверяем БД
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        _check_database()
 
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "status": "healthy",
                 "database": "connected",
+                "model": "ready" if is_model_ready() else "not_ready",
+                "ready": is_model_ready(),
                 "version": app.version,
             },
         )
@@ -190,11 +326,44 @@ async def health_check(request: Request):
             content={
                 "status": "unhealthy",
                 "database": "disconnected",
+                "ready": False,
                 "error": str(e),
             },
         )
 
 
+@app.get("/health/live", tags=["System"])
+async def liveness_check():
+    """Проверка живости процесса (без обращения к БД и модели)."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", tags=["System"])
+async def readiness_check():
+    """Готовность принимать трафик: БД доступна, модель загружена и прогрета."""
+    try:
+        _check_database()
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ready": False, "database": "disconnected", "error": str(e)},
+        )
+
+    if not is_model_ready():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ready": False, "database": "connected", "model": "not_ready"},
+        )
+
+    return {"ready": True, "database": "connected", "model": "ready"}
+
+
+@app.get("/health/db", tags=["System"])
+async def database_pool_status():
+    """Состояние пулов соединений: занятые соединения и время ожидания."""
+    return get_pool_status()
+
+
 @app.get("/version", tags=["System"])
 @limiter.limit("100/minute")
 async def get_version(request: Request):
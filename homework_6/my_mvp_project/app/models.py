@@ -8,12 +8,14 @@ from sqlalchemy import (
     String,
     Column,
     Integer,
+    SmallInteger,
     ForeignKey,
     Index,
     Text,
     Float,
     CheckConstraint,
 )
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -117,5 +119,156 @@ class Event(Base):
     __table_args__ = (
         Index("ix_events_user_id_event", "user_id", "event_type"),
         Index("ix_events_item_id_event", "item_id", "event_type"),
+        # Ключ курсорной пагинации списка событий
+        Index("ix_events_timestamp_id", "timestamp", "id"),
         CheckConstraint('timestamp >= 0', name='check_event_timestamp_positive'),
     )
+
+
+class ItemPropertyCurrent(Base):
+    """Последнее значение каждого свойства товара.
+
+    Срез журнала item_properties: по одной строке на пару (товар, свойство)
+    с самым поздним timestamp. Обновляется из CRUD операций со свойствами
+    и полностью пересчитывается после массовой загрузки.
+    """
+    __tablename__ = "item_properties_current"
+    item_id = Column(
+        Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True
+    )
+    property = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    timestamp = Column(BigInteger, nullable=False)
+    # Строка item_properties, из которой взято значение
+    property_id = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_item_properties_current_property", "property"),
+        # Триграммные GIN индексы для поиска каталога (только PostgreSQL)
+        Index(
+            "ix_item_properties_current_value_trgm",
+            "value",
+            postgresql_using="gin",
+            postgresql_ops={"value": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_item_properties_current_property_trgm",
+            "property",
+            postgresql_using="gin",
+            postgresql_ops={"property": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+class ItemStats(Base):
+    """Предрассчитанная статистика товара для рекомендательной модели.
+
+    Обновляется инкрементально при создании и удалении событий,
+    поэтому на пути запроса не требуется агрегация по таблице events.
+    """
+    __tablename__ = "item_stats"
+    item_id = Column(
+        Integer, ForeignKey("items.id", ondelete="CASCADE"), primary_key=True
+    )
+    item_n_view = Column(Integer, nullable=False, default=0)
+    item_n_cart = Column(Integer, nullable=False, default=0)
+    item_n_buy = Column(Integer, nullable=False, default=0)
+    item_n_unique_users = Column(Integer, nullable=False, default=0)
+
+
+class UserRecommendation(Base):
+    """Предрассчитанные рекомендации пользователя.
+
+    Заполняется офлайн-заданием scripts/precompute_recommendations.py.
+    Список устарел, если отметка событий пользователя изменилась.
+    """
+    __tablename__ = "user_recommendations"
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    # JSON список рекомендаций [{"id", "name", "score"}] по убыванию score
+    items = Column(Text, nullable=False)
+    top_n = Column(Integer, nullable=False)
+    model_version = Column(String, nullable=False)
+    # Время расчёта в миллисекундах, как у событий
+    generated_at = Column(BigInteger, nullable=False, index=True)
+    # Отметка событий пользователя до расчёта (precomputed.event_watermarks)
+    events_watermark = Column(String, nullable=False, default="")
+
+
+class IngestCheckpoint(Base):
+    """Отметка загрузки файла данных скриптом scripts/populate_db.py.
+
+    Строки файла до byte_offset уже загружены: при инкрементальной
+    загрузке чтение продолжается с этого места. Отметка обновляется
+    в одной транзакции с пачкой данных.
+    """
+    __tablename__ = "ingest_checkpoints"
+    # Имя файла без каталога
+    source = Column(String, primary_key=True)
+    byte_offset = Column(BigInteger, nullable=False, default=0)
+    # Максимальный timestamp загруженных строк
+    max_timestamp = Column(BigInteger, nullable=True)
+    rows_loaded = Column(BigInteger, nullable=False, default=0)
+    # Время обновления в миллисекундах, как у событий
+    updated_at = Column(BigInteger, nullable=False)
+
+
+class EventRollupItem(Base):
+    """Число событий товара по типу за час или за сутки.
+
+    Таблицы event_rollups_* обновляются в одной транзакции с событиями
+    и пересчитываются скриптом scripts/backfill_rollups.py. bucket —
+    начало интервала в миллисекундах, как timestamp событий. Внешних
+    ключей нет: агрегаты переживают удаление товаров и пользователей.
+    """
+    __tablename__ = "event_rollups_item"
+    granularity = Column(String, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    n_events = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # Ряд одного товара
+        Index("ix_event_rollups_item_item", "item_id", "granularity", "bucket"),
+    )
+
+
+class EventRollupUser(Base):
+    """Число событий пользователя по типу за час или за сутки."""
+    __tablename__ = "event_rollups_user"
+    granularity = Column(String, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    n_events = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # Ряд одного пользователя
+        Index("ix_event_rollups_user_user", "user_id", "granularity", "bucket"),
+    )
+
+
+class EventRollupType(Base):
+    """Число событий каждого типа за час или за сутки.
+
+    Счётчик интервала разбит на rollups.TYPE_ROLLUP_SHARDS строк (shard): каждая
+    транзакция с событиями пишет в случайную, и конкурентные записи
+    не ждут одну «горячую» строку. Число событий — сумма по шардам,
+    значение отдельного шарда может быть отрицательным.
+    """
+    __tablename__ = "event_rollups_type"
+    granularity = Column(String, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0, server_default="0")
+    n_events = Column(BigInteger, nullable=False, default=0)
+
+
+# Расширение для триграммных индексов поиска создаётся до таблиц
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,73 @@
+"""Keyset (курсорная) пагинация списков.
+
+Вместо OFFSET следующая страница выбирается условием «после последней
+строки предыдущей страницы» по упорядоченному ключу: (id) или
+(timestamp, id). Глубина страницы не влияет на время запроса.
+
+Курсор непрозрачен для клиента: это base64 от JSON с названием списка
+и значениями ключа последней строки. Пустой курсор означает первую
+страницу, следующий курсор возвращается в заголовке X-Next-Cursor
+(или в поле next_cursor для ответов-объектов).
+"""
+
+import base64
+import json
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(kind: str, values: Sequence[Any]) -> str:
+    """Закодировать ключ последней строки страницы."""
+    payload = json.dumps({"k": kind, "v": list(values)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, cursor: Optional[str], size: int) -> Optional[tuple]:
+    """Раскодировать курсор списка kind: ключ из size значений.
+
+    Пустой курсор — первая страница (None). Чужой или повреждённый
+    курсор, в том числе с нечисловыми значениями ключа, — ошибка 400.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = payload["v"]
+        if payload["k"] != kind or not isinstance(values, list) or len(values) != size:
+            raise ValueError(cursor)
+        # Все ключи списков — числа (id, timestamp, оценка релевантности)
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            raise ValueError(cursor)
+        return tuple(values)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор")
+
+
+def after(columns: Sequence[Any], values: Optional[tuple]):
+    """Условие «строго после ключа values» для упорядоченных по columns строк."""
+    if values is None:
+        return None
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return tuple_(*columns) > tuple_(*values)
+
+
+def next_cursor(kind: str, rows: Sequence[Any], has_more: bool, key) -> Optional[str]:
+    """Курсор следующей страницы или None, если страница последняя.
+
+    key — функция, возвращающая значения ключа строки.
+    """
+    if not has_more or not rows:
+        return None
+    return encode_cursor(kind, key(rows[-1]))
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]):
+    """Передать курсор следующей страницы в заголовке ответа."""
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
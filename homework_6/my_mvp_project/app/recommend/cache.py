@@ -0,0 +1,287 @@
+"""Кэш готовых рекомендаций.
+
+Рекомендации пользователя хранятся в пространстве имён этого пользователя
+с полем (top_k, версия модели, временной бакет), поэтому новое событие
+пользователя сбрасывает все его варианты одной операцией. Результаты
+холодного старта не зависят от пользователя и хранятся в общем
+пространстве имён для всех пользователей без истории.
+
+Сброс пространства имён увеличивает его поколение. Рекомендации
+записываются, только если поколение не изменилось с начала их расчёта:
+иначе запрос, начатый до нового события, записал бы устаревший
+результат на весь срок жизни.
+
+Бэкенды:
+- LRUCacheBackend — в памяти процесса, для разработки и одного воркера;
+- RedisCacheBackend — общий для всех воркеров.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from ..common_utils import (
+    get_recommendation_cache_backend,
+    get_recommendation_cache_max_users,
+    get_recommendation_cache_ttl,
+    get_redis_url,
+)
+from ..schemas import RecommendedItems
+
+COLD_START_NAMESPACE = "recs:cold"
+_USER_NAMESPACE = "recs:user:{user_id}"
+_GENERATION_KEY = "recs:gen:{namespace}"
+# Поколение живёт дольше любого расчёта рекомендаций
+_GENERATION_TTL = 3600
+
+# Записать поле, если поколение пространства имён не изменилось
+_SET_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+class LRUCacheBackend:
+    """Кэш в памяти процесса с вытеснением давно не используемых пространств имён."""
+
+    def __init__(self, max_namespaces: int = 10000):
+        self.max_namespaces = max_namespaces
+        self._data: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+        # Поколения недавно сброшенных пространств имён (отсутствует — 0)
+        self._generations: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, field: str) -> Optional[bytes]:
+        """Прочитать значение поля."""
+        with self._lock:
+            fields = self._data.get(namespace)
+            if fields is None:
+                return None
+            self._data.move_to_end(namespace)
+            return fields.get(field)
+
+    def generation(self, namespace: str) -> int:
+        """Текущее поколение пространства имён."""
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def set(self, namespace: str, field: str, value: bytes, ttl: int, generation: Optional[int] = None) -> bool:
+        """Записать значение поля, если поколение не изменилось.
+
+        Срок жизни проверяется уровнем выше.
+        """
+        with self._lock:
+            if generation is not None and self._generations.get(namespace, 0) != generation:
+                return False
+            self._data.setdefault(namespace, {})[field] = value
+            self._data.move_to_end(namespace)
+            while len(self._data) > self.max_namespaces:
+                self._data.popitem(last=False)
+            return True
+
+    def delete(self, namespace: str):
+        """Удалить пространство имён целиком и увеличить его поколение."""
+        with self._lock:
+            self._data.pop(namespace, None)
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._generations.move_to_end(namespace)
+            while len(self._generations) > self.max_namespaces:
+                self._generations.popitem(last=False)
+
+    def clear(self):
+        """Очистить кэш."""
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+
+
+class RedisCacheBackend:
+    """Общий кэш в Redis: пространство имён — hash, поле — вариант запроса."""
+
+    def __init__(self, client, prefix: str = "mvp:"):
+        self.client = client
+        self.prefix = prefix
+        self._set_if_generation = client.register_script(_SET_IF_GENERATION_SCRIPT)
+
+    def _generation_key(self, namespace: str) -> str:
+        return self.prefix + _GENERATION_KEY.format(namespace=namespace)
+
+    def get(self, namespace: str, field: str) -> Optional[bytes]:
+        """Прочитать значение поля."""
+        return self.client.hget(self.prefix + namespace, field)
+
+    def generation(self, namespace: str) -> int:
+        """Текущее поколение пространства имён."""
+        return int(self.client.get(self._generation_key(namespace)) or 0)
+
+    def set(self, namespace: str, field: str, value: bytes, ttl: int, generation: Optional[int] = None) -> bool:
+        """Записать значение поля и продлить срок жизни пространства имён.
+
+        С generation запись и проверка поколения выполняются атомарно.
+        """
+        key = self.prefix + namespace
+        if generation is not None:
+            keys = [key, self._generation_key(namespace)]
+            return bool(self._set_if_generation(keys=keys, args=[generation, field, value, ttl]))
+        pipe = self.client.pipeline()
+        pipe.hset(key, field, value)
+        pipe.expire(key, ttl)
+        pipe.execute()
+        return True
+
+    def delete(self, namespace: str):
+        """Удалить пространство имён целиком и увеличить его поколение."""
+        generation_key = self._generation_key(namespace)
+        pipe = self.client.pipeline()
+        pipe.delete(self.prefix + namespace)
+        pipe.incr(generation_key)
+        pipe.expire(generation_key, _GENERATION_TTL)
+        pipe.execute()
+
+    def clear(self):
+        """Удалить все ключи кэша рекомендаций."""
+        keys = list(self.client.scan_iter(match=f"{self.prefix}recs:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def temporal_bucket(temporal_features: Dict[str, int]) -> str:
+    """Временной бакет: рекомендации зависят только от этих признаков."""
+    return f"w{temporal_features['is_weekend']}e{temporal_features['is_evening']}"
+
+
+class RecommendationCache:
+    """Кэш рекомендаций поверх бэкенда с проверкой срока жизни записей.
+
+    Срок жизни хранится в самой записи: в Redis TTL продлевается
+    на всё пространство имён, а не на отдельное поле.
+    """
+
+    def __init__(self, backend, ttl: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _get(self, namespace: str, field: str) -> Optional[RecommendedItems]:
+        try:
+            raw = self.backend.get(namespace, field)
+        except Exception as e:
+            logger.warning(f"Кэш рекомендаций недоступен: {e}")
+            return None
+        if raw is None:
+            return None
+        expires_at, _, payload = bytes(raw).partition(b"|")
+        if float(expires_at) < time.time():
+            return None
+        return RecommendedItems.model_validate_json(payload)
+
+    def _set(
+        self, namespace: str, field: str, recommendations: RecommendedItems, generation: Optional[int] = None
+    ):
+        value = f"{time.time() + self.ttl:.3f}|".encode() + recommendations.model_dump_json().encode()
+        try:
+            if not self.backend.set(namespace, field, value, self.ttl, generation=generation):
+                logger.info(f"Рекомендации {namespace} не записаны в кэш: события изменились во время расчёта")
+        except Exception as e:
+            logger.warning(f"Не удалось записать рекомендации в кэш: {e}")
+
+    @staticmethod
+    def _user_key(user_id: int, top_k: int, model_version: str, bucket: str) -> Tuple[str, str]:
+        return _USER_NAMESPACE.format(user_id=user_id), f"{top_k}:{model_version}:{bucket}"
+
+    def get_user(self, user_id: int, top_k: int, model_version: str, bucket: str) -> Optional[RecommendedItems]:
+        """Рекомендации пользователя из кэша."""
+        return self._get(*self._user_key(user_id, top_k, model_version, bucket))
+
+    def user_generation(self, user_id: int) -> Optional[int]:
+        """Поколение кэша пользователя: читается до расчёта рекомендаций."""
+        try:
+            return self.backend.generation(_USER_NAMESPACE.format(user_id=user_id))
+        except Exception as e:
+            logger.warning(f"Кэш рекомендаций недоступен: {e}")
+            return None
+
+    def set_user(
+        self,
+        user_id: int,
+        top_k: int,
+        model_version: str,
+        bucket: str,
+        recommendations: RecommendedItems,
+        generation: Optional[int] = None,
+    ):
+        """Сохранить рекомендации пользователя.
+
+        generation — результат user_generation() до расчёта: если кэш
+        пользователя с тех пор сброшен, рекомендации не записываются.
+        """
+        self._set(*self._user_key(user_id, top_k, model_version, bucket), recommendations, generation)
+
+    def get_cold_start(self, top_k: int, bucket: str) -> Optional[RecommendedItems]:
+        """Общие рекомендации холодного старта из кэша."""
+        return self._get(COLD_START_NAMESPACE, f"{top_k}:{bucket}")
+
+    def set_cold_start(self, top_k: int, bucket: str, recommendations: RecommendedItems):
+        """Сохранить общие рекомендации холодного старта."""
+        self._set(COLD_START_NAMESPACE, f"{top_k}:{bucket}", recommendations)
+
+    def invalidate_user(self, user_id: int):
+        """Сбросить все закэшированные рекомендации пользователя."""
+        try:
+            self.backend.delete(_USER_NAMESPACE.format(user_id=user_id))
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить кэш рекомендаций пользователя {user_id}: {e}")
+
+    def clear(self):
+        """Очистить кэш (используется в тестах)."""
+        self.backend.clear()
+
+
+def _create_backend():
+    """Создать бэкенд по RECS_CACHE_BACKEND (memory, redis или none)."""
+    backend = get_recommendation_cache_backend()
+    if backend == "none":
+        return None
+    if backend == "redis":
+        import redis
+
+        return RedisCacheBackend(redis.Redis.from_url(get_redis_url()))
+    return LRUCacheBackend(get_recommendation_cache_max_users())
+
+
+_cache: Optional[RecommendationCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def get_recommendation_cache() -> Optional[RecommendationCache]:
+    """Кэш рекомендаций процесса или None, если кэш выключен."""
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                backend = _create_backend()
+                _cache = RecommendationCache(backend, get_recommendation_cache_ttl()) if backend else None
+                _cache_configured = True
+    return _cache
+
+
+def configure_recommendation_cache(cache: Optional[RecommendationCache]):
+    """Заменить кэш рекомендаций (используется в тестах)."""
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = cache
+        _cache_configured = True
+
+
+def invalidate_user(user_id: int):
+    """Сбросить кэш рекомендаций пользователя после изменения его событий."""
+    cache = get_recommendation_cache()
+    if cache is not None:
+        cache.invalidate_user(user_id)
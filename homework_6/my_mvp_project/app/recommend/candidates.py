@@ -0,0 +1,186 @@
+"""Индекс для отбора кандидатов в рекомендации.
+
+Индекс строится по таблице events и хранится в памяти процесса:
+- товары, упорядоченные по взвешенной популярности (покупка > корзина > просмотр);
+- совместная встречаемость «просмотрел X — добавил в корзину или купил Y»;
+- множества уже просмотренных товаров для каждого пользователя.
+
+Отбор кандидатов не обращается к БД и возвращает ограниченный,
+упорядоченный по релевантности список товаров.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from ..common_utils import get_candidate_pool_size
+from ..models import Event, Item
+
+# Веса событий для популярности (совпадают с холодным стартом)
+EVENT_WEIGHTS = {"transaction": 3, "addtocart": 2, "view": 1}
+# События, которые считаются «конверсией» для совместной встречаемости
+CONVERSION_EVENTS = {"addtocart", "transaction"}
+# Ограничения, чтобы построение индекса не зависело от «тяжёлых» пользователей
+MAX_ITEMS_PER_USER = 50
+MAX_NEIGHBOURS = 20
+# Максимум ID в одном IN (...)
+_IN_CHUNK_SIZE = 10000
+
+
+class CandidateIndex:
+    """Индекс популярности и совместной встречаемости товаров."""
+
+    def __init__(
+        self,
+        popular_items: np.ndarray,
+        neighbours: Dict[int, np.ndarray],
+        seen: Dict[int, Set[int]],
+    ):
+        self.popular_items = popular_items
+        self.neighbours = neighbours
+        self.seen = seen
+        # record_event вызывается из обработчиков событий параллельно с отбором
+        self._seen_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> "CandidateIndex":
+        """Построить индекс по всем событиям и товарам."""
+        started = time.perf_counter()
+        popularity: Counter = Counter()
+        seen: Dict[int, Set[int]] = defaultdict(set)
+        viewed: Dict[int, List[int]] = defaultdict(list)
+        converted: Dict[int, List[int]] = defaultdict(list)
+
+        rows = db.query(Event.user_id, Event.item_id, Event.event_type).yield_per(10000)
+        for user_id, item_id, event_type in rows:
+            popularity[item_id] += EVENT_WEIGHTS.get(event_type, 0)
+            seen[user_id].add(item_id)
+            if event_type == "view":
+                viewed[user_id].append(item_id)
+            elif event_type in CONVERSION_EVENTS:
+                converted[user_id].append(item_id)
+
+        # Совместная встречаемость: просмотр X -> конверсия Y
+        cooccurrence: Dict[int, Counter] = defaultdict(Counter)
+        for user_id, bought in converted.items():
+            views = viewed.get(user_id)
+            if not views:
+                continue
+            views = list(dict.fromkeys(views))[-MAX_ITEMS_PER_USER:]
+            bought = list(dict.fromkeys(bought))[-MAX_ITEMS_PER_USER:]
+            for x in views:
+                counter = cooccurrence[x]
+                for y in bought:
+                    if x != y:
+                        counter[y] += 1
+
+        neighbours = {
+            item_id: np.array([y for y, _ in counter.most_common(MAX_NEIGHBOURS)], dtype=np.int64)
+            for item_id, counter in cooccurrence.items()
+        }
+
+        # Товары без событий идут в конце, чтобы любой товар мог стать кандидатом
+        ranked = [item_id for item_id, _ in sorted(popularity.items(), key=lambda x: (-x[1], x[0]))]
+        ranked_set = set(ranked)
+        rest = [item_id for (item_id,) in db.query(Item.id).order_by(Item.id) if item_id not in ranked_set]
+        popular_items = np.array(ranked + rest, dtype=np.int64)
+
+        index = cls(popular_items, neighbours, dict(seen))
+        logger.info(
+            f"Индекс кандидатов построен за {time.perf_counter() - started:.2f}s: "
+            f"{len(popular_items)} товаров, {len(neighbours)} товаров с соседями, "
+            f"{len(index.seen)} пользователей."
+        )
+        return index
+
+    def record_event(self, user_id: int, item_id: int):
+        """Отметить товар как просмотренный пользователем."""
+        with self._seen_lock:
+            self.seen.setdefault(user_id, set()).add(item_id)
+
+    def reload_seen(self, db: Session, user_ids: List[int]):
+        """Перечитать из БД просмотренные товары пользователей.
+
+        Нужно процессам, которые не получают record_event (например, воркерам
+        офлайн-расчёта с индексом, унаследованным от родителя).
+        """
+        seen: Dict[int, Set[int]] = {user_id: set() for user_id in user_ids}
+        for start in range(0, len(user_ids), _IN_CHUNK_SIZE):
+            chunk = user_ids[start:start + _IN_CHUNK_SIZE]
+            for user_id, item_id in db.query(Event.user_id, Event.item_id).filter(Event.user_id.in_(chunk)):
+                seen[user_id].add(item_id)
+        with self._seen_lock:
+            for user_id, items in seen.items():
+                if items:
+                    self.seen[user_id] = items
+                else:
+                    self.seen.pop(user_id, None)
+
+    def candidates(self, user_id: int, pool_size: Optional[int] = None) -> List[int]:
+        """Отобрать кандидатов для пользователя, исключая уже виденные товары.
+
+        Сначала идут товары, связанные с историей пользователя через
+        совместную встречаемость, затем — самые популярные товары.
+        """
+        pool_size = pool_size or get_candidate_pool_size()
+        # Снимок: множество пользователя может пополниться во время отбора
+        with self._seen_lock:
+            seen = frozenset(self.seen.get(user_id, ()))
+
+        related: Counter = Counter()
+        for item_id in seen:
+            for rank, neighbour in enumerate(self.neighbours.get(item_id, ())):
+                # Чем выше сосед в списке, тем больше его вклад
+                related[int(neighbour)] += MAX_NEIGHBOURS - rank
+        result = [
+            item_id
+            for item_id, _ in sorted(related.items(), key=lambda x: (-x[1], x[0]))
+            if item_id not in seen
+        ][:pool_size]
+
+        if len(result) < pool_size:
+            excluded = np.fromiter(seen.union(result), dtype=np.int64)
+            head = self.popular_items[: pool_size + len(excluded)]
+            popular = head[~np.isin(head, excluded)][: pool_size - len(result)]
+            result.extend(popular.tolist())
+
+        return result
+
+
+_index: Optional[CandidateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_candidate_index(db: Session) -> CandidateIndex:
+    """Получить индекс кандидатов, построив его при первом обращении."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = CandidateIndex.build(db)
+    return _index
+
+
+def refresh_candidate_index(db: Session) -> CandidateIndex:
+    """Перестроить индекс и атомарно заменить текущий."""
+    global _index
+    index = CandidateIndex.build(db)
+    _index = index
+    return index
+
+
+def record_event(user_id: int, item_id: int):
+    """Учесть новое событие в уже построенном индексе."""
+    if _index is not None:
+        _index.record_event(user_id, item_id)
+
+
+def reset_candidate_index():
+    """Сбросить индекс (используется в тестах)."""
+    global _index
+    _index = None
@@ -0,0 +1,299 @@
+"""Хранилище предрассчитанных признаков товаров.
+
+Таблица item_stats содержит счётчики item_n_view, item_n_cart, item_n_buy
+и item_n_unique_users. Она обновляется инкрементально из CRUD операций
+с событиями и полностью пересчитывается после массовой загрузки данных.
+"""
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+from sqlalchemy import bindparam, case, func, select
+from sqlalchemy.orm import Session
+
+from ..database import dialect_insert
+from ..models import Event, ItemStats
+
+ITEM_FEATURE_COLS = [
+    "item_n_view",
+    "item_n_cart",
+    "item_n_buy",
+    "item_n_unique_users",
+]
+
+# Максимум ID в одном IN (...): лимит параметров SQLite и размер запроса
+_IN_CHUNK_SIZE = 10000
+
+# Соответствие типа события счётчику товара
+_EVENT_TYPE_COLUMNS = {
+    "view": "item_n_view",
+    "addtocart": "item_n_cart",
+    "transaction": "item_n_buy",
+}
+
+
+def _event_type_value(event_type) -> str:
+    """Привести тип события (строку или EventTypeEnum) к строке."""
+    return getattr(event_type, "value", event_type)
+
+
+def _apply_deltas(db: Session, item_id: int, deltas: Dict[str, int]):
+    """Атомарно изменить счётчики товара, создав строку при необходимости."""
+    _apply_deltas_bulk(db, {item_id: deltas})
+
+
+def _apply_deltas_bulk(db: Session, deltas: Dict[int, Dict[str, int]]):
+    """Изменить счётчики многих товаров одним upsert'ом через executemany.
+
+    Новая строка получает неотрицательные значения, существующая —
+    прибавку к счётчикам. Строки идут по возрастанию item_id, чтобы
+    конкурентные транзакции блокировали их в одном порядке.
+    """
+    rows = []
+    for item_id in sorted(deltas):
+        item_deltas = {col: deltas[item_id].get(col, 0) for col in ITEM_FEATURE_COLS}
+        if not any(item_deltas.values()):
+            continue
+        row = {"key": item_id, **item_deltas}
+        row.update({f"new_{col}": max(delta, 0) for col, delta in item_deltas.items()})
+        rows.append(row)
+    if not rows:
+        return
+
+    table = ItemStats.__table__
+    stmt = dialect_insert(db, table).values(
+        item_id=bindparam("key"), **{col: bindparam(f"new_{col}") for col in ITEM_FEATURE_COLS}
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["item_id"],
+        set_={col: table.c[col] + bindparam(col) for col in ITEM_FEATURE_COLS},
+    )
+    db.execute(stmt, rows)
+
+
+def _lock_items(db: Session, item_ids: Iterable[int]):
+    """Заблокировать строки статистики товаров до конца транзакции.
+
+    Отсутствующие строки создаются нулевыми. Пока блокировка держится,
+    конкурентная транзакция с событиями тех же товаров ждёт коммита,
+    поэтому проверка первого взаимодействия видит её события.
+    """
+    item_ids = sorted(set(item_ids))
+    if not item_ids:
+        return
+    table = ItemStats.__table__
+    stmt = dialect_insert(db, table).on_conflict_do_nothing(index_elements=["item_id"])
+    db.execute(stmt, [{"item_id": item_id, **dict.fromkeys(ITEM_FEATURE_COLS, 0)} for item_id in item_ids])
+    for start in range(0, len(item_ids), _IN_CHUNK_SIZE):
+        db.execute(
+            select(table.c.item_id)
+            .where(table.c.item_id.in_(item_ids[start:start + _IN_CHUNK_SIZE]))
+            .order_by(table.c.item_id)
+            .with_for_update()
+        ).all()
+
+
+def _count_pair_events(db: Session, user_id: int, item_id: int, limit: int) -> int:
+    """Посчитать события пары пользователь/товар (не больше limit)."""
+    rows = (
+        db.query(Event.id)
+        .filter(Event.user_id == user_id, Event.item_id == item_id)
+        .limit(limit)
+        .all()
+    )
+    return len(rows)
+
+
+def record_event_created(db: Session, user_id: int, item_id: int, event_type):
+    """Учесть новое событие в статистике товара.
+
+    Вызывается до добавления события в сессию, чтобы корректно
+    определить первое взаимодействие пользователя с товаром.
+    """
+    deltas = {}
+    column = _EVENT_TYPE_COLUMNS.get(_event_type_value(event_type))
+    if column:
+        deltas[column] = 1
+    _lock_items(db, [item_id])
+    if _count_pair_events(db, user_id, item_id, limit=1) == 0:
+        deltas["item_n_unique_users"] = 1
+    _apply_deltas(db, item_id, deltas)
+
+
+def record_events_created(db: Session, events: Iterable[tuple]):
+    """Учесть пачку новых событий (user_id, item_id, event_type).
+
+    Вызывается до добавления событий в сессию. Первые взаимодействия
+    пар пользователь/товар определяются одним запросом на пачку.
+    """
+    events = list(events)
+    if not events:
+        return
+    pairs = {(user_id, item_id) for user_id, item_id, _ in events}
+    user_ids = sorted({user_id for user_id, _ in pairs})
+    item_ids = sorted({item_id for _, item_id in pairs})
+    _lock_items(db, item_ids)
+    known = set()
+    for user_start in range(0, len(user_ids), _IN_CHUNK_SIZE):
+        user_chunk = user_ids[user_start:user_start + _IN_CHUNK_SIZE]
+        for item_start in range(0, len(item_ids), _IN_CHUNK_SIZE):
+            rows = (
+                db.query(Event.user_id, Event.item_id)
+                .filter(
+                    Event.user_id.in_(user_chunk),
+                    Event.item_id.in_(item_ids[item_start:item_start + _IN_CHUNK_SIZE]),
+                )
+                .distinct()
+            )
+            known.update((user_id, item_id) for user_id, item_id in rows if (user_id, item_id) in pairs)
+
+    deltas: Dict[int, Dict[str, int]] = {}
+    for user_id, item_id, event_type in events:
+        item_deltas = deltas.setdefault(item_id, {})
+        column = _EVENT_TYPE_COLUMNS.get(_event_type_value(event_type))
+        if column:
+            item_deltas[column] = item_deltas.get(column, 0) + 1
+        if (user_id, item_id) not in known:
+            known.add((user_id, item_id))
+            item_deltas["item_n_unique_users"] = item_deltas.get("item_n_unique_users", 0) + 1
+    _apply_deltas_bulk(db, deltas)
+
+
+def record_event_deleted(db: Session, user_id: int, item_id: int, event_type):
+    """Учесть удаление события. Вызывается до удаления строки из БД."""
+    deltas = {}
+    column = _EVENT_TYPE_COLUMNS.get(_event_type_value(event_type))
+    if column:
+        deltas[column] = -1
+    _lock_items(db, [item_id])
+    # Удаляемое событие было единственным для пары пользователь/товар
+    if _count_pair_events(db, user_id, item_id, limit=2) == 1:
+        deltas["item_n_unique_users"] = -1
+    _apply_deltas(db, item_id, deltas)
+
+
+def record_event_type_changed(db: Session, item_id: int, old_type, new_type):
+    """Перенести событие товара из одного счётчика в другой."""
+    deltas: Dict[str, int] = {}
+    old_column = _EVENT_TYPE_COLUMNS.get(_event_type_value(old_type))
+    new_column = _EVENT_TYPE_COLUMNS.get(_event_type_value(new_type))
+    if old_column == new_column:
+        return
+    if old_column:
+        deltas[old_column] = deltas.get(old_column, 0) - 1
+    if new_column:
+        deltas[new_column] = deltas.get(new_column, 0) + 1
+    _apply_deltas(db, item_id, deltas)
+
+
+def get_item_stats(db: Session, item_ids: Iterable[int]) -> Dict[int, dict]:
+    """Прочитать предрассчитанные признаки товаров (без агрегации).
+
+    Товары без статистики получают нулевые значения.
+    """
+    item_ids = list(item_ids)
+    rows = (
+        db.query(
+            ItemStats.item_id,
+            ItemStats.item_n_view,
+            ItemStats.item_n_cart,
+            ItemStats.item_n_buy,
+            ItemStats.item_n_unique_users,
+        )
+        .filter(ItemStats.item_id.in_(item_ids))
+        .all()
+    )
+
+    features_map = {item_id: dict.fromkeys(ITEM_FEATURE_COLS, 0) for item_id in item_ids}
+    for row in rows:
+        features_map[row.item_id] = {
+            "item_n_view": row.item_n_view,
+            "item_n_cart": row.item_n_cart,
+            "item_n_buy": row.item_n_buy,
+            "item_n_unique_users": row.item_n_unique_users,
+        }
+    return features_map
+
+
+def get_item_feature_matrix(db: Session, item_ids: Iterable[int]) -> np.ndarray:
+    """Прочитать признаки товаров матрицей (len(item_ids), 4) в порядке item_ids.
+
+    Столбцы идут в порядке ITEM_FEATURE_COLS, товары без статистики
+    получают нулевую строку.
+    """
+    item_ids = np.asarray(list(item_ids), dtype=np.int64)
+    matrix = np.zeros((len(item_ids), len(ITEM_FEATURE_COLS)), dtype=np.float32)
+    if len(item_ids) == 0:
+        return matrix
+
+    rows = []
+    for start in range(0, len(item_ids), _IN_CHUNK_SIZE):
+        chunk = item_ids[start:start + _IN_CHUNK_SIZE].tolist()
+        rows.extend(
+            db.query(
+                ItemStats.item_id,
+                ItemStats.item_n_view,
+                ItemStats.item_n_cart,
+                ItemStats.item_n_buy,
+                ItemStats.item_n_unique_users,
+            )
+            .filter(ItemStats.item_id.in_(chunk))
+            .all()
+        )
+    if not rows:
+        return matrix
+
+    found = np.asarray(rows, dtype=np.int64)
+    # Сопоставляем найденные строки позициям кандидатов через сортировку
+    order = np.argsort(item_ids, kind="stable")
+    positions = order[np.searchsorted(item_ids, found[:, 0], sorter=order)]
+    matrix[positions] = found[:, 1:]
+    return matrix
+
+
+def rebuild_item_stats(db: Session) -> int:
+    """Полностью пересчитать таблицу item_stats по событиям.
+
+    Используется после массовой загрузки событий, минуя CRUD.
+    Возвращает количество товаров со статистикой.
+    """
+    aggregated = (
+        db.query(
+            Event.item_id,
+            func.count(case((Event.event_type == "view", 1))).label("item_n_view"),
+            func.count(case((Event.event_type == "addtocart", 1))).label("item_n_cart"),
+            func.count(case((Event.event_type == "transaction", 1))).label("item_n_buy"),
+            func.count(func.distinct(Event.user_id)).label("item_n_unique_users"),
+        )
+        .group_by(Event.item_id)
+        .all()
+    )
+
+    mappings: List[dict] = [
+        {
+            "item_id": row.item_id,
+            "item_n_view": row.item_n_view,
+            "item_n_cart": row.item_n_cart,
+            "item_n_buy": row.item_n_buy,
+            "item_n_unique_users": row.item_n_unique_users,
+        }
+        for row in aggregated
+    ]
+
+    db.query(ItemStats).delete(synchronize_session=False)
+    if mappings:
+        db.bulk_insert_mappings(ItemStats, mappings)
+    db.commit()
+    return len(mappings)
+
+
+def ensure_item_stats(db: Session) -> int:
+    """Пересчитать статистику, если таблица пуста, а события уже есть.
+
+    Нужна для баз, заполненных до появления таблицы item_stats.
+    """
+    if db.query(ItemStats.item_id).first() is not None:
+        return 0
+    if db.query(Event.id).first() is None:
+        return 0
+    return rebuild_item_stats(db)
@@ -0,0 +1,170 @@
+"""Рейтинг популярности товаров для холодного старта и аналитики.
+
+Для каждого товара в памяти процесса хранятся три оценки:
+- raw — число событий;
+- weighted — взвешенное число событий (покупка > корзина > просмотр);
+- decayed — взвешенная оценка с экспоненциальным затуханием по времени.
+
+Каждая оценка поддерживается в отсортированном списке, поэтому топ-k
+берётся срезом за O(k). Новые события учитываются инкрементально
+из CRUD, а рейтинг периодически перестраивается по таблице events.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy.orm import Session
+
+from ..common_utils import get_popularity_half_life_hours
+from ..models import Event
+from .candidates import EVENT_WEIGHTS
+
+RANKINGS = ("raw", "weighted", "decayed")
+# Максимальный показатель степени затухания до смены опорного момента
+_MAX_DECAY_EXPONENT = 64
+
+
+class PopularityLeaderboard:
+    """Отсортированные рейтинги популярности товаров.
+
+    Затухающая оценка хранится относительно опорного момента anchor_ts:
+    вклад события равен weight * 2 ** ((timestamp - anchor_ts) / half_life).
+    Множитель затухания одинаков для всех товаров, поэтому порядок
+    не зависит от текущего времени, а оценка на любой момент получается
+    умножением на 2 ** (-(ts - anchor_ts) / half_life).
+    """
+
+    def __init__(self, half_life_ms: float, anchor_ts: int = 0):
+        self.half_life_ms = half_life_ms
+        self.anchor_ts = anchor_ts
+        self.latest_ts = anchor_ts
+        self._scores: Dict[str, Dict[int, float]] = {name: {} for name in RANKINGS}
+        # Пары (-оценка, item_id): по возрастанию — от самых популярных
+        self._ranked: Dict[str, List[Tuple[float, int]]] = {name: [] for name in RANKINGS}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session, half_life_ms: Optional[float] = None) -> "PopularityLeaderboard":
+        """Построить рейтинг по всем событиям."""
+        started = time.perf_counter()
+        if half_life_ms is None:
+            half_life_ms = get_popularity_half_life_hours() * 3600 * 1000
+
+        rows = db.query(Event.item_id, Event.event_type, Event.timestamp).yield_per(10000)
+        raw: Dict[int, float] = {}
+        weighted: Dict[int, float] = {}
+        decayed_events: List[Tuple[int, float, int]] = []
+        latest_ts = 0
+        for item_id, event_type, timestamp in rows:
+            weight = EVENT_WEIGHTS.get(event_type, 0)
+            raw[item_id] = raw.get(item_id, 0) + 1
+            weighted[item_id] = weighted.get(item_id, 0) + weight
+            if weight:
+                decayed_events.append((item_id, weight, timestamp or 0))
+            latest_ts = max(latest_ts, timestamp or 0)
+
+        # Опорный момент — последнее событие: показатели степени не положительны
+        leaderboard = cls(half_life_ms, anchor_ts=latest_ts)
+        decayed: Dict[int, float] = {}
+        for item_id, weight, timestamp in decayed_events:
+            decayed[item_id] = decayed.get(item_id, 0.0) + weight * leaderboard._decay_factor(timestamp)
+
+        for name, scores in (("raw", raw), ("weighted", weighted), ("decayed", decayed)):
+            leaderboard._scores[name] = scores
+            leaderboard._ranked[name] = sorted((-score, item_id) for item_id, score in scores.items())
+
+        logger.info(
+            f"Рейтинг популярности построен за {time.perf_counter() - started:.2f}s: {len(raw)} товаров."
+        )
+        return leaderboard
+
+    def _decay_factor(self, timestamp: int) -> float:
+        return math.pow(2.0, (timestamp - self.anchor_ts) / self.half_life_ms)
+
+    def _scale_to(self, timestamp: int) -> float:
+        """Множитель, приводящий хранимую оценку к моменту timestamp."""
+        return math.pow(2.0, (self.anchor_ts - timestamp) / self.half_life_ms)
+
+    def _reanchor(self, anchor_ts: int):
+        """Перенести опорный момент, чтобы множители не переполнялись."""
+        scale = self._scale_to(anchor_ts)
+        self.anchor_ts = anchor_ts
+        scores = {item_id: score * scale for item_id, score in self._scores["decayed"].items()}
+        self._scores["decayed"] = scores
+        self._ranked["decayed"] = sorted((-score, item_id) for item_id, score in scores.items())
+
+    def _add(self, name: str, item_id: int, delta: float):
+        """Изменить оценку товара, сохранив сортировку списка."""
+        scores = self._scores[name]
+        ranked = self._ranked[name]
+        old = scores.get(item_id)
+        if old is not None:
+            del ranked[bisect_left(ranked, (-old, item_id))]
+        new = (old or 0) + delta
+        scores[item_id] = new
+        insort(ranked, (-new, item_id))
+
+    def record_event(self, item_id: int, event_type, timestamp: Optional[int] = None):
+        """Учесть новое событие во всех рейтингах."""
+        event_type = getattr(event_type, "value", event_type)
+        weight = EVENT_WEIGHTS.get(event_type, 0)
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        with self._lock:
+            if (timestamp - self.anchor_ts) / self.half_life_ms > _MAX_DECAY_EXPONENT:
+                self._reanchor(timestamp)
+            self._add("raw", item_id, 1)
+            if weight:
+                self._add("weighted", item_id, weight)
+                self._add("decayed", item_id, weight * self._decay_factor(timestamp))
+            self.latest_ts = max(self.latest_ts, timestamp)
+
+    def top(self, k: int, ranking: str = "weighted") -> List[Tuple[int, float]]:
+        """Топ-k товаров с оценками в порядке убывания.
+
+        Затухающая оценка приводится к моменту последнего события.
+        """
+        if ranking not in RANKINGS:
+            raise ValueError(f"Неизвестный рейтинг: {ranking}")
+        with self._lock:
+            head = self._ranked[ranking][:k]
+            scale = self._scale_to(self.latest_ts) if ranking == "decayed" else 1.0
+        return [(item_id, -neg_score * scale) for neg_score, item_id in head]
+
+
+_leaderboard: Optional[PopularityLeaderboard] = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard(db: Session) -> PopularityLeaderboard:
+    """Получить рейтинг популярности, построив его при первом обращении."""
+    global _leaderboard
+    if _leaderboard is None:
+        with _leaderboard_lock:
+            if _leaderboard is None:
+                _leaderboard = PopularityLeaderboard.build(db)
+    return _leaderboard
+
+
+def refresh_leaderboard(db: Session) -> PopularityLeaderboard:
+    """Перестроить рейтинг и атомарно заменить текущий."""
+    global _leaderboard
+    leaderboard = PopularityLeaderboard.build(db)
+    _leaderboard = leaderboard
+    return leaderboard
+
+
+def record_event(item_id: int, event_type, timestamp: Optional[int] = None):
+    """Учесть новое событие в уже построенном рейтинге."""
+    if _leaderboard is not None:
+        _leaderboard.record_event(item_id, event_type, timestamp)
+
+
+def reset_leaderboard():
+    """Сбросить рейтинг (используется в тестах)."""
+    global _leaderboard
+    _leaderboard = None
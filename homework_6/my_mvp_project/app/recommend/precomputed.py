@@ -0,0 +1,128 @@
+"""Хранилище предрассчитанных рекомендаций (таблица user_recommendations).
+
+Список рекомендаций пользователя считается свежим, если он построен
+текущей версией модели не раньше RECS_PRECOMPUTED_MAX_AGE секунд назад
+и события пользователя с тех пор не менялись. Для этого в строке хранится
+отметка событий (event_watermarks), снятая до расчёта списка, и при чтении
+она сравнивается с текущей. Запись событий user_recommendations не трогает.
+"""
+
+import json
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from ..common_utils import get_precomputed_max_age_seconds
+from ..models import Event, UserRecommendation
+from ..schemas import RecommendedItems
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _fresh_since_ms() -> int:
+    """Минимальное время расчёта свежей строки."""
+    return _now_ms() - get_precomputed_max_age_seconds() * 1000
+
+
+# Максимум ID в одном IN (...)
+_IN_CHUNK_SIZE = 10000
+# Отметка пользователя без событий
+_NO_EVENTS = "0:0:0:0"
+
+
+def event_watermarks(db: Session, user_ids: Iterable[int]) -> Dict[int, str]:
+    """Отметки событий пользователей: «число:максимальный id:корзины:покупки».
+
+    Новое или удалённое событие меняет число или максимальный id,
+    изменение типа — число корзин или покупок.
+    """
+    user_ids = sorted(set(user_ids))
+    watermarks = dict.fromkeys(user_ids, _NO_EVENTS)
+    for start in range(0, len(user_ids), _IN_CHUNK_SIZE):
+        rows = (
+            db.query(
+                Event.user_id,
+                func.count(),
+                func.max(Event.id),
+                func.count(case((Event.event_type == "addtocart", 1))),
+                func.count(case((Event.event_type == "transaction", 1))),
+            )
+            .filter(Event.user_id.in_(user_ids[start:start + _IN_CHUNK_SIZE]))
+            .group_by(Event.user_id)
+        )
+        for user_id, *values in rows:
+            watermarks[user_id] = ":".join(str(value) for value in values)
+    return watermarks
+
+
+def get_precomputed(
+    db: Session, user_id: int, top_k: int, model_version: str
+) -> Optional[RecommendedItems]:
+    """Свежие предрассчитанные рекомендации пользователя или None."""
+    row = db.get(UserRecommendation, user_id)
+    if row is None:
+        return None
+    if row.model_version != model_version or row.generated_at < _fresh_since_ms():
+        return None
+    # События пользователя изменились после снятия отметки
+    if row.events_watermark != event_watermarks(db, [user_id])[user_id]:
+        return None
+    items = json.loads(row.items)
+    # Запрошено больше, чем рассчитано заданием
+    if top_k > row.top_n and len(items) == row.top_n:
+        return None
+    return RecommendedItems(items=items[:top_k])
+
+
+def save_precomputed(
+    db: Session,
+    results: Iterable[Tuple[int, RecommendedItems]],
+    top_n: int,
+    model_version: str,
+    watermarks: Dict[int, str],
+) -> int:
+    """Сохранить рекомендации пачки пользователей, заменив прежние.
+
+    watermarks — отметки событий (event_watermarks), снятые до чтения
+    истории пользователей для расчёта. Коммит выполняет вызывающий код.
+    Возвращает число сохранённых строк.
+    """
+    generated_at = _now_ms()
+    mappings = [
+        {
+            "user_id": user_id,
+            "items": json.dumps(result.model_dump()["items"]),
+            "top_n": top_n,
+            "model_version": model_version,
+            "generated_at": generated_at,
+            "events_watermark": watermarks[user_id],
+        }
+        for user_id, result in results
+    ]
+    if not mappings:
+        return 0
+    user_ids = [mapping["user_id"] for mapping in mappings]
+    db.query(UserRecommendation).filter(UserRecommendation.user_id.in_(user_ids)).delete(
+        synchronize_session=False
+    )
+    db.bulk_insert_mappings(UserRecommendation, mappings)
+    return len(mappings)
+
+
+def fresh_user_ids(db: Session, model_version: str, top_n: int) -> Set[int]:
+    """Пользователи, у которых уже есть свежий список не короче top_n.
+
+    Используется для продолжения прерванного задания.
+    """
+    rows = db.query(UserRecommendation.user_id, UserRecommendation.events_watermark).filter(
+        UserRecommendation.model_version == model_version,
+        UserRecommendation.generated_at >= _fresh_since_ms(),
+        UserRecommendation.top_n >= top_n,
+    )
+    stored = dict(rows.all())
+    current = event_watermarks(db, stored)
+    return {user_id for user_id, watermark in stored.items() if watermark == current[user_id]}
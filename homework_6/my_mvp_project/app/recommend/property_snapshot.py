@@ -0,0 +1,128 @@
+"""Срез последних значений свойств товаров (таблица item_properties_current).
+
+Журнал item_properties хранит все версии свойств, а каталог, карточка
+товара и признаки нуждаются только в последнем значении. Срез обновляется
+по затронутым парам (товар, свойство) из CRUD операций и полностью
+пересчитывается после массовой загрузки. Значения на момент в прошлом
+берутся из журнала.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from ..database import dialect_insert
+from ..models import ItemProperty, ItemPropertyCurrent
+
+_SNAPSHOT_COLUMNS = ("item_id", "property", "value", "timestamp", "property_id")
+
+
+def _latest_versions(as_of: Optional[int] = None):
+    """Подзапрос: последняя версия каждой пары (товар, свойство) из журнала.
+
+    При равном timestamp побеждает более поздняя запись.
+    """
+    query = select(
+        ItemProperty.item_id,
+        ItemProperty.property,
+        ItemProperty.value,
+        ItemProperty.timestamp,
+        ItemProperty.id.label("property_id"),
+        func.row_number()
+        .over(
+            partition_by=(ItemProperty.item_id, ItemProperty.property),
+            order_by=(ItemProperty.timestamp.desc(), ItemProperty.id.desc()),
+        )
+        .label("rank"),
+    )
+    if as_of is not None:
+        query = query.where(ItemProperty.timestamp <= as_of)
+    return query
+
+
+def refresh_keys(db: Session, keys: Iterable[Tuple[int, str]]):
+    """Пересчитать срез для пар (товар, свойство) по журналу.
+
+    Вызывается из CRUD в той же транзакции, что и изменение журнала.
+    Строки среза пишутся upsert'ом в порядке ключа: конкурентное
+    добавление той же пары не приводит к IntegrityError.
+    """
+    rows = []
+    removed = []
+    for item_id, property_name in sorted(set(keys)):
+        latest = (
+            db.query(ItemProperty.value, ItemProperty.timestamp, ItemProperty.id)
+            .filter(ItemProperty.item_id == item_id, ItemProperty.property == property_name)
+            .order_by(ItemProperty.timestamp.desc(), ItemProperty.id.desc())
+            .first()
+        )
+        if latest is None:
+            removed.append((item_id, property_name))
+            continue
+        rows.append(
+            {
+                "item_id": item_id,
+                "property": property_name,
+                "value": latest.value,
+                "timestamp": latest.timestamp,
+                "property_id": latest.id,
+            }
+        )
+
+    table = ItemPropertyCurrent.__table__
+    if rows:
+        stmt = dialect_insert(db, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["item_id", "property"],
+            set_={column: stmt.excluded[column] for column in ("value", "timestamp", "property_id")},
+        )
+        db.execute(stmt, rows)
+    for item_id, property_name in removed:
+        db.execute(delete(table).where(table.c.item_id == item_id, table.c.property == property_name))
+
+
+def get_item_properties(db: Session, item_id: int, as_of: Optional[int] = None) -> Dict[str, dict]:
+    """Свойства товара: {property: {"value", "timestamp"}}.
+
+    Без as_of читается срез, с as_of — значения на этот момент из журнала.
+    """
+    if as_of is None:
+        rows = db.query(
+            ItemPropertyCurrent.property, ItemPropertyCurrent.value, ItemPropertyCurrent.timestamp
+        ).filter(ItemPropertyCurrent.item_id == item_id)
+    else:
+        versions = _latest_versions(as_of).where(ItemProperty.item_id == item_id).subquery()
+        rows = db.execute(
+            select(versions.c.property, versions.c.value, versions.c.timestamp).where(versions.c.rank == 1)
+        )
+    return {
+        row.property: {"value": row.value, "timestamp": row.timestamp}
+        for row in sorted(rows, key=lambda row: row.property)
+    }
+
+
+def rebuild_item_properties_current(db: Session) -> int:
+    """Полностью пересчитать срез по журналу одним INSERT ... SELECT.
+
+    Используется после массовой загрузки свойств, минуя CRUD.
+    Возвращает количество строк среза.
+    """
+    versions = _latest_versions().subquery()
+    latest = select(*(versions.c[column] for column in _SNAPSHOT_COLUMNS)).where(versions.c.rank == 1)
+    db.query(ItemPropertyCurrent).delete(synchronize_session=False)
+    db.execute(ItemPropertyCurrent.__table__.insert().from_select(list(_SNAPSHOT_COLUMNS), latest))
+    db.commit()
+    return db.query(func.count()).select_from(ItemPropertyCurrent).scalar()
+
+
+def ensure_item_properties_current(db: Session) -> int:
+    """Пересчитать срез, если он пуст, а журнал свойств уже заполнен.
+
+    Нужна для баз, заполненных до появления таблицы item_properties_current.
+    """
+    if db.query(ItemPropertyCurrent.item_id).first() is not None:
+        return 0
+    if db.query(ItemProperty.id).first() is None:
+        return 0
+    return rebuild_item_properties_current(db)
@@ -0,0 +1,151 @@
+"""Реестр версий модели рекомендаций с горячей заменой.
+
+Реестр — это каталог с артефактами вида <версия>.cbm (или <версия>.pkl).
+Активная версия задаётся файлом CURRENT, а если его нет — берётся
+последняя версия по имени. Новая версия загружается в фоне, проверяется
+на контрольном батче и атомарно подменяет текущую: запросы, которые
+уже получили ссылку на старую модель, дорабатывают на ней.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+from loguru import logger
+
+from ..common_utils import get_model_registry_dir
+from .utils import load_model, load_model_file, mark_model_ready
+
+MODEL_EXTENSIONS = (".cbm", ".pkl")
+CURRENT_FILE = "CURRENT"
+# Версия модели, загруженной из app/recommend/model.cbm без реестра
+BUILTIN_VERSION = "builtin"
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Загруженная модель вместе с её версией."""
+    version: str
+    model: Any
+
+
+class ModelValidationError(Exception):
+    """Новая версия модели не прошла проверку на контрольном батче."""
+
+
+class ModelRegistry:
+    """Каталог версий модели и текущая активная модель процесса."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._current: Optional[LoadedModel] = None
+        # Версия, не прошедшая проверку: повторно её не загружаем при опросе
+        self._rejected_version: Optional[str] = None
+        # Загрузки выполняются по одной, чтение текущей модели без блокировок
+        self._reload_lock = threading.Lock()
+
+    def available_versions(self) -> List[str]:
+        """Список версий в реестре, отсортированный по имени."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            path.stem for path in self.directory.iterdir()
+            if path.suffix in MODEL_EXTENSIONS
+        )
+
+    def _artifact_path(self, version: str) -> Path:
+        # Версия приходит из запроса и из CURRENT: путь строится только
+        # для версий, найденных в каталоге реестра (без ../ и подкаталогов)
+        if version not in self.available_versions():
+            raise FileNotFoundError(f"Версия модели {version} не найдена в {self.directory}")
+        for extension in MODEL_EXTENSIONS:
+            path = self.directory / f"{version}{extension}"
+            if path.exists():
+                return path
+        raise FileNotFoundError(f"Версия модели {version} не найдена в {self.directory}")
+
+    def target_version(self) -> Optional[str]:
+        """Версия, которая должна быть активной: из CURRENT или последняя."""
+        pointer = self.directory / CURRENT_FILE
+        if pointer.exists():
+            version = pointer.read_text().strip()
+            if version:
+                return version
+        versions = self.available_versions()
+        return versions[-1] if versions else None
+
+    @property
+    def current_version(self) -> Optional[str]:
+        """Версия текущей модели или None, если модель ещё не загружена."""
+        loaded = self._current
+        return loaded.version if loaded else None
+
+    def current(self) -> LoadedModel:
+        """Текущая модель; при первом обращении загружается без прогрева."""
+        loaded = self._current
+        if loaded is None:
+            loaded = self.reload()
+        return loaded
+
+    def reload(
+        self,
+        version: Optional[str] = None,
+        validate: Optional[Callable[[Any], None]] = None,
+    ) -> LoadedModel:
+        """Загрузить версию, проверить её и атомарно сделать текущей.
+
+        Без явной версии загружается target_version(), а если реестр
+        пуст — встроенная модель app/recommend/model.cbm.
+        """
+        with self._reload_lock:
+            version = version or self.target_version()
+            if version is None:
+                loaded = LoadedModel(version=BUILTIN_VERSION, model=load_model())
+            else:
+                path = self._artifact_path(version)
+                logger.info(f"Загрузка модели версии {version} из {path}")
+                loaded = LoadedModel(version=version, model=load_model_file(path))
+
+            if validate is not None:
+                try:
+                    validate(loaded.model)
+                except Exception as e:
+                    self._rejected_version = loaded.version
+                    raise ModelValidationError(f"Модель версии {loaded.version} не прошла проверку: {e}") from e
+
+            previous = self._current
+            self._current = loaded
+            if validate is not None:
+                mark_model_ready()
+            logger.info(
+                f"Активна модель версии {loaded.version}"
+                + (f" (была {previous.version})" if previous else "")
+            )
+            return loaded
+
+    def reload_if_changed(self, validate: Optional[Callable[[Any], None]] = None) -> Optional[LoadedModel]:
+        """Перезагрузить модель, если целевая версия отличается от текущей."""
+        version = self.target_version()
+        current = self._current
+        if version is None or version == self._rejected_version:
+            return None
+        if current is not None and current.version == version:
+            return None
+        return self.reload(version, validate=validate)
+
+    def activate(self, version: str, validate: Optional[Callable[[Any], None]] = None) -> LoadedModel:
+        """Сделать версию активной для всех воркеров и загрузить её в этом процессе.
+
+        Файл CURRENT обновляется только после успешной проверки,
+        остальные воркеры подхватят версию при следующем опросе реестра.
+        """
+        loaded = self.reload(version, validate=validate)
+        tmp_path = self.directory / f".{CURRENT_FILE}.tmp"
+        tmp_path.write_text(version)
+        os.replace(tmp_path, self.directory / CURRENT_FILE)
+        return loaded
+
+
+model_registry = ModelRegistry(get_model_registry_dir())
@@ -0,0 +1,425 @@
+"""Кэш агрегатов событий пользователя для признаков модели.
+
+Для пользователя хранятся n_view, n_cart, n_buy, общее число событий
+n_events и время первого события first_event_ts. Запись загружается
+из БД одним запросом при первом обращении (в том числе для пользователя
+без событий — так определяется холодный старт), а затем обновляется
+инкрементально из CRUD после коммита: новые события прибавляются
+к счётчикам, смена типа переносит событие между ними. Удаление события
+может изменить время первого события, поэтому запись пользователя
+сбрасывается.
+
+Обновляются только уже закэшированные записи; запись
+не продлевается обновлениями и живёт не дольше USER_FEATURES_TTL,
+поэтому события, записанные в обход CRUD (populate_db.py, другие
+воркеры с кэшем в памяти), учитываются не позже чем через TTL.
+
+Каждое обновление и сброс увеличивают версию пользователя, даже если
+записи нет. Загруженная из БД запись сохраняется, только если версия
+не изменилась с начала загрузки и запись ещё отсутствует: иначе
+событие, записанное между запросом к БД и сохранением, было бы потеряно.
+
+Хранилища:
+- LRUFeatureStore — в памяти процесса;
+- RedisFeatureStore — общее для всех воркеров, обновляется атомарно.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from ..common_utils import (
+    get_redis_url,
+    get_user_features_backend,
+    get_user_features_max_users,
+    get_user_features_ttl,
+)
+from ..models import Event
+
+# Счётчик пользователя для типа события; события других типов
+# учитываются только в n_events
+EVENT_COUNTERS = {"view": "n_view", "addtocart": "n_cart", "transaction": "n_buy"}
+COUNTER_FIELDS = ("n_view", "n_cart", "n_buy", "n_events")
+_USER_KEY = "features:user:{user_id}"
+_VERSION_KEY = "features:version:{user_id}"
+# Версия живёт дольше любой загрузки записи из БД
+_VERSION_TTL = 3600
+
+# Увеличить версию; прибавить счётчики (не ниже 0) и обновить минимум
+# времени, только если запись есть
+_APPLY_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[10])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, 4 do
+    if redis.call('HINCRBY', KEYS[1], ARGV[i * 2 - 1], ARGV[i * 2]) < 0 then
+        redis.call('HSET', KEYS[1], ARGV[i * 2 - 1], 0)
+    end
+end
+if ARGV[9] ~= '' then
+    local first = redis.call('HGET', KEYS[1], 'first_event_ts')
+    if not first or first == '' or tonumber(ARGV[9]) < tonumber(first) then
+        redis.call('HSET', KEYS[1], 'first_event_ts', ARGV[9])
+    end
+end
+return 1
+"""
+
+# Сохранить загруженную запись, если её нет и версия не изменилась
+_SET_IF_VERSION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] or redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def _empty_stats() -> dict:
+    return {"n_view": 0, "n_cart": 0, "n_buy": 0, "n_events": 0, "first_event_ts": None}
+
+
+class LRUFeatureStore:
+    """Записи пользователей в памяти процесса с вытеснением давно не используемых."""
+
+    def __init__(self, max_users: int = 100000):
+        self.max_users = max_users
+        self._data: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+        # Версии недавно обновлённых пользователей (отсутствует — 0)
+        self._versions: "OrderedDict[int, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bump(self, user_id: int):
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_users:
+            self._versions.popitem(last=False)
+
+    def versions(self, user_ids: List[int]) -> Dict[int, int]:
+        """Текущие версии пользователей."""
+        with self._lock:
+            return {user_id: self._versions.get(user_id, 0) for user_id in user_ids}
+
+    def get_many(self, user_ids: List[int]) -> Dict[int, dict]:
+        """Живые записи пользователей (копии)."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._data.get(user_id)
+                if entry is None:
+                    continue
+                if entry[0] < now:
+                    del self._data[user_id]
+                    continue
+                self._data.move_to_end(user_id)
+                found[user_id] = dict(entry[1])
+        return found
+
+    def set_many(self, records: Dict[int, dict], ttl: int, versions: Dict[int, int]):
+        """Сохранить записи, загруженные из БД при версиях versions.
+
+        Запись пропускается, если версия пользователя изменилась или запись
+        уже сохранена другим запросом.
+        """
+        expires_at = time.time() + ttl
+        with self._lock:
+            for user_id, record in records.items():
+                if self._versions.get(user_id, 0) != versions[user_id] or user_id in self._data:
+                    continue
+                self._data[user_id] = (expires_at, dict(record))
+            while len(self._data) > self.max_users:
+                self._data.popitem(last=False)
+
+    def apply(self, deltas: Dict[int, Tuple[Dict[str, int], Optional[int]]]):
+        """Прибавить счётчики и минимум времени к существующим записям."""
+        with self._lock:
+            for user_id, (counters, first_ts) in deltas.items():
+                self._bump(user_id)
+                entry = self._data.get(user_id)
+                if entry is None:
+                    continue
+                record = entry[1]
+                for field, delta in counters.items():
+                    record[field] = max(0, record[field] + delta)
+                if first_ts is not None and (record["first_event_ts"] is None or first_ts < record["first_event_ts"]):
+                    record["first_event_ts"] = first_ts
+
+    def delete(self, user_id: int):
+        """Удалить запись пользователя."""
+        with self._lock:
+            self._bump(user_id)
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        """Очистить хранилище."""
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+
+class RedisFeatureStore:
+    """Общее хранилище в Redis: запись пользователя — hash со сроком жизни."""
+
+    def __init__(self, client, prefix: str = "mvp:"):
+        self.client = client
+        self.prefix = prefix
+        self._apply = client.register_script(_APPLY_SCRIPT)
+        self._set_if_version = client.register_script(_SET_IF_VERSION_SCRIPT)
+
+    def _key(self, user_id: int) -> str:
+        return self.prefix + _USER_KEY.format(user_id=user_id)
+
+    def _version_key(self, user_id: int) -> str:
+        return self.prefix + _VERSION_KEY.format(user_id=user_id)
+
+    def versions(self, user_ids: List[int]) -> Dict[int, int]:
+        """Текущие версии пользователей."""
+        values = self.client.mget([self._version_key(user_id) for user_id in user_ids]) if user_ids else []
+        return {user_id: int(value or 0) for user_id, value in zip(user_ids, values)}
+
+    def get_many(self, user_ids: List[int]) -> Dict[int, dict]:
+        """Записи пользователей одним pipeline."""
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.hgetall(self._key(user_id))
+        found = {}
+        for user_id, raw in zip(user_ids, pipe.execute()):
+            if not raw:
+                continue
+            raw = {key.decode() if isinstance(key, bytes) else key: value for key, value in raw.items()}
+            record = {field: int(raw.get(field, 0)) for field in COUNTER_FIELDS}
+            first_ts = raw.get("first_event_ts")
+            record["first_event_ts"] = int(first_ts) if first_ts not in (None, b"", "") else None
+            found[user_id] = record
+        return found
+
+    def set_many(self, records: Dict[int, dict], ttl: int, versions: Dict[int, int]):
+        """Сохранить отсутствующие записи со сроком жизни ttl, если версии не изменились."""
+        pipe = self.client.pipeline()
+        for user_id, record in records.items():
+            args = [versions[user_id], ttl]
+            for field in COUNTER_FIELDS:
+                args.extend([field, record[field]])
+            args.extend(["first_event_ts", "" if record["first_event_ts"] is None else record["first_event_ts"]])
+            self._set_if_version(keys=[self._key(user_id), self._version_key(user_id)], args=args, client=pipe)
+        pipe.execute()
+
+    def apply(self, deltas: Dict[int, Tuple[Dict[str, int], Optional[int]]]):
+        """Прибавить счётчики к существующим записям (скрипт Lua на пользователя)."""
+        pipe = self.client.pipeline()
+        for user_id, (counters, first_ts) in deltas.items():
+            args = []
+            for field in COUNTER_FIELDS:
+                args.extend([field, counters.get(field, 0)])
+            args.extend(["" if first_ts is None else first_ts, _VERSION_TTL])
+            self._apply(keys=[self._key(user_id), self._version_key(user_id)], args=args, client=pipe)
+        pipe.execute()
+
+    def delete(self, user_id: int):
+        """Удалить запись пользователя и увеличить его версию."""
+        version_key = self._version_key(user_id)
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(user_id))
+        pipe.incr(version_key)
+        pipe.expire(version_key, _VERSION_TTL)
+        pipe.execute()
+
+    def clear(self):
+        """Удалить все записи и версии кэша признаков."""
+        keys = list(self.client.scan_iter(match=f"{self.prefix}features:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def _event_type_value(event_type) -> str:
+    return getattr(event_type, "value", event_type)
+
+
+def load_user_stats(db: Session, user_ids: List[int]) -> Dict[int, dict]:
+    """Агрегаты событий пользователей одним сгруппированным запросом.
+
+    Пользователи без событий получают нулевую запись.
+    """
+    records = {user_id: _empty_stats() for user_id in user_ids}
+    if not user_ids:
+        return records
+    rows = (
+        db.query(
+            Event.user_id,
+            func.count(case((Event.event_type == "view", 1))),
+            func.count(case((Event.event_type == "addtocart", 1))),
+            func.count(case((Event.event_type == "transaction", 1))),
+            func.count(),
+            func.min(Event.timestamp),
+        )
+        .filter(Event.user_id.in_(user_ids))
+        .group_by(Event.user_id)
+    )
+    for user_id, n_view, n_cart, n_buy, n_events, first_event_ts in rows:
+        records[user_id] = {
+            "n_view": n_view,
+            "n_cart": n_cart,
+            "n_buy": n_buy,
+            "n_events": n_events,
+            "first_event_ts": first_event_ts,
+        }
+    return records
+
+
+class UserFeatureCache:
+    """Кэш агрегатов пользователей поверх хранилища с догрузкой из БД.
+
+    Ошибки хранилища не ломают рекомендации: агрегаты читаются из БД.
+    """
+
+    def __init__(self, store, ttl: int = 600):
+        self.store = store
+        self.ttl = ttl
+
+    def get_many(self, db: Session, user_ids: Iterable[int]) -> Dict[int, dict]:
+        """Агрегаты пользователей: из хранилища, промахи — одним запросом к БД."""
+        user_ids = list(dict.fromkeys(user_ids))
+        try:
+            found = self.store.get_many(user_ids)
+            missing = [user_id for user_id in user_ids if user_id not in found]
+            # Версии читаются до запроса к БД
+            versions = self.store.versions(missing) if missing else {}
+        except Exception as e:
+            logger.warning(f"Кэш признаков пользователей недоступен: {e}")
+            return load_user_stats(db, user_ids)
+        if missing:
+            loaded = load_user_stats(db, missing)
+            try:
+                self.store.set_many(loaded, self.ttl, versions)
+            except Exception as e:
+                logger.warning(f"Не удалось записать признаки пользователей в кэш: {e}")
+            found.update(loaded)
+        return found
+
+    def get(self, db: Session, user_id: int) -> dict:
+        """Агрегаты одного пользователя."""
+        return self.get_many(db, [user_id])[user_id]
+
+    def record_events(self, events: Iterable[Tuple[int, object, int]]):
+        """Учесть события (user_id, event_type, timestamp) в закэшированных записях."""
+        counters: Dict[int, Counter] = defaultdict(Counter)
+        first_ts: Dict[int, Optional[int]] = {}
+        for user_id, event_type, timestamp in events:
+            field = EVENT_COUNTERS.get(_event_type_value(event_type))
+            if field:
+                counters[user_id][field] += 1
+            counters[user_id]["n_events"] += 1
+            current = first_ts.get(user_id)
+            first_ts[user_id] = timestamp if current is None else min(current, timestamp)
+        self._apply({user_id: (dict(fields), first_ts[user_id]) for user_id, fields in counters.items()})
+
+    def record_event_type_changed(self, user_id: int, old_type, new_type):
+        """Перенести событие между счётчиками типов."""
+        counters: Counter = Counter()
+        old_field = EVENT_COUNTERS.get(_event_type_value(old_type))
+        new_field = EVENT_COUNTERS.get(_event_type_value(new_type))
+        if old_field == new_field:
+            return
+        if old_field:
+            counters[old_field] -= 1
+        if new_field:
+            counters[new_field] += 1
+        self._apply({user_id: (dict(counters), None)})
+
+    def _apply(self, deltas: Dict[int, Tuple[Dict[str, int], Optional[int]]]):
+        if not deltas:
+            return
+        try:
+            self.store.apply(deltas)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить кэш признаков пользователей: {e}")
+            for user_id in deltas:
+                self.invalidate_user(user_id)
+
+    def invalidate_user(self, user_id: int):
+        """Сбросить запись пользователя: следующее обращение загрузит её из БД."""
+        try:
+            self.store.delete(user_id)
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить признаки пользователя {user_id}: {e}")
+
+    def clear(self):
+        """Очистить кэш (используется в тестах)."""
+        self.store.clear()
+
+
+def _create_store():
+    """Создать хранилище по USER_FEATURES_BACKEND (memory, redis или none)."""
+    backend = get_user_features_backend()
+    if backend == "none":
+        return None
+    if backend == "redis":
+        import redis
+
+        return RedisFeatureStore(redis.Redis.from_url(get_redis_url()))
+    return LRUFeatureStore(get_user_features_max_users())
+
+
+_cache: Optional[UserFeatureCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def get_user_feature_cache() -> Optional[UserFeatureCache]:
+    """Кэш признаков пользователей процесса или None, если кэш выключен."""
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                store = _create_store()
+                _cache = UserFeatureCache(store, get_user_features_ttl()) if store else None
+                _cache_configured = True
+    return _cache
+
+
+def configure_user_feature_cache(cache: Optional[UserFeatureCache]):
+    """Заменить кэш признаков пользователей (используется в тестах)."""
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = cache
+        _cache_configured = True
+
+
+def get_user_stats(db: Session, user_ids: Iterable[int]) -> Dict[int, dict]:
+    """Агрегаты событий пользователей — из кэша или, если он выключен, из БД."""
+    cache = get_user_feature_cache()
+    if cache is None:
+        return load_user_stats(db, list(dict.fromkeys(user_ids)))
+    return cache.get_many(db, user_ids)
+
+
+def record_events(events: Iterable[Tuple[int, object, int]]):
+    """Учесть новые события (user_id, event_type, timestamp)."""
+    cache = get_user_feature_cache()
+    if cache is not None:
+        cache.record_events(events)
+
+
+def record_event_type_changed(user_id: int, old_type, new_type):
+    """Учесть смену типа события."""
+    cache = get_user_feature_cache()
+    if cache is not None:
+        cache.record_event_type_changed(user_id, old_type, new_type)
+
+
+def invalidate_user(user_id: int):
+    """Сбросить запись пользователя (удаление событий)."""
+    cache = get_user_feature_cache()
+    if cache is not None:
+        cache.invalidate_user(user_id)
@@ -3,9 +3,30 @@ from pathlib import Path
 from functools import lru_cache
 import threading
 
-_MODEL_PATH = Path(__file__).parent / "model.pkl"
+import numpy as np
+from catboost import CatBoostClassifier, FeaturesData
+from loguru import logger
+
+_MODEL_DIR = Path(__file__).parent
+# Основной формат — нативный .cbm, pickle поддерживается для совместимости
+_MODEL_PATH = _MODEL_DIR / "model.cbm"
+_LEGACY_MODEL_PATH = _MODEL_DIR / "model.pkl"
 _model_lock = threading.Lock()
 _loaded_model = None
+# Модель загружена и прогрета, сервис готов отдавать рекомендации
+_model_ready = threading.Event()
+
+
+def load_model_file(path: Path):
+    """Загрузить модель из файла .cbm (нативный формат CatBoost) или .pkl."""
+    path = Path(path)
+    if path.suffix == ".cbm":
+        model = CatBoostClassifier()
+        model.load_model(str(path), format="cbm")
+        return model
+
+    with open(path, "rb") as f:
+        return pickle.load(f)
 
 
 @lru_cache(maxsize=1)
@@ -14,19 +35,44 @@ def load_model():
     Загрузка ML модели с кэшированием
     """
     global _loaded_model
-    
+
     if _loaded_model is not None:
         return _loaded_model
-    
+
     with _model_lock:
         # Повторная проверка после получения блокировки
         if _loaded_model is not None:
             return _loaded_model
-            
-        if not _MODEL_PATH.exists():
+
+        if _MODEL_PATH.exists():
+            _loaded_model = load_model_file(_MODEL_PATH)
+        elif _LEGACY_MODEL_PATH.exists():
+            logger.warning(
+                f"Используется pickle-модель {_LEGACY_MODEL_PATH}. "
+                "Сконвертируйте её в .cbm: python scripts/convert_model.py"
+            )
+            _loaded_model = load_model_file(_LEGACY_MODEL_PATH)
+        else:
             raise FileNotFoundError(f"Модель не найдена по пути {_MODEL_PATH}")
-        
-        with open(_MODEL_PATH, "rb") as f:
-            _loaded_model = pickle.load(f)
-        
-        return _loaded_model 
\ No newline at end of file
+
+        return _loaded_model
+
+
+def predict_proba(model, features: np.ndarray) -> np.ndarray:
+    """Вероятность класса 1 для матрицы признаков float32.
+
+    Матрица передаётся в CatBoost напрямую через FeaturesData,
+    без построения DataFrame и Pool на стороне Python.
+    """
+    data = FeaturesData(num_feature_data=np.ascontiguousarray(features, dtype=np.float32))
+    return model.predict(data, prediction_type="Probability")[:, 1]
+
+
+def mark_model_ready():
+    """Отметить, что модель загружена и прогрета."""
+    _model_ready.set()
+
+
+def is_model_ready() -> bool:
+    """Проверить, прогрета ли модель."""
+    return _model_ready.is_set()
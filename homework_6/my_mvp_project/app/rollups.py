@@ -0,0 +1,249 @@
+"""Агрегаты событий по времени (rollup-таблицы) для аналитики.
+
+Таблицы event_rollups_item, event_rollups_user и event_rollups_type
+хранят число событий по типу за час и за сутки (интервалы в UTC,
+bucket — начало интервала в мс). Они обновляются upsert'ом в той же
+транзакции, что и события, и пересчитываются за диапазон времени
+функцией rebuild_event_rollups (scripts/backfill_rollups.py).
+Счётчики event_rollups_type разбиты на шарды (см. EventRollupType),
+запросы суммируют их.
+
+Аналитические запросы читают только агрегаты, поэтому их стоимость
+зависит от числа интервалов, а не от числа событий.
+"""
+
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, desc, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .database import dialect_insert
+from .models import Event, EventRollupItem, EventRollupType, EventRollupUser
+
+GRANULARITIES = {"hour": 3_600_000, "day": 86_400_000}
+# Строк на интервал и тип в event_rollups_type: все события пишут в эту таблицу
+TYPE_ROLLUP_SHARDS = 8
+# Максимум интервалов в одном ответе timeseries
+MAX_BUCKETS = 5000
+
+# Таблица агрегатов и колонка события, по которой она разбита
+_ROLLUPS = (
+    (EventRollupItem, "item_id"),
+    (EventRollupUser, "user_id"),
+    (EventRollupType, None),
+)
+
+_WINDOW_RE = re.compile(r"^(\d+)([hd])$")
+
+
+def bucket_start(timestamp: int, granularity: str) -> int:
+    """Начало интервала, в который попадает timestamp."""
+    size = GRANULARITIES[granularity]
+    return timestamp // size * size
+
+
+def parse_window(window: str) -> int:
+    """Длина окна вида 24h или 7d в миллисекундах."""
+    match = _WINDOW_RE.match(window.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Окно задаётся как <число>h или <число>d: {window}")
+    size = GRANULARITIES["hour" if match.group(2) == "h" else "day"]
+    return int(match.group(1)) * size
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def record_events(db, events: Iterable[Tuple[int, int, object, int]], sign: int = 1):
+    """Учесть события (user_id, item_id, event_type, timestamp) во всех агрегатах.
+
+    sign=-1 — события удалены. db — сессия или соединение, коммит
+    выполняет вызывающий код.
+    """
+    counters = {model: Counter() for model, _ in _ROLLUPS}
+    # Одна случайная строка-шард на транзакцию, а не одна общая на интервал
+    shard = random.randrange(TYPE_ROLLUP_SHARDS)
+    for user_id, item_id, event_type, timestamp in events:
+        event_type = getattr(event_type, "value", event_type)
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(timestamp, granularity)
+            counters[EventRollupItem][(granularity, bucket, item_id, event_type)] += sign
+            counters[EventRollupUser][(granularity, bucket, user_id, event_type)] += sign
+            counters[EventRollupType][(granularity, bucket, shard, event_type)] += sign
+
+    for model, key_column in _ROLLUPS:
+        rows = []
+        for (granularity, bucket, key, event_type), delta in counters[model].items():
+            if not delta:
+                continue
+            row = {"granularity": granularity, "bucket": bucket, "event_type": event_type, "n_events": delta}
+            row[key_column or "shard"] = key
+            rows.append(row)
+        if not rows:
+            continue
+        table = model.__table__
+        primary_key = [column.name for column in table.primary_key]
+        # Строки блокируются в порядке ключа: встречные транзакции не взаимоблокируются
+        rows.sort(key=lambda row: tuple(row[name] for name in primary_key))
+        stmt = dialect_insert(db, table)
+        # Один скомпилированный upsert выполняется executemany по всем строкам
+        stmt = stmt.on_conflict_do_update(
+            index_elements=primary_key,
+            set_={"n_events": table.c.n_events + stmt.excluded.n_events},
+        )
+        db.execute(stmt, rows)
+        if sign < 0:
+            buckets = {row["bucket"] for row in rows}
+            # Шард типа может уйти в минус, если событие учтено в другом шарде
+            empty = table.c.n_events <= 0 if key_column else table.c.n_events == 0
+            db.execute(delete(table).where(empty, table.c.bucket.in_(buckets)))
+
+
+def record_event_created(db: Session, user_id: int, item_id: int, event_type, timestamp: int):
+    """Учесть новое событие."""
+    record_events(db, [(user_id, item_id, event_type, timestamp)])
+
+
+def record_event_deleted(db: Session, user_id: int, item_id: int, event_type, timestamp: int):
+    """Учесть удаление события."""
+    record_events(db, [(user_id, item_id, event_type, timestamp)], sign=-1)
+
+
+def record_event_type_changed(db: Session, user_id: int, item_id: int, timestamp: int, old_type, new_type):
+    """Перенести событие из счётчика старого типа в счётчик нового."""
+    if getattr(old_type, "value", old_type) == getattr(new_type, "value", new_type):
+        return
+    record_event_deleted(db, user_id, item_id, old_type, timestamp)
+    record_event_created(db, user_id, item_id, new_type, timestamp)
+
+
+def rebuild_event_rollups(db: Session, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> int:
+    """Пересчитать агрегаты по таблице events за [start_ts, end_ts) и закоммитить.
+
+    Границы расширяются до целых суток, чтобы часовые и суточные
+    интервалы на краях пересчитывались целиком. Без границ пересчитываются
+    все агрегаты. Возвращает число записанных строк агрегатов.
+    """
+    if start_ts is not None:
+        start_ts = bucket_start(start_ts, "day")
+    if end_ts is not None:
+        end_ts = bucket_start(end_ts + GRANULARITIES["day"] - 1, "day")
+
+    written = 0
+    for model, key_column in _ROLLUPS:
+        table = model.__table__
+        cleanup = delete(table)
+        if start_ts is not None:
+            cleanup = cleanup.where(table.c.bucket >= start_ts)
+        if end_ts is not None:
+            cleanup = cleanup.where(table.c.bucket < end_ts)
+        db.execute(cleanup)
+
+        for granularity, size in GRANULARITIES.items():
+            bucket = (Event.timestamp // size * size).label("bucket")
+            keys = [getattr(Event, key_column)] if key_column else []
+            aggregated = select(
+                literal(granularity).label("granularity"), bucket, *keys, Event.event_type, func.count()
+            ).group_by(bucket, *keys, Event.event_type)
+            if start_ts is not None:
+                aggregated = aggregated.where(Event.timestamp >= start_ts)
+            if end_ts is not None:
+                aggregated = aggregated.where(Event.timestamp < end_ts)
+            columns = ["granularity", "bucket", *([key_column] if key_column else []), "event_type", "n_events"]
+            written += db.execute(insert(table).from_select(columns, aggregated)).rowcount or 0
+    db.commit()
+    return written
+
+
+def ensure_event_rollups(db: Session) -> int:
+    """Пересчитать агрегаты, если они пусты, а события уже есть.
+
+    Нужна для баз, заполненных до появления rollup-таблиц.
+    """
+    if db.query(EventRollupType.bucket).first() is not None:
+        return 0
+    if db.query(Event.id).first() is None:
+        return 0
+    return rebuild_event_rollups(db)
+
+
+def get_timeseries(
+    db: Session,
+    granularity: str,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None,
+    item_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> List[Dict]:
+    """Число событий по интервалам [start_ts, end_ts), в том числе пустым.
+
+    По умолчанию — последние сутки по часам или последние 30 суток по дням.
+    Ряд можно ограничить товаром или пользователем.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Неизвестная гранулярность: {granularity}")
+    if item_id is not None and user_id is not None:
+        raise ValueError("Ряд строится либо по товару, либо по пользователю")
+    size = GRANULARITIES[granularity]
+    if end_ts is None:
+        end_ts = _now_ms()
+    if start_ts is None:
+        start_ts = end_ts - (24 if granularity == "hour" else 30) * size
+    first = bucket_start(start_ts, granularity)
+    if (end_ts - first) // size > MAX_BUCKETS:
+        raise ValueError(f"Слишком много интервалов, максимум {MAX_BUCKETS}")
+
+    if item_id is not None:
+        model, key_filter = EventRollupItem, EventRollupItem.item_id == item_id
+    elif user_id is not None:
+        model, key_filter = EventRollupUser, EventRollupUser.user_id == user_id
+    else:
+        model, key_filter = EventRollupType, None
+    query = select(model.bucket, model.event_type, func.sum(model.n_events)).where(
+        model.granularity == granularity, model.bucket >= first, model.bucket < end_ts
+    )
+    if key_filter is not None:
+        query = query.where(key_filter)
+    query = query.group_by(model.bucket, model.event_type)
+
+    series = {bucket: {} for bucket in range(first, end_ts, size)}
+    for bucket, event_type, n_events in db.execute(query):
+        series.setdefault(bucket, {})[event_type] = int(n_events)
+    return [
+        {"bucket": bucket, "total": sum(event_types.values()), "event_types": event_types}
+        for bucket, event_types in sorted(series.items())
+    ]
+
+
+def get_popular_items_window(
+    db: Session, window_ms: int, limit: int = 10, end_ts: Optional[int] = None
+) -> List[Dict[str, int]]:
+    """Товары с наибольшим числом событий за окно, заканчивающееся в end_ts.
+
+    Окно кратное суткам и длиннее двух суток читается по суточным
+    агрегатам, остальные — по часовым; границы окна округляются
+    до начала интервала.
+    """
+    day = GRANULARITIES["day"]
+    granularity = "day" if window_ms % day == 0 and window_ms > 2 * day else "hour"
+    if end_ts is None:
+        end_ts = _now_ms()
+    first = bucket_start(end_ts - window_ms, granularity)
+    total = func.sum(EventRollupItem.n_events).label("event_count")
+    rows = db.execute(
+        select(EventRollupItem.item_id, total)
+        .where(
+            EventRollupItem.granularity == granularity,
+            EventRollupItem.bucket >= first,
+            EventRollupItem.bucket <= end_ts,
+        )
+        .group_by(EventRollupItem.item_id)
+        .order_by(desc(total), EventRollupItem.item_id)
+        .limit(limit)
+    )
+    return [{"item_id": item_id, "event_count": int(event_count)} for item_id, event_count in rows]
@@ -0,0 +1,64 @@
+# app/routers/admin.py
+"""Модуль служебных операций: управление версиями модели."""
+
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from loguru import logger
+
+from ..limiter import limiter
+from ..recommend.registry import ModelValidationError, model_registry
+from .recommendations import validate_model
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+)
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Проверка токена администратора из переменной окружения ADMIN_TOKEN."""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Админ-API отключено (ADMIN_TOKEN не задан)"
+        )
+    if x_admin_token != expected:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Неверный токен администратора")
+
+
+@router.get("/model", dependencies=[Depends(verify_admin_token)])
+@limiter.limit("30/minute")
+def get_model_info(request: Request) -> Dict[str, Any]:
+    """Текущая версия модели и версии, доступные в реестре."""
+    return {
+        "current_version": model_registry.current_version,
+        "target_version": model_registry.target_version(),
+        "available_versions": model_registry.available_versions(),
+    }
+
+
+@router.post("/model/reload", dependencies=[Depends(verify_admin_token)])
+@limiter.limit("10/minute")
+def reload_model(
+    request: Request,
+    version: Optional[str] = Query(None, description="Версия модели; по умолчанию целевая версия реестра"),
+) -> Dict[str, Any]:
+    """Загрузить версию модели, проверить её и атомарно заменить текущую.
+
+    При явной версии она становится активной и для остальных воркеров.
+    """
+    logger.info(f"Запрос на перезагрузку модели: version={version}")
+    try:
+        if version:
+            loaded = model_registry.activate(version, validate=validate_model)
+        else:
+            loaded = model_registry.reload(validate=validate_model)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ModelValidationError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    return {"detail": "Модель перезагружена", "version": loaded.version}
@@ -1,12 +1,12 @@
 # app/routers/analytics.py
 """Модуль для аналитики и статистики."""
 
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, Request
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from loguru import logger
 from sqlalchemy.orm import Session
 
-from .. import schemas
+from .. import rollups, schemas
 from ..database import get_db
 from ..limiter import limiter
 from . import crud
@@ -21,27 +21,55 @@ router = APIRouter(
 @router.get("/stats", response_model=Dict[str, Any])
 @limiter.limit("30/minute")
 def get_system_statistics(
-    request: Request, db: Session = Depends(get_db)
+    request: Request,
+    approximate: bool = Query(False, description="Оценки размеров таблиц из pg_class (PostgreSQL)"),
+    db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
     """Получение общей статистики системы."""
     logger.info("Запрос общей статистики системы")
-    stats = crud.get_system_stats(db)
-    logger.info(f"Получена статистика: {stats}")
+    stats = crud.get_system_stats(db, approximate=approximate)
+    logger.debug(f"Получена статистика: {stats}")
     return stats
 
 
 @router.get("/popular-items", response_model=List[Dict[str, int]])
 @limiter.limit("30/minute")
 def get_popular_items(
-    request: Request, limit: int = 10, db: Session = Depends(get_db)
+    request: Request,
+    limit: int = 10,
+    window: Optional[str] = Query(None, description="Окно вида 24h или 7d; без окна — за всё время"),
+    db: Session = Depends(get_db),
 ) -> List[Dict[str, int]]:
     """Получение популярных товаров."""
-    logger.info(f"Запрос популярных товаров, лимит: {limit}")
-    popular_items = crud.get_popular_items(db, limit=limit)
+    logger.info(f"Запрос популярных товаров, лимит: {limit}, окно: {window}")
+    try:
+        window_ms = rollups.parse_window(window) if window else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    popular_items = crud.get_popular_items(db, limit=limit, window_ms=window_ms)
     logger.info(f"Найдено {len(popular_items)} популярных товаров")
     return popular_items
 
 
+@router.get("/timeseries", response_model=List[Dict[str, Any]])
+@limiter.limit("30/minute")
+def get_timeseries(
+    request: Request,
+    granularity: str = Query("hour", pattern="^(hour|day)$", description="Интервал: hour или day"),
+    start_ts: Optional[int] = Query(None, alias="from", ge=0, description="Начало, мс"),
+    end_ts: Optional[int] = Query(None, alias="to", ge=0, description="Конец (не включительно), мс"),
+    item_id: Optional[int] = Query(None, description="Ряд одного товара"),
+    user_id: Optional[int] = Query(None, description="Ряд одного пользователя"),
+    db: Session = Depends(get_db),
+) -> List[Dict[str, Any]]:
+    """Число событий по часам или дням из агрегатов."""
+    logger.info(f"Запрос временного ряда событий: {granularity}, from={start_ts}, to={end_ts}")
+    try:
+        return rollups.get_timeseries(db, granularity, start_ts, end_ts, item_id=item_id, user_id=user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/active-users", response_model=List[Dict[str, int]])
 @limiter.limit("30/minute")
 def get_active_users(
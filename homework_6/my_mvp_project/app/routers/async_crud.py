@@ -0,0 +1,116 @@
+# app/routers/async_crud.py
+"""Асинхронные операции чтения для эндпоинтов с высокой нагрузкой.
+
+Асинхронные аналоги функций чтения из crud.py на AsyncSession:
+запросы не занимают слот пула потоков и не блокируют event loop.
+Операции записи остаются в crud.py, так как вместе с событиями
+они обновляют производные таблицы и индексы в синхронной сессии.
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, pagination
+
+
+async def _keyset_page(
+    db: AsyncSession, model, order_columns: Sequence[Any], after_key: Optional[tuple], limit: int
+) -> Tuple[List[Any], bool]:
+    """Страница строк после ключа after_key и признак наличия следующей."""
+    query = select(model).order_by(*order_columns)
+    condition = pagination.after(order_columns, after_key)
+    if condition is not None:
+        query = query.where(condition)
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = (await db.execute(query.limit(limit + 1))).scalars().all()
+    return rows[:limit], len(rows) > limit
+
+
+# Чтение User
+async def get_user(db: AsyncSession, user_id: int):
+    """Получить пользователя по ID."""
+    return await db.get(models.User, user_id)
+
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Получить список пользователей."""
+    result = await db.execute(select(models.User).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def get_users_page(db: AsyncSession, after_key: Optional[tuple] = None, limit: int = 100):
+    """Страница пользователей по ключу id (keyset пагинация)."""
+    return await _keyset_page(db, models.User, (models.User.id,), after_key, limit)
+
+
+# Чтение Item
+async def get_item(db: AsyncSession, item_id: int):
+    """Получить товар по ID."""
+    return await db.get(models.Item, item_id)
+
+
+async def get_items(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Получить список товаров."""
+    result = await db.execute(select(models.Item).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def get_items_page(db: AsyncSession, after_key: Optional[tuple] = None, limit: int = 100):
+    """Страница товаров по ключу id (keyset пагинация)."""
+    return await _keyset_page(db, models.Item, (models.Item.id,), after_key, limit)
+
+
+# Чтение Category
+async def get_category(db: AsyncSession, category_id: int):
+    """Получить категорию по ID."""
+    return await db.get(models.Category, category_id)
+
+
+async def get_categories(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Получить список категорий."""
+    result = await db.execute(select(models.Category).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+# Чтение ItemProperty
+async def get_item_property(db: AsyncSession, property_id: int):
+    """Получить свойство товара по ID."""
+    return await db.get(models.ItemProperty, property_id)
+
+
+async def get_item_properties(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Получить список свойств товаров."""
+    result = await db.execute(select(models.ItemProperty).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def get_item_properties_page(db: AsyncSession, after_key: Optional[tuple] = None, limit: int = 100):
+    """Страница свойств товаров по ключу id (keyset пагинация)."""
+    return await _keyset_page(db, models.ItemProperty, (models.ItemProperty.id,), after_key, limit)
+
+
+# Чтение Event
+async def get_event(db: AsyncSession, event_id: int):
+    """Получить событие по ID."""
+    return await db.get(models.Event, event_id)
+
+
+async def get_events(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Получить список событий."""
+    result = await db.execute(select(models.Event).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def get_events_page(db: AsyncSession, after_key: Optional[tuple] = None, limit: int = 100):
+    """Страница событий по ключу (timestamp, id) (keyset пагинация)."""
+    return await _keyset_page(db, models.Event, (models.Event.timestamp, models.Event.id), after_key, limit)
+
+
+async def get_user_events(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    """Получить события пользователя."""
+    result = await db.execute(
+        select(models.Event).filter(models.Event.user_id == user_id).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
@@ -4,9 +4,10 @@
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, Depends, Request, Query, HTTPException
 from loguru import logger
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from .. import schemas
+from .. import ingest, pagination, schemas
 from ..database import get_db
 from ..limiter import limiter
 from . import crud
@@ -26,27 +27,45 @@ def search_items(
     category_id: Optional[int] = Query(None, description="ID категории"),
     limit: int = Query(20, ge=1, le=100, description="Количество товаров на странице"),
     offset: int = Query(0, ge=0, description="Смещение для пагинации"),
+    cursor: Optional[str] = Query(
+        None, description="Курсор keyset пагинации вместо offset: пустой — первая страница, далее next_cursor"
+    ),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Поиск товаров с фильтрацией и пагинацией."""
-    logger.info(f"Поиск товаров: query='{q}', category={category_id}, limit={limit}, offset={offset}")
+    logger.info(f"Поиск товаров: query='{q}', category={category_id}, limit={limit}, offset={offset}, cursor={cursor!r}")
     
-    items, total = crud.search_items(
+    # Текстовый запрос упорядочен по (релевантность, id), без запроса — по id
+    ranked = bool((q or "").strip()) and not (q or "").strip().isdigit()
+    cursor_kind, cursor_size = ("catalog_search", 2) if ranked else ("catalog_items", 1)
+    after_key = pagination.decode_cursor(cursor_kind, cursor, cursor_size) if cursor is not None else None
+    hits, total, total_is_estimate, has_more = crud.search_items(
         db=db, 
         search_query=q or "", 
         category_id=category_id,
         limit=limit, 
-        offset=offset
+        offset=offset,
+        after_key=after_key,
     )
+    next_cursor = None
+    if cursor is not None:
+        key = (lambda hit: (hit[1], hit[0].id)) if ranked else (lambda hit: (hit[0].id,))
+        next_cursor = pagination.next_cursor(cursor_kind, hits, has_more, key)
     
-    logger.info(f"Найдено товаров: {len(items)} из {total}")
+    logger.info(f"Найдено товаров: {len(hits)} из {'~' if total_is_estimate else ''}{total}")
     
     return {
-        "items": [{"id": item.id, "created_at": str(item.created_at)} for item in items],
+        "items": [
+            {"id": item.id, "created_at": str(item.created_at), "score": score}
+            for item, score in hits
+        ],
         "total": total,
+        # Для больших выдач PostgreSQL total — оценка планировщика, а не COUNT
+        "total_is_estimate": total_is_estimate,
         "limit": limit,
         "offset": offset,
-        "has_more": offset + limit < total
+        "has_more": has_more,
+        "next_cursor": next_cursor,
     }
 
 
@@ -81,12 +100,13 @@ def get_featured_items(
 def get_item_details(
     request: Request, 
     item_id: int,
+    as_of: Optional[int] = Query(None, ge=0, description="Свойства на момент времени (мс), по умолчанию текущие"),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """Получение детальной информации о товаре."""
-    logger.info(f"Запрос детальной информации о товаре: {item_id}")
+    logger.info(f"Запрос детальной информации о товаре: {item_id}, as_of={as_of}")
     
-    item_details = crud.get_item_with_details(db, item_id)
+    item_details = crud.get_item_with_details(db, item_id, as_of=as_of)
     if not item_details:
         logger.warning(f"Товар {item_id} не найден")
         raise HTTPException(status_code=404, detail="Товар не найден")
@@ -95,12 +115,13 @@ def get_item_details(
     return item_details
 
 
-@router.post("/items/{item_id}/event")
+@router.post("/items/{item_id}/event", responses={202: {"description": "Событие принято в очередь записи"}})
 @limiter.limit("30/minute")
 def create_item_event(
     request: Request,
     item_id: int,
     event_data: Dict[str, Any],
+    sync: bool = Query(False, description="Записать сразу и вернуть ID даже в режиме очереди"),
     db: Session = Depends(get_db)
 ) -> Dict[str, str]:
     """Создание события взаимодействия с товаром."""
@@ -111,11 +132,21 @@ def create_item_event(
     if not item:
         raise HTTPException(status_code=404, detail="Товар не найден")
     
-    # Создаем событие (предполагаем, что пользователь передается в event_data)
+    # Событие с пользователем и типом из тела запроса
     try:
-        event = crud.create_event(db, event_data)
-        logger.info(f"Событие создано: {event.id}")
-        return {"message": "Событие успешно создано", "event_id": str(event.id)}
+        event = schemas.EventCreate(**{**event_data, "item_id": item_id})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    try:
+        created = ingest.submit_event(db, event, sync=sync)
+        if created is None:
+            return ingest.queued_response()
+        logger.info(f"Событие создано: {created.id}")
+        return {"message": "Событие успешно создано", "event_id": str(created.id)}
+    except ingest.EventQueueFull as e:
+        raise ingest.queue_full_error(e)
+    except ingest.EventReferenceNotFound as e:
+        raise ingest.reference_error(e)
     except Exception as e:
         logger.error(f"Ошибка создания события: {e}")
         raise HTTPException(status_code=400, detail="Ошибка создания события") 
\ No newline at end of file
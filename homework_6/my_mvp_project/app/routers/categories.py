@@ -4,13 +4,14 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 from .. import schemas, models
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..limiter import limiter
-from . import crud
+from . import async_crud, crud
 
 router = APIRouter(
     prefix="/categories",
@@ -21,25 +22,25 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.Category])
 @limiter.limit("100/minute")
-def read_categories(
+async def read_categories(
     request: Request, skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, ge=1, le=100, description="Maximum number of records to return"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> List[schemas.Category]:
     """Получение списка категорий."""
     logger.info(f"Запрос списка категорий: skip={skip}, limit={limit}")
-    categories = crud.get_categories(db, skip=skip, limit=limit)
+    categories = await async_crud.get_categories(db, skip=skip, limit=limit)
     return categories
 
 
 @router.get("/{category_id}", response_model=schemas.Category)
 @limiter.limit("100/minute")
-def read_category(
-    request: Request, category_id: int, db: Session = Depends(get_db)
+async def read_category(
+    request: Request, category_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> schemas.Category:
     """Получение информации о категории."""
     logger.info(f"Запрос категории с id: {category_id}")
-    db_category = crud.get_category(db, category_id=category_id)
+    db_category = await async_crud.get_category(db, category_id=category_id)
     if db_category is None:
         logger.warning(f"Категория с id {category_id} не найдена.")
         raise HTTPException(
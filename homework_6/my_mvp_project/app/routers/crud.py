@@ -26,11 +26,12 @@ from datetime import datetime
 
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, and_, or_, case
+from sqlalchemy import func, desc, asc, and_, or_, case, insert
 from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy.exc import IntegrityError
 
-from .. import models, schemas
+from .. import models, rollups, schemas, search, stats
+from ..recommend import cache, candidates, item_stats, popularity, property_snapshot, user_features
 
 # CRUD операции для сущностей приложения
 # Организовано по типу сущности для лучшей читаемости
@@ -53,6 +54,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    stats.record_created("total_users")
     return db_user
 
 
@@ -72,6 +74,8 @@ def delete_user(db: Session, user_id: int):
     if db_user:
         db.delete(db_user)
         db.commit()
+        stats.record_created("total_users", -1)
+        user_features.invalidate_user(user_id)
     return db_user
 
 
@@ -96,6 +100,7 @@ def create_item(db: Session, item: schemas.ItemCreate):
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    stats.record_created("total_items")
     return db_item
 
 
@@ -115,6 +120,7 @@ def delete_item(db: Session, item_id: int):
     if db_item:
         db.delete(db_item)
         db.commit()
+        stats.record_created("total_items", -1)
     return db_item
 
 
@@ -139,6 +145,7 @@ def create_category(db: Session, category: schemas.CategoryCreate):
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
+    stats.record_created("total_categories")
     return db_category
 
 
@@ -163,6 +170,8 @@ def delete_category(db: Session, category_id: int):
     if db_category:
         db.delete(db_category)
         db.commit()
+        # Подкатегории удаляются каскадно: счётчики пересчитываются целиком
+        stats.reset_stats()
     return db_category
 
 
@@ -186,8 +195,12 @@ def create_item_property(db: Session, item_property: schemas.ItemPropertyCreate)
         value=item_property.value
     )
     db.add(db_property)
+    db.flush()
+    # Срез последних значений обновляется в той же транзакции
+    property_snapshot.refresh_keys(db, [(db_property.item_id, db_property.property)])
     db.commit()
     db.refresh(db_property)
+    search.record_item_changed(db, db_property.item_id)
     return db_property
 
 
@@ -195,12 +208,16 @@ def update_item_property(db: Session, property_id: int, item_property: schemas.I
     """Обновить свойство товара."""
     db_property = db.query(models.ItemProperty).filter(models.ItemProperty.id == property_id).first()
     if db_property:
+        old_key = (db_property.item_id, db_property.property)
         if item_property.property is not None:
             db_property.property = item_property.property
         if item_property.value is not None:
             db_property.value = item_property.value
+        db.flush()
+        property_snapshot.refresh_keys(db, [old_key, (db_property.item_id, db_property.property)])
         db.commit()
         db.refresh(db_property)
+        search.record_item_changed(db, db_property.item_id)
     return db_property
 
 
@@ -208,8 +225,12 @@ def delete_item_property(db: Session, property_id: int):
     """Удалить свойство товара."""
     db_property = db.query(models.ItemProperty).filter(models.ItemProperty.id == property_id).first()
     if db_property:
+        key = (db_property.item_id, db_property.property)
         db.delete(db_property)
+        db.flush()
+        property_snapshot.refresh_keys(db, [key])
         db.commit()
+        search.record_item_changed(db, key[0])
     return db_property
 
 
@@ -238,22 +259,87 @@ def create_event(db: Session, event: schemas.EventCreate):
         timestamp=event.timestamp or int(datetime.now().timestamp() * 1000),
         transaction_id=event.transaction_id
     )
+    # Статистика товара и агрегаты обновляются в той же транзакции, что и событие
+    item_stats.record_event_created(db, event.user_id, event.item_id, event.event_type)
+    rollups.record_event_created(db, event.user_id, event.item_id, event.event_type, db_event.timestamp)
     db.add(db_event)
     db.commit()
     db.refresh(db_event)
+    candidates.record_event(db_event.user_id, db_event.item_id)
+    popularity.record_event(db_event.item_id, db_event.event_type, db_event.timestamp)
+    stats.record_event(db_event.event_type)
+    user_features.record_events([(db_event.user_id, db_event.event_type, db_event.timestamp)])
+    # Рекомендации пользователя зависят от его истории
+    cache.invalidate_user(db_event.user_id)
     return db_event
 
 
+def create_events(db: Session, events: List[schemas.EventCreate]) -> int:
+    """Создать пачку событий одним многострочным INSERT и одним коммитом.
+
+    ID событий не возвращаются. Возвращает число событий.
+    """
+    now_ms = int(datetime.now().timestamp() * 1000)
+    return create_event_rows(
+        db,
+        [
+            {
+                "user_id": event.user_id,
+                "item_id": event.item_id,
+                "event_type": getattr(event.event_type, "value", event.event_type),
+                "timestamp": event.timestamp or now_ms,
+                "transaction_id": event.transaction_id,
+            }
+            for event in events
+        ],
+    )
+
+
+def create_event_rows(db: Session, rows: List[dict]) -> int:
+    """Записать уже проверенные строки событий одним INSERT и одним коммитом.
+
+    Строка — словарь user_id, item_id, event_type (строка), timestamp
+    и transaction_id. Производные данные обновляются так же, как
+    в create_event, но на всю пачку сразу.
+    """
+    if not rows:
+        return 0
+    user_ids = sorted({row["user_id"] for row in rows})
+    item_stats.record_events_created(db, [(row["user_id"], row["item_id"], row["event_type"]) for row in rows])
+    rollups.record_events(db, [(row["user_id"], row["item_id"], row["event_type"], row["timestamp"]) for row in rows])
+    db.execute(insert(models.Event), rows)
+    db.commit()
+    for row in rows:
+        candidates.record_event(row["user_id"], row["item_id"])
+        popularity.record_event(row["item_id"], row["event_type"], row["timestamp"])
+        stats.record_event(row["event_type"])
+    user_features.record_events([(row["user_id"], row["event_type"], row["timestamp"]) for row in rows])
+    for user_id in user_ids:
+        cache.invalidate_user(user_id)
+    return len(rows)
+
+
 def update_event(db: Session, event_id: int, event_type=None, transaction_id=None):
     """Обновить событие."""
     db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if db_event:
+        old_type = db_event.event_type
         if event_type is not None:
+            item_stats.record_event_type_changed(
+                db, db_event.item_id, db_event.event_type, event_type
+            )
+            rollups.record_event_type_changed(
+                db, db_event.user_id, db_event.item_id, db_event.timestamp, db_event.event_type, event_type
+            )
             db_event.event_type = event_type
         if transaction_id is not None:
             db_event.transaction_id = transaction_id
         db.commit()
         db.refresh(db_event)
+        if event_type is not None:
+            stats.record_event_type_changed(old_type, event_type)
+            user_features.record_event_type_changed(db_event.user_id, old_type, event_type)
+        cache.invalidate_user(db_event.user_id)
     return db_event
 
 
@@ -261,50 +347,40 @@ def delete_event(db: Session, event_id: int):
     """Удалить событие."""
     db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
     if db_event:
+        item_stats.record_event_deleted(
+            db, db_event.user_id, db_event.item_id, db_event.event_type
+        )
+        rollups.record_event_deleted(
+            db, db_event.user_id, db_event.item_id, db_event.event_type, db_event.timestamp
+        )
+        user_id = db_event.user_id
+        event_type = db_event.event_type
         db.delete(db_event)
         db.commit()
+        stats.record_event(event_type, -1)
+        # Удалённое событие могло быть первым у пользователя
+        user_features.invalidate_user(user_id)
+        cache.invalidate_user(user_id)
         return True
     return False
 
 
 # === Функции для аналитики ===
 
-def get_system_stats(db: Session):
-    """Получить общую статистику системы."""
-    from sqlalchemy import func
-    
-    total_users = db.query(models.User).count()
-    total_items = db.query(models.Item).count()
-    total_events = db.query(models.Event).count()
-    total_categories = db.query(models.Category).count()
-    
-    # Статистика по типам событий
-    event_stats = db.query(
-        models.Event.event_type,
-        func.count(models.Event.id).label('count')
-    ).group_by(models.Event.event_type).all()
-    
-    return {
-        "total_users": total_users,
-        "total_items": total_items,
-        "total_events": total_events,
-        "total_categories": total_categories,
-        "event_types": [{"type": stat.event_type, "count": stat.count} for stat in event_stats]
-    }
+def get_system_stats(db: Session, approximate: bool = False):
+    """Получить общую статистику системы (из счётчиков в памяти)."""
+    return stats.get_system_stats(db, approximate=approximate)
 
 
-def get_popular_items(db: Session, limit: int = 10):
-    """Получить популярные товары по количеству событий."""
-    from sqlalchemy import func, desc
-    
-    popular_items = db.query(
-        models.Item.id,
-        func.count(models.Event.id).label('event_count')
-    ).join(models.Event).group_by(models.Item.id).order_by(
-        desc(func.count(models.Event.id))
-    ).limit(limit).all()
-    
-    return [{"item_id": item.id, "event_count": item.event_count} for item in popular_items]
+def get_popular_items(db: Session, limit: int = 10, window_ms: Optional[int] = None):
+    """Получить популярные товары по количеству событий.
+
+    Без окна — из рейтинга популярности за всё время, с окном — из агрегатов.
+    """
+    if window_ms is not None:
+        return rollups.get_popular_items_window(db, window_ms, limit)
+    top = popularity.get_leaderboard(db).top(limit, ranking="raw")
+    return [{"item_id": item_id, "event_count": int(count)} for item_id, count in top]
 
 
 def get_user_activity_stats(db: Session, limit: int = 10):
@@ -333,64 +409,75 @@ def get_recent_events(db: Session, limit: int = 20):
 # === Функции для каталога товаров ===
 
 def search_items(db: Session, search_query: str = "", category_id: int = None, 
-                limit: int = 20, offset: int = 0):
-    """Поиск товаров с фильтрацией."""
-    from sqlalchemy import or_, func
-    
-    query = db.query(models.Item)
-    
-    # Поиск по названию (если есть поле name в Item)
-    if search_query:
-        # Поиск по ID товара (так как у нас нет поля name)
-        try:
-            item_id = int(search_query)
-            query = query.filter(models.Item.id == item_id)
-        except ValueError:
-            # Если не число, ищем среди свойств товара
-            query = query.join(models.ItemProperty).filter(
-                or_(
-                    models.ItemProperty.property.ilike(f"%{search_query}%"),
-                    models.ItemProperty.value.ilike(f"%{search_query}%")
-                )
-            ).distinct()
-    
+                limit: int = 20, offset: int = 0, after_key: Optional[tuple] = None):
+    """Поиск товаров с фильтрацией.
+
+    after_key — ключ последнего товара предыдущей страницы для курсорной
+    пагинации: (релевантность, id) для текстового запроса, (id,) без него.
+    Возвращает пары (товар, релевантность), общее число найденных,
+    признак того, что это число — оценка, и наличие следующей страницы.
+    """
+    # Поиск по ID товара (так как у нас нет поля name)
+    if search_query.strip().isdigit():
+        item = db.query(models.Item).filter(models.Item.id == int(search_query)).first()
+        first_page = offset == 0 and after_key is None
+        return ([(item, None)] if item and first_page else []), int(item is not None), False, False
+
     # Пропускаем фильтр по категории, так как товары не привязаны к категориям
     # if category_id:
     #     query = query.filter(models.Item.category_id == category_id)
-    
+
+    if search_query.strip():
+        # Ищем среди текущих значений свойств товара через поисковый индекс
+        result = search.search_items(db, search_query, limit=limit, offset=offset, after=after_key)
+        item_ids = [item_id for item_id, _ in result.hits]
+        items = {item.id: item for item in db.query(models.Item).filter(models.Item.id.in_(item_ids))}
+        hits = [(items[item_id], score) for item_id, score in result.hits if item_id in items]
+        return hits, result.total, result.total_is_estimate, result.has_more
+
+    query = db.query(models.Item).order_by(models.Item.id)
     # Общее количество для пагинации
     total = query.count()
-    
-    # Применяем лимит и оффсет
-    items = query.offset(offset).limit(limit).all()
-    
-    return items, total
+    if after_key is not None:
+        query = query.filter(models.Item.id > after_key[0])
+    else:
+        query = query.offset(offset)
+    # Лишняя строка показывает, есть ли следующая страница
+    items = query.limit(limit + 1).all()
+    return [(item, None) for item in items[:limit]], total, False, len(items) > limit
 
 
-def get_item_with_details(db: Session, item_id: int):
-    """Получить товар с детальной информацией."""
+def get_item_with_details(db: Session, item_id: int, as_of: Optional[int] = None):
+    """Получить товар с детальной информацией.
+
+    Свойства берутся из среза последних значений, а при заданном
+    as_of — значения на этот момент из журнала свойств.
+    """
     item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if not item:
         return None
     
     # Получаем свойства товара
-    properties = db.query(models.ItemProperty).filter(models.ItemProperty.item_id == item_id).all()
+    properties = property_snapshot.get_item_properties(db, item_id, as_of=as_of)
     
     # Пропускаем получение категории, так как товары не привязаны к категориям
     category = None
     
     # Статистика по товару
     from sqlalchemy import func
-    stats = db.query(
+    event_stats = db.query(
         models.Event.event_type,
         func.count(models.Event.id).label('count')
     ).filter(models.Event.item_id == item_id).group_by(models.Event.event_type).all()
     
     return {
         "item": {"id": item.id, "created_at": str(item.created_at)},
-        "properties": [{"property": prop.property, "value": prop.value} for prop in properties],
+        "properties": [
+            {"property": name, "value": prop["value"], "timestamp": prop["timestamp"]}
+            for name, prop in properties.items()
+        ],
         "category": category,
-        "event_stats": [{"type": stat.event_type, "count": stat.count} for stat in stats]
+        "event_stats": [{"type": stat.event_type, "count": stat.count} for stat in event_stats]
     }
 
 
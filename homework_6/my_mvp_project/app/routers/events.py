@@ -1,16 +1,18 @@
 # app/routers/events.py
 """Модуль для работы с событиями пользователей."""
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from .. import schemas, models
-from ..database import get_db
+from .. import ingest, pagination, schemas, models
+from ..database import get_async_db, get_db
 from ..limiter import limiter
-from . import crud
+from . import async_crud, crud
 
 router = APIRouter(
     prefix="/events",
@@ -21,26 +23,35 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.Event])
 @limiter.limit("100/minute")
-def read_events(
+async def read_events(
     request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, ge=1, le=100, description="Maximum number of records to return"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(
+        None, description="Курсор keyset пагинации: пустой — первая страница, следующий — из X-Next-Cursor"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[schemas.Event]:
-    """Получение списка событий."""
-    logger.info(f"Запрос списка событий: skip={skip}, limit={limit}")
-    events = crud.get_events(db, skip=skip, limit=limit)
+    """Получение списка событий (с курсором — по возрастанию timestamp, id)."""
+    logger.info(f"Запрос списка событий: skip={skip}, limit={limit}, cursor={cursor!r}")
+    if cursor is not None:
+        after_key = pagination.decode_cursor("events", cursor, 2)
+        events, has_more = await async_crud.get_events_page(db, after_key, limit)
+        pagination.set_next_cursor(response, pagination.next_cursor("events", events, has_more, lambda event: (event.timestamp, event.id)))
+        return events
+    events = await async_crud.get_events(db, skip=skip, limit=limit)
     return events
 
 
 @router.get("/{event_id}", response_model=schemas.Event)
 @limiter.limit("100/minute")
-def read_event(
-    request: Request, event_id: int, db: Session = Depends(get_db)
+async def read_event(
+    request: Request, event_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> schemas.Event:
     """Получение информации о событии."""
     logger.info(f"Запрос события с id: {event_id}")
-    db_event = crud.get_event(db, event_id=event_id)
+    db_event = await async_crud.get_event(db, event_id=event_id)
     if db_event is None:
         logger.warning(f"Событие с id {event_id} не найдено.")
         raise HTTPException(
@@ -49,17 +60,31 @@ def read_event(
     return db_event
 
 
-@router.post("/", response_model=schemas.Event, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=schemas.Event,
+    status_code=status.HTTP_201_CREATED,
+    responses={202: {"description": "Событие принято в очередь записи (EVENT_INGEST_MODE=queue)"}},
+)
 @limiter.limit("100/minute")
 def create_event_endpoint(
-    request: Request, event: schemas.EventCreate, db: Session = Depends(get_db)
+    request: Request,
+    event: schemas.EventCreate,
+    sync: bool = Query(False, description="Записать сразу и вернуть событие с ID даже в режиме очереди"),
+    db: Session = Depends(get_db),
 ) -> schemas.Event:
     """Создание нового события."""
     try:
         logger.info(f"Запрос на создание события для пользователя {event.user_id} и товара {event.item_id}")
-        new_event = crud.create_event(db=db, event=event)
+        new_event = ingest.submit_event(db, event, sync=sync)
+        if new_event is None:
+            return ingest.queued_response()
         logger.info(f"Создано новое событие с id: {new_event.id}")
         return new_event
+    except ingest.EventQueueFull as e:
+        raise ingest.queue_full_error(e)
+    except ingest.EventReferenceNotFound as e:
+        raise ingest.reference_error(e)
     except IntegrityError as e:
         logger.error(f"Ошибка целостности при создании события: {e}")
         raise HTTPException(
@@ -68,6 +93,31 @@ def create_event_endpoint(
         )
 
 
+@router.post("/bulk", response_model=schemas.BulkEventResult)
+@limiter.limit("30/minute")
+async def create_events_bulk(request: Request, db: Session = Depends(get_db)) -> schemas.BulkEventResult:
+    """Пакетная загрузка событий: JSON массив или NDJSON (application/x-ndjson).
+
+    Корректные события записываются одним INSERT, ошибки возвращаются
+    по номерам строк и не отменяют остальной пакет.
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    try:
+        records, parse_errors = ingest.parse_event_payload(await request.body(), ndjson=ndjson)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Некорректное тело запроса: {e}")
+    if len(records) > ingest.MAX_BULK_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Не больше {ingest.MAX_BULK_EVENTS} событий за запрос",
+        )
+    logger.info(f"Пакетная загрузка {len(records)} событий (ndjson={ndjson})")
+    # Проверка и запись — синхронная работа с БД, вне цикла событий
+    result = await asyncio.to_thread(ingest.ingest_event_batch, db, records, parse_errors)
+    logger.info(f"Пакетная загрузка: записано {result.accepted}, отклонено {result.rejected}")
+    return result
+
+
 # Update endpoint удален - события не обновляются после создания
 
 
@@ -0,0 +1,224 @@
+# app/routers/export.py
+"""Модуль потоковой выгрузки таблиц для аналитики.
+
+Таблица (или диапазон времени) читается серверным курсором пачками
+по EXPORT_BATCH_ROWS строк без создания ORM объектов, и каждая пачка
+сразу отправляется клиенту в NDJSON, CSV или Arrow IPC (stream).
+Память процесса не зависит от размера выгрузки.
+"""
+
+import csv
+import io
+import json
+from typing import Iterator, List, Optional, Sequence
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..limiter import limiter
+from ..models import Event, ItemProperty
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# Строк в одной пачке серверного курсора
+EXPORT_BATCH_ROWS = 10000
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# Выгружаемые колонки таблиц в порядке вывода
+_EXPORT_COLUMNS = {
+    "events": (
+        Event,
+        [Event.id, Event.timestamp, Event.user_id, Event.item_id, Event.event_type, Event.transaction_id],
+    ),
+    "item_properties": (
+        ItemProperty,
+        [ItemProperty.id, ItemProperty.timestamp, ItemProperty.item_id, ItemProperty.property, ItemProperty.value],
+    ),
+}
+
+
+def _arrow_schema(table: str):
+    import pyarrow as pa
+
+    if table == "events":
+        return pa.schema(
+            [
+                ("id", pa.int64()),
+                ("timestamp", pa.int64()),
+                ("user_id", pa.int64()),
+                ("item_id", pa.int64()),
+                ("event_type", pa.string()),
+                ("transaction_id", pa.string()),
+            ]
+        )
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("timestamp", pa.int64()),
+            ("item_id", pa.int64()),
+            ("property", pa.string()),
+            ("value", pa.string()),
+        ]
+    )
+
+
+def _plain(value):
+    """Значение колонки для вывода: перечисления — строкой."""
+    return getattr(value, "value", value)
+
+
+def _iter_batches(
+    db: Session, table: str, start_ts: Optional[int], end_ts: Optional[int]
+) -> Iterator[Sequence[tuple]]:
+    """Пачки строк таблицы в порядке id из серверного курсора."""
+    model, columns = _EXPORT_COLUMNS[table]
+    query = select(*columns).order_by(model.id)
+    if start_ts is not None:
+        query = query.where(model.timestamp >= start_ts)
+    if end_ts is not None:
+        query = query.where(model.timestamp < end_ts)
+    # yield_per включает stream_results: строки не буферизуются целиком
+    result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_ROWS))
+    yield from result.partitions()
+
+
+def _ndjson_chunks(names: List[str], batches) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, map(_plain, row))), separators=(",", ":")) + "\n" for row in rows
+        ).encode()
+
+
+def _csv_chunks(names: List[str], batches) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows([tuple(map(_plain, row)) for row in rows])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Файлоподобный приёмник: собирает байты, записанные pyarrow."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _arrow_chunks(table: str, batches) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    schema = _arrow_schema(table)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    yield sink.take()
+    for rows in batches:
+        columns = list(zip(*rows))
+        arrays = [
+            pa.array([_plain(value) for value in column], type=field.type)
+            for column, field in zip(columns, schema)
+        ]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def export_chunks(
+    db: Session, table: str, fmt: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None
+) -> Iterator[bytes]:
+    """Байты выгрузки таблицы table в формате fmt, пачка за пачкой."""
+    names = [column.key for column in _EXPORT_COLUMNS[table][1]]
+    batches = _iter_batches(db, table, start_ts, end_ts)
+    if fmt == "csv":
+        return _csv_chunks(names, batches)
+    if fmt == "arrow":
+        return _arrow_chunks(table, batches)
+    return _ndjson_chunks(names, batches)
+
+
+def _export_response(
+    db: Session, table: str, fmt: str, start_ts: Optional[int], end_ts: Optional[int]
+) -> StreamingResponse:
+    """Потоковый ответ с выгрузкой таблицы."""
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Формат arrow недоступен: не установлен pyarrow")
+    logger.info(f"Выгрузка {table}: format={fmt}, start_ts={start_ts}, end_ts={end_ts}")
+
+    def stream() -> Iterator[bytes]:
+        # Зависимость get_db закрывает сессию до начала отправки ответа,
+        # сессия переиспользуется генератором и закрывается в конце
+        try:
+            yield from export_chunks(db, table, fmt, start_ts, end_ts)
+        finally:
+            db.close()
+
+    media_type, extension = EXPORT_FORMATS[fmt]
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+    )
+
+
+_FORMAT_QUERY = Query("ndjson", pattern="^(ndjson|csv|arrow)$", description="Формат: ndjson, csv или arrow")
+_START_QUERY = Query(None, ge=0, description="Начало диапазона timestamp (мс, включительно)")
+_END_QUERY = Query(None, ge=0, description="Конец диапазона timestamp (мс, не включительно)")
+
+
+@router.get("/events")
+@limiter.limit("10/minute")
+def export_events(
+    request: Request,
+    format: str = _FORMAT_QUERY,
+    start_ts: Optional[int] = _START_QUERY,
+    end_ts: Optional[int] = _END_QUERY,
+    db: Session = Depends(get_db),
+):
+    """Выгрузить события (все или за диапазон времени) потоком."""
+    return _export_response(db, "events", format, start_ts, end_ts)
+
+
+@router.get("/item_properties")
+@limiter.limit("10/minute")
+def export_item_properties(
+    request: Request,
+    format: str = _FORMAT_QUERY,
+    start_ts: Optional[int] = _START_QUERY,
+    end_ts: Optional[int] = _END_QUERY,
+    db: Session = Depends(get_db),
+):
+    """Выгрузить журнал свойств товаров (весь или за диапазон времени) потоком."""
+    return _export_response(db, "item_properties", format, start_ts, end_ts)
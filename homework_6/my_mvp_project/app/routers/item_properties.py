@@ -1,16 +1,17 @@
 # app/routers/item_properties.py
 """Модуль для работы со свойствами товаров."""
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from .. import schemas
-from ..database import get_db
+from .. import pagination, schemas
+from ..database import get_async_db, get_db
 from ..limiter import limiter
-from . import crud
+from . import async_crud, crud
 
 router = APIRouter(
     prefix="/item_properties",
@@ -21,26 +22,35 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.ItemPropertyResponse])
 @limiter.limit("100/minute")
-def read_item_properties(
+async def read_item_properties(
     request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, ge=1, le=100, description="Maximum number of records to return"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(
+        None, description="Курсор keyset пагинации: пустой — первая страница, следующий — из X-Next-Cursor"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[schemas.ItemPropertyResponse]:
     """Получение списка свойств товаров."""
-    logger.info(f"Запрос списка свойств товаров: skip={skip}, limit={limit}")
-    properties = crud.get_item_properties(db, skip=skip, limit=limit)
+    logger.info(f"Запрос списка свойств товаров: skip={skip}, limit={limit}, cursor={cursor!r}")
+    if cursor is not None:
+        after_key = pagination.decode_cursor("item_properties", cursor, 1)
+        properties, has_more = await async_crud.get_item_properties_page(db, after_key, limit)
+        pagination.set_next_cursor(response, pagination.next_cursor("item_properties", properties, has_more, lambda prop: (prop.id,)))
+        return properties
+    properties = await async_crud.get_item_properties(db, skip=skip, limit=limit)
     return properties
 
 
 @router.get("/{property_id}", response_model=schemas.ItemPropertyResponse)
 @limiter.limit("100/minute")
-def read_item_property(
-    request: Request, property_id: int, db: Session = Depends(get_db)
+async def read_item_property(
+    request: Request, property_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> schemas.ItemPropertyResponse:
     """Получение информации о свойстве товара."""
     logger.info(f"Запрос свойства с id: {property_id}")
-    db_property = crud.get_item_property(db, property_id=property_id)
+    db_property = await async_crud.get_item_property(db, property_id=property_id)
     if db_property is None:
         logger.warning(f"Свойство с id {property_id} не найдено.")
         raise HTTPException(
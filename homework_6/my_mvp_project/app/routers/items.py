@@ -1,16 +1,17 @@
 # app/routers/items.py
 """Модуль для работы с товарами."""
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from .. import schemas
-from ..database import get_db
+from .. import pagination, schemas
+from ..database import get_async_db, get_db
 from ..limiter import limiter
-from . import crud
+from . import async_crud, crud
 
 router = APIRouter(
     prefix="/items",
@@ -21,23 +22,35 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.Item])
 @limiter.limit("100/minute")
-def read_items(
-    request: Request, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=100), db: Session = Depends(get_db)
+async def read_items(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(
+        None, description="Курсор keyset пагинации: пустой — первая страница, следующий — из X-Next-Cursor"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[schemas.Item]:
     """Получение списка товаров."""
-    logger.info(f"Запрос списка товаров: skip={skip}, limit={limit}")
-    items = crud.get_items(db, skip=skip, limit=limit)
+    logger.info(f"Запрос списка товаров: skip={skip}, limit={limit}, cursor={cursor!r}")
+    if cursor is not None:
+        after_key = pagination.decode_cursor("items", cursor, 1)
+        items, has_more = await async_crud.get_items_page(db, after_key, limit)
+        pagination.set_next_cursor(response, pagination.next_cursor("items", items, has_more, lambda item: (item.id,)))
+        return items
+    items = await async_crud.get_items(db, skip=skip, limit=limit)
     return items
 
 
 @router.get("/{item_id}", response_model=schemas.Item)
 @limiter.limit("100/minute")
-def read_item(
-    request: Request, item_id: int, db: Session = Depends(get_db)
+async def read_item(
+    request: Request, item_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> schemas.Item:
     """Получение информации о товаре."""
     logger.info(f"Запрос товара с id: {item_id}")
-    db_item = crud.get_item(db, item_id=item_id)
+    db_item = await async_crud.get_item(db, item_id=item_id)
     if db_item is None:
         logger.warning(f"Товар с id {item_id} не найден.")
         raise HTTPException(
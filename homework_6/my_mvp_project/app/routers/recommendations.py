@@ -2,33 +2,38 @@
 """Модуль для работы с рекомендациями товаров."""
 
 import datetime
-from typing import List
+import json
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
 
 import numpy as np
-import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException, Request, Query
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from sqlalchemy import func, desc, case
 from sqlalchemy.orm import Session
 
-from ..common_utils import get_temporal_features
+from ..common_utils import (
+    get_candidate_pool_size,
+    get_cold_start_ranking,
+    get_recommendation_serving_mode,
+    get_temporal_features,
+)
 from ..database import get_db
 from ..limiter import limiter
-from ..models import Event, Item
-from ..schemas import RecommendedItem, RecommendedItems
+from ..models import Item, User
+from ..recommend import candidates, item_stats, popularity, precomputed, user_features
+from ..recommend.cache import RecommendationCache, get_recommendation_cache, temporal_bucket
+from ..schemas import BatchRecommendationRequest, RecommendedItem, RecommendedItems
 from . import crud
 
-try:
-    from ..recommend.utils import load_model
-except ImportError:
-    def load_model():
-        raise FileNotFoundError("Модель не найдена")
+from ..recommend.registry import LoadedModel, model_registry
+from ..recommend.utils import predict_proba
 
 router = APIRouter(prefix="/recommendations", tags=["Recommendations"])
 
-# Модель будет загружаться при первом обращении
-MODEL = None
+# Заголовок ответа с версией модели, по которой построены рекомендации
+MODEL_VERSION_HEADER = "X-Model-Version"
+# Источник рекомендаций: online (расчёт на запросе) или precomputed (офлайн-задание)
+SOURCE_HEADER = "X-Recommendations-Source"
 FEATURE_COLS = [
     "n_view",  # количество просмотров пользователя
     "n_cart",  # количество добавлений в корзину
@@ -41,28 +46,71 @@ FEATURE_COLS = [
     "is_weekend",  # является ли день выходным
     "is_evening",  # является ли время вечерним
 ]
+# Пользователей в одном батче предсказания: ограничивает размер матрицы признаков
+BATCH_CHUNK_SIZE = 256
+# Признаки товаров идут в FEATURE_COLS подряд, в порядке ITEM_FEATURE_COLS
+_ITEM_FEATURE_SLICE = slice(
+    FEATURE_COLS.index(item_stats.ITEM_FEATURE_COLS[0]),
+    FEATURE_COLS.index(item_stats.ITEM_FEATURE_COLS[-1]) + 1,
+)
 
 
-def get_model():
-    """Получить модель рекомендаций."""
-    global MODEL
-    if MODEL is None:
-        try:
-            MODEL = load_model()
-            logger.info("Модель рекомендаций успешно загружена.")
-        except FileNotFoundError:
-            logger.warning("Модель рекомендаций не найдена.")
-            raise
-    return MODEL
+def get_model() -> LoadedModel:
+    """Получить текущую модель рекомендаций вместе с версией.
+
+    Вызывающий код должен взять модель один раз на запрос: при горячей
+    замене уже начатые запросы дорабатывают на прежней версии.
+    """
+    try:
+        return model_registry.current()
+    except FileNotFoundError:
+        logger.warning("Модель рекомендаций не найдена.")
+        raise
+
+
+def validate_model(model):
+    """Прогнать модель на синтетическом батче и проверить предсказания.
+
+    Служит и прогревом (первые аллокации в пути предсказания),
+    и контрольной проверкой новой версии перед заменой.
+    """
+    pool_size = get_candidate_pool_size()
+    candidate_ids = list(range(1, pool_size + 1))
+    user_features = {"n_view": 1, "n_cart": 0, "n_buy": 0, "user_lifetime_days": 1}
+    item_features = np.ones((pool_size, len(item_stats.ITEM_FEATURE_COLS)), dtype=np.float32)
+    features = _prepare_prediction_data(
+        candidate_ids, user_features, item_features, _get_temporal_features()
+    )
+    # Без перехвата ошибок: сломанная модель должна провалить проверку
+    scores = np.asarray(predict_proba(model, features))
+    if scores.shape != (pool_size,):
+        raise ValueError(f"Неверная размерность предсказаний: {scores.shape}")
+    if not np.all(np.isfinite(scores)) or scores.min() < 0 or scores.max() > 1:
+        raise ValueError("Предсказания вне диапазона [0, 1]")
+    _select_top_k(scores, 100)
+
+
+def preload_model() -> LoadedModel:
+    """Загрузить и прогреть модель при старте приложения.
+
+    Первый запрос не платит за загрузку модели, а /health/ready
+    сообщает о готовности только после прогрева.
+    """
+    loaded = model_registry.reload(validate=validate_model)
+    logger.info(f"Модель версии {loaded.version} загружена и прогрета.")
+    return loaded
 
 
 @router.get("/{user_id}", response_model=RecommendedItems)
 @limiter.limit("30/minute")
-# @cache(expire=300)  # Убираем кэш для тестов
 def recommend_for_user(
     request: Request,
+    response: Response,
     user_id: int,
     top_k: int = Query(10, ge=1, le=100),
+    mode: Optional[Literal["online", "precomputed"]] = Query(
+        None, description="online — расчёт на запросе, precomputed — готовый список, если он свежий"
+    ),
     db: Session = Depends(get_db),
 ):
     """Получить рекомендации для пользователя."""
@@ -74,77 +122,249 @@ def recommend_for_user(
         logger.warning(f"Пользователь с id {user_id} не найден.")
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    # Загрузка модели
+    # Загрузка модели (одна версия на весь запрос)
+    try:
+        loaded = get_model()
+    except FileNotFoundError:
+        logger.warning("Вызван эндпоинт рекомендаций, но модель не готова.")
+        raise HTTPException(status_code=503, detail="Модель рекомендаций не готова")
+
+    response.headers[MODEL_VERSION_HEADER] = loaded.version
+
+    if (mode or get_recommendation_serving_mode()) == "precomputed":
+        result = precomputed.get_precomputed(db, user_id, top_k, loaded.version)
+        if result is not None:
+            response.headers[SOURCE_HEADER] = "precomputed"
+            return result
+        logger.info(f"Нет свежих предрассчитанных рекомендаций для пользователя {user_id}, расчёт на запросе.")
+
+    response.headers[SOURCE_HEADER] = "online"
+    return _generate_recommendations(user_id, top_k, db, loaded, _get_temporal_features())
+
+
+@router.post("/batch")
+@limiter.limit("10/minute")
+def recommend_batch(
+    request: Request,
+    batch: BatchRecommendationRequest,
+    db: Session = Depends(get_db),
+):
+    """Получить рекомендации для группы пользователей (NDJSON).
+
+    Каждая строка ответа — {"user_id": ..., "items": [...]} либо
+    {"user_id": ..., "error": "not_found"} для неизвестного пользователя.
+    Строки отдаются по мере обработки пачек пользователей.
+    """
+    logger.info(f"Получен запрос /recommendations/batch: {len(batch.user_ids)} пользователей, top_k={batch.top_k}")
     try:
-        model = get_model()
+        loaded = get_model()
     except FileNotFoundError:
         logger.warning("Вызван эндпоинт рекомендаций, но модель не готова.")
         raise HTTPException(status_code=503, detail="Модель рекомендаций не готова")
 
-    return _generate_recommendations(user_id, top_k, db, model)
+    temporal_features = _get_temporal_features()
+
+    def stream() -> Iterator[str]:
+        # Зависимость get_db закрывает сессию до начала отправки ответа,
+        # сессия переиспользуется генератором и закрывается в конце
+        try:
+            for user_id, result in _generate_batch_recommendations(
+                batch.user_ids, batch.top_k, db, loaded, temporal_features
+            ):
+                if result is None:
+                    line = {"user_id": user_id, "error": "not_found"}
+                else:
+                    line = {"user_id": user_id, **result.model_dump()}
+                yield json.dumps(line) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={MODEL_VERSION_HEADER: loaded.version},
+    )
+
+
+def _generate_batch_recommendations(
+    user_ids: Iterable[int],
+    top_k: int,
+    db: Session,
+    loaded: LoadedModel,
+    temporal_features: dict,
+) -> Iterator[Tuple[int, Optional[RecommendedItems]]]:
+    """Рекомендации для группы пользователей в порядке user_ids.
+
+    Пользователи обрабатываются пачками по BATCH_CHUNK_SIZE: на пачку
+    выполняется один сгруппированный запрос признаков пользователей,
+    одно чтение признаков всех кандидатов пачки и один вызов модели.
+    Для неизвестного пользователя возвращается None.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    cache = get_recommendation_cache()
+    bucket = temporal_bucket(temporal_features)
+    index = candidates.get_candidate_index(db)
+
+    for start in range(0, len(user_ids), BATCH_CHUNK_SIZE):
+        chunk = user_ids[start:start + BATCH_CHUNK_SIZE]
+        existing = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(chunk))}
+        results: Dict[int, Optional[RecommendedItems]] = {}
+        generations: Dict[int, Optional[int]] = {}
+        to_score: List[int] = []
+
+        pending = [user_id for user_id in chunk if user_id in existing]
+        for user_id in pending:
+            if cache is not None:
+                cached = cache.get_user(user_id, top_k, loaded.version, bucket)
+                if cached is not None:
+                    results[user_id] = cached
+                    continue
+                generations[user_id] = cache.user_generation(user_id)
+            to_score.append(user_id)
+
+        users_features = _get_users_features(to_score, db)
+        scored_users: List[int] = []
+        user_candidates: List[List[int]] = []
+        for user_id in to_score:
+            if user_id not in users_features:
+                # Нет событий — общий холодный старт
+                results[user_id] = _get_cold_start(top_k, db, cache, bucket)
+                continue
+            candidate_ids = index.candidates(user_id)
+            if not candidate_ids:
+                results[user_id] = RecommendedItems(items=[])
+                continue
+            scored_users.append(user_id)
+            user_candidates.append(candidate_ids)
+
+        if scored_users:
+            scored = _process_batch_recommendations(
+                scored_users, user_candidates, users_features, db, loaded.model, top_k, temporal_features
+            )
+            results.update(scored)
+
+        for user_id in to_score:
+            if cache is not None and user_id in users_features:
+                cache.set_user(user_id, top_k, loaded.version, bucket, results[user_id], generations[user_id])
+
+        for user_id in chunk:
+            yield user_id, results.get(user_id)
+
+
+def _process_batch_recommendations(
+    user_ids: List[int],
+    user_candidates: List[List[int]],
+    users_features: Dict[int, dict],
+    db: Session,
+    model,
+    top_k: int,
+    temporal_features: dict,
+) -> Dict[int, RecommendedItems]:
+    """Оценить кандидатов пачки пользователей одним вызовом модели."""
+    # Признаки товаров читаются один раз для объединения кандидатов пачки
+    all_candidates = np.unique(np.concatenate([np.asarray(c, dtype=np.int64) for c in user_candidates]))
+    all_item_features = _get_item_features(all_candidates.tolist(), db)
+
+    blocks = []
+    for user_id, candidate_ids in zip(user_ids, user_candidates):
+        rows = np.searchsorted(all_candidates, np.asarray(candidate_ids, dtype=np.int64))
+        blocks.append(
+            _prepare_prediction_data(
+                candidate_ids, users_features[user_id], all_item_features[rows], temporal_features
+            )
+        )
+    scores = _predict_scores(np.concatenate(blocks), model)
+
+    results = {}
+    offset = 0
+    for user_id, candidate_ids in zip(user_ids, user_candidates):
+        user_scores = scores[offset:offset + len(candidate_ids)]
+        offset += len(candidate_ids)
+        top_indices = _select_top_k(user_scores, top_k)
+        candidate_array = np.asarray(candidate_ids)
+        results[user_id] = RecommendedItems(items=[
+            RecommendedItem(id=int(item_id), name=f"Item {item_id}", score=float(score))
+            for item_id, score in zip(candidate_array[top_indices], user_scores[top_indices])
+        ])
+    logger.info(f"Сгенерированы рекомендации для пачки из {len(user_ids)} пользователей.")
+    return results
 
 
 def _generate_recommendations(
-    user_id: int, top_k: int, db: Session, model
+    user_id: int, top_k: int, db: Session, loaded: LoadedModel, temporal_features: dict
 ) -> RecommendedItems:
-    """Генерация рекомендаций для пользователя."""
-    # Подсчёт количества событий пользователя
-    user_events_count = (
-        db.query(func.count())
-        .select_from(Event)
-        .filter(Event.user_id == user_id)
-        .scalar()
-    )
+    """Генерация рекомендаций для пользователя.
+
+    Готовые рекомендации берутся из кэша по ключу (пользователь, top_k,
+    версия модели, временной бакет); кэш пользователя сбрасывается
+    при каждом его новом событии. Результат, рассчитанный до нового
+    события, в кэш не записывается.
+    """
+    cache = get_recommendation_cache()
+    bucket = temporal_bucket(temporal_features)
+    generation = None
+    if cache is not None:
+        cached = cache.get_user(user_id, top_k, loaded.version, bucket)
+        if cached is not None:
+            logger.info(f"Рекомендации для пользователя {user_id} взяты из кэша.")
+            return cached
+        # Поколение читается до событий пользователя
+        generation = cache.user_generation(user_id)
+
+    # Агрегаты событий пользователя из кэша признаков: для пользователя,
+    # который уже есть в кэше, к таблице events запросов нет
+    user_stats = user_features.get_user_stats(db, [user_id])[user_id]
 
     # Холодный старт - если у пользователя нет событий
-    if user_events_count == 0:
+    if user_stats["n_events"] == 0:
         logger.info(
             f"Пользователь {user_id} — холодный старт (нет событий). Возвращаем топ-{top_k} популярных товаров."
         )
-        return _handle_cold_start(top_k, db)
-
-    # Получаем товары, которые пользователь уже видел
-    seen_subq = db.query(Event.item_id).filter(Event.user_id == user_id).subquery()
-
-    # Находим кандидатов - товары, которые пользователь ещё не видел
-    MAX_CANDIDATES = 10000  # Максимум товаров для обработки
-    candidate_rows = (
-        db.query(Item.id)
-        .outerjoin(seen_subq, Item.id == seen_subq.c.item_id)
-        .filter(seen_subq.c.item_id.is_(None))
-        .limit(MAX_CANDIDATES)
-    )
-    candidate_ids = [row[0] for row in candidate_rows.all()]
+        return _get_cold_start(top_k, db, cache, bucket)
+
+    # Отбираем кандидатов по индексу популярности и совместной встречаемости,
+    # товары, которые пользователь уже видел, исключаются
+    candidate_ids = candidates.get_candidate_index(db).candidates(user_id)
 
     if not candidate_ids:
         logger.info(f"Пользователь {user_id} видел все товары, нечего рекомендовать.")
-        return RecommendedItems(items=[])
+        result = RecommendedItems(items=[])
+    else:
+        logger.info(
+            f"Пользователь {user_id} — найдено {len(candidate_ids)} кандидатов для предсказания."
+        )
+        # Сбор данных и предсказание
+        result = _process_recommendations(
+            user_id, candidate_ids, db, loaded.model, top_k, temporal_features,
+            _user_features_from_stats(user_stats),
+        )
 
-    logger.info(
-        f"Пользователь {user_id} — найдено {len(candidate_ids)} кандидатов для предсказания."
-    )
+    if cache is not None:
+        cache.set_user(user_id, top_k, loaded.version, bucket, result, generation)
+    return result
 
-    # Сбор данных и предсказание
-    return _process_recommendations(user_id, candidate_ids, db, model, top_k)
+
+def _get_cold_start(
+    top_k: int, db: Session, cache: Optional[RecommendationCache], bucket: str
+) -> RecommendedItems:
+    """Рекомендации холодного старта, общие для всех пользователей без истории."""
+    if cache is not None:
+        cached = cache.get_cold_start(top_k, bucket)
+        if cached is not None:
+            return cached
+
+    result = _handle_cold_start(top_k, db)
+    if cache is not None:
+        cache.set_cold_start(top_k, bucket, result)
+    return result
 
 
 def _handle_cold_start(top_k: int, db: Session) -> RecommendedItems:
     """Обработка холодного старта: возврат популярных товаров."""
-    # Ищем самые популярные товары по всем типам событий
-    # Приоритет: transaction > addtocart > view (взвешенная популярность)
-    popular_items = (
-        db.query(
-            Event.item_id,
-            (func.count(case((Event.event_type == "transaction", 1))) * 3 +
-             func.count(case((Event.event_type == "addtocart", 1))) * 2 +
-             func.count(case((Event.event_type == "view", 1))) * 1
-            ).label("weighted_score")
-        )
-        .group_by(Event.item_id)
-        .order_by(desc("weighted_score"))
-        .limit(top_k)
-        .all()
-    )
+    # Самые популярные товары из рейтинга популярности
+    # Приоритет: transaction > addtocart > view (взвешенная популярность),
+    # при RECS_COLD_START_RANKING=decayed — с затуханием по времени
+    popular_items = popularity.get_leaderboard(db).top(top_k, ranking=get_cold_start_ranking())
 
     # Если нет никаких событий, возьмем любые товары из базы
     if not popular_items:
@@ -187,116 +407,116 @@ def _handle_cold_start(top_k: int, db: Session) -> RecommendedItems:
 
 
 def _process_recommendations(
-    user_id: int, candidate_ids: List[int], db: Session, model, top_k: int
+    user_id: int,
+    candidate_ids: List[int],
+    db: Session,
+    model,
+    top_k: int,
+    temporal_features: dict,
+    user_features: Optional[dict] = None,
 ) -> RecommendedItems:
     """Обработка рекомендаций с использованием модели."""
-    # Собираем признаки пользователя
-    user_features = _get_user_features(user_id, db)
+    # Собираем признаки пользователя, если они не переданы
+    if user_features is None:
+        user_features = _get_user_features(user_id, db)
     
-    # Собираем признаки товаров
-    item_features_map = _get_item_features(candidate_ids, db)
-    
-    # Временные признаки
-    temporal_features = _get_temporal_features()
+    # Собираем признаки товаров (матрица, выровненная с candidate_ids)
+    item_features = _get_item_features(candidate_ids, db)
 
-    # Подготавливаем данные для предсказания
-    df_pred = _prepare_prediction_data(
-        user_id, candidate_ids, user_features, item_features_map, temporal_features
+    # Подготавливаем матрицу признаков для предсказания
+    features = _prepare_prediction_data(
+        candidate_ids, user_features, item_features, temporal_features
     )
 
-    if df_pred.empty:
+    if features.shape[0] == 0:
         logger.warning(f"Нет данных для предсказания для пользователя {user_id}.")
         return RecommendedItems(items=[])
 
     # Получаем предсказания от модели
-    scores = _predict_scores(df_pred, model)
+    scores = _predict_scores(features, model)
 
-    # Сортируем и выбираем топ
-    item_score_pairs = list(zip(candidate_ids, scores))
-    item_score_pairs.sort(key=lambda x: x[1], reverse=True)
-    top_items = item_score_pairs[:top_k]
+    # Выбираем топ без полной сортировки всех кандидатов
+    top_indices = _select_top_k(scores, top_k)
+    candidate_array = np.asarray(candidate_ids)
 
-    # Формируем результат
-    recommended_items = []
-    for item_id, score in top_items:
-        recommended_items.append(
-            RecommendedItem(
-                id=item_id,
-                name=f"Item {item_id}",  # Простое название
-                score=float(score)
-            )
-        )
+    # Формируем результат только для победителей
+    recommended_items = [
+        RecommendedItem(id=int(item_id), name=f"Item {item_id}", score=float(score))
+        for item_id, score in zip(candidate_array[top_indices], scores[top_indices])
+    ]
 
     logger.info(f"Сгенерированы рекомендации для пользователя {user_id}: {len(recommended_items)} товаров.")
     return RecommendedItems(items=recommended_items)
 
 
+def _select_top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k лучших оценок по убыванию.
+
+    Отбор выполняется через argpartition за O(n), сортируются только
+    k победителей. При равных оценках выше стоит кандидат, который
+    раньше шёл в списке (стабильный порядок).
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    if k >= n:
+        top = np.arange(n)
+    else:
+        partitioned = np.argpartition(-scores, k - 1)[:k]
+        # Порог отбора: k-я по величине оценка. Кандидаты с оценкой выше
+        # порога проходят всегда, равные порогу — в порядке следования
+        threshold = scores[partitioned].min()
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+        top = np.concatenate([above, ties])
+    return top[np.lexsort((top, -scores[top]))]
+
+
 def _get_user_features(user_id: int, db: Session) -> dict:
     """Получить признаки пользователя."""
-    # Агрегируем события пользователя
-    user_stats = (
-        db.query(
-            func.count(case((Event.event_type == "view", 1))).label("n_view"),
-            func.count(case((Event.event_type == "addtocart", 1))).label("n_cart"),
-            func.count(case((Event.event_type == "transaction", 1))).label("n_buy"),
-            func.min(Event.timestamp).label("first_event_ts")
-        )
-        .filter(Event.user_id == user_id)
-        .first()
-    )
+    return _user_features_from_stats(user_features.get_user_stats(db, [user_id])[user_id])
+
+
+def _get_users_features(user_ids: List[int], db: Session) -> Dict[int, dict]:
+    """Получить признаки группы пользователей.
+
+    Агрегаты берутся из кэша признаков, промахи загружаются одним
+    сгруппированным запросом. Пользователи без событий в результат не попадают.
+    """
+    if not user_ids:
+        return {}
+    users_stats = user_features.get_user_stats(db, user_ids)
+    return {
+        user_id: _user_features_from_stats(user_stats)
+        for user_id, user_stats in users_stats.items()
+        if user_stats["n_events"] > 0
+    }
+
 
+def _user_features_from_stats(user_stats: dict) -> dict:
+    """Признаки пользователя из агрегатов его событий."""
     # Вычисляем возраст аккаунта
-    if user_stats.first_event_ts:
-        first_event_date = datetime.datetime.fromtimestamp(user_stats.first_event_ts / 1000)
+    if user_stats["first_event_ts"]:
+        first_event_date = datetime.datetime.fromtimestamp(user_stats["first_event_ts"] / 1000)
         user_lifetime_days = (datetime.datetime.now() - first_event_date).days
     else:
         user_lifetime_days = 0
 
     return {
-        "n_view": user_stats.n_view or 0,
-        "n_cart": user_stats.n_cart or 0,
-        "n_buy": user_stats.n_buy or 0,
+        "n_view": user_stats["n_view"],
+        "n_cart": user_stats["n_cart"],
+        "n_buy": user_stats["n_buy"],
         "user_lifetime_days": user_lifetime_days,
     }
 
 
-def _get_item_features(candidate_ids: List[int], db: Session) -> dict:
-    """Получить признаки товаров."""
-    # Агрегируем статистику по товарам
-    item_stats = (
-        db.query(
-            Event.item_id,
-            func.count(case((Event.event_type == "view", 1))).label("item_n_view"),
-            func.count(case((Event.event_type == "addtocart", 1))).label("item_n_cart"),
-            func.count(case((Event.event_type == "transaction", 1))).label("item_n_buy"),
-            func.count(func.distinct(Event.user_id)).label("item_n_unique_users")
-        )
-        .filter(Event.item_id.in_(candidate_ids))
-        .group_by(Event.item_id)
-        .all()
-    )
+def _get_item_features(candidate_ids: List[int], db: Session) -> np.ndarray:
+    """Получить признаки товаров.
 
-    # Создаем словарь с признаками
-    features_map = {}
-    for stats in item_stats:
-        features_map[stats.item_id] = {
-            "item_n_view": stats.item_n_view or 0,
-            "item_n_cart": stats.item_n_cart or 0,
-            "item_n_buy": stats.item_n_buy or 0,
-            "item_n_unique_users": stats.item_n_unique_users or 0,
-        }
-
-    # Добавляем нулевые значения для товаров без статистики
-    for item_id in candidate_ids:
-        if item_id not in features_map:
-            features_map[item_id] = {
-                "item_n_view": 0,
-                "item_n_cart": 0,
-                "item_n_buy": 0,
-                "item_n_unique_users": 0,
-            }
-
-    return features_map
+    Признаки читаются из предрассчитанной таблицы item_stats,
+    которая поддерживается в актуальном состоянии CRUD операциями.
+    Возвращается матрица (n_candidates, 4) в порядке candidate_ids.
+    """
+    return item_stats.get_item_feature_matrix(db, candidate_ids)
 
 
 def _get_temporal_features() -> dict:
@@ -305,39 +525,41 @@ def _get_temporal_features() -> dict:
 
 
 def _prepare_prediction_data(
-    user_id: int,
     candidate_ids: List[int],
     user_features: dict,
-    item_features_map: dict,
+    item_features: np.ndarray,
     temporal_features: dict,
-) -> pd.DataFrame:
-    """Подготовить данные для предсказания."""
-    rows = []
-    for item_id in candidate_ids:
-        row = {
-            "user_id": user_id,
-            "item_id": item_id,
-            **user_features,
-            **item_features_map[item_id],
-            **temporal_features,
-        }
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-    
-    # Выбираем только нужные колонки в правильном порядке
-    if not df.empty:
-        df = df[FEATURE_COLS]
-    
-    return df
-
-
-def _predict_scores(df_pred: pd.DataFrame, model) -> List[float]:
+) -> np.ndarray:
+    """Подготовить матрицу признаков (n_candidates, len(FEATURE_COLS)).
+
+    Признаки пользователя и временные признаки одинаковы для всех кандидатов,
+    поэтому они транслируются на все строки, а признаки товаров
+    копируются из выровненной с candidate_ids матрицы. Признак, которого
+    нет ни в одном из источников, — ValueError: матрица создаётся без
+    заполнения, и модель получила бы мусор вместо значения.
+    """
+    n_candidates = len(candidate_ids)
+    features = np.empty((n_candidates, len(FEATURE_COLS)), dtype=np.float32)
+
+    for col, name in enumerate(FEATURE_COLS):
+        if name in user_features:
+            features[:, col] = user_features[name]
+        elif name in temporal_features:
+            features[:, col] = temporal_features[name]
+        elif not _ITEM_FEATURE_SLICE.start <= col < _ITEM_FEATURE_SLICE.stop:
+            raise ValueError(f"Нет значения признака {name}")
+    if n_candidates == 0:
+        return features
+
+    features[:, _ITEM_FEATURE_SLICE] = item_features
+    return features
+
+
+def _predict_scores(features: np.ndarray, model) -> np.ndarray:
     """Получить предсказания от модели."""
     try:
-        predictions = model.predict_proba(df_pred)[:, 1]  # Вероятность класса 1
-        return predictions.tolist()
+        return predict_proba(model, features)  # Вероятность класса 1
     except Exception as e:
         logger.error(f"Ошибка предсказания модели: {e}")
         # Возвращаем случайные значения в случае ошибки
-        return np.random.random(len(df_pred)).tolist()
+        return np.random.random(len(features))
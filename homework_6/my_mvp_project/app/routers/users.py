@@ -1,16 +1,17 @@
 # app/routers/users.py
 """Модуль для работы с пользователями."""
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from .. import schemas
-from ..database import get_db
+from .. import pagination, schemas
+from ..database import get_async_db, get_db
 from ..limiter import limiter
-from . import crud
+from . import async_crud, crud
 
 router = APIRouter(
     prefix="/users",
@@ -21,23 +22,35 @@ router = APIRouter(
 
 @router.get("/", response_model=List[schemas.UserResponse])
 @limiter.limit("100/minute")
-def read_users(
-    request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+async def read_users(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Query(
+        None, description="Курсор keyset пагинации: пустой — первая страница, следующий — из X-Next-Cursor"
+    ),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[schemas.UserResponse]:
     """Получение списка пользователей."""
-    logger.info(f"Запрос списка пользователей: skip={skip}, limit={limit}")
-    users = crud.get_users(db, skip=skip, limit=limit)
+    logger.info(f"Запрос списка пользователей: skip={skip}, limit={limit}, cursor={cursor!r}")
+    if cursor is not None:
+        after_key = pagination.decode_cursor("users", cursor, 1)
+        users, has_more = await async_crud.get_users_page(db, after_key, limit)
+        pagination.set_next_cursor(response, pagination.next_cursor("users", users, has_more, lambda user: (user.id,)))
+        return users
+    users = await async_crud.get_users(db, skip=skip, limit=limit)
     return users
 
 
 @router.get("/{user_id}", response_model=schemas.UserResponse)
 @limiter.limit("100/minute")
-def read_user(
-    request: Request, user_id: int, db: Session = Depends(get_db)
+async def read_user(
+    request: Request, user_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> schemas.UserResponse:
     """Получение информации о пользователе."""
     logger.info(f"Запрос пользователя с id: {user_id}")
-    db_user = crud.get_user(db, user_id=user_id)
+    db_user = await async_crud.get_user(db, user_id=user_id)
     if db_user is None:
         logger.warning(f"Пользователь с id {user_id} не найден.")
         raise HTTPException(
@@ -53,16 +66,16 @@ async def read_user_events(
     user_id: int,
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> List[schemas.Event]:
     """Получение событий пользователя."""
     logger.info(f"Запрос событий для пользователя с id: {user_id}")
-    user = crud.get_user(db, user_id=user_id)
+    user = await async_crud.get_user(db, user_id=user_id)
     if user is None:
         logger.warning(f"Запрос событий для несуществующего пользователя: {user_id}")
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    events = crud.get_user_events(db, user_id=user_id, skip=skip, limit=limit)
+    events = await async_crud.get_user_events(db, user_id=user_id, skip=skip, limit=limit)
     logger.success(f"Найдено {len(events)} событий для пользователя {user_id}")
     return events
 
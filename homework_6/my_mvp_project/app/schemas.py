@@ -272,6 +272,32 @@ class Event(EventBase):
     model_config = {"from_attributes": True}
 
 
+class BulkEventError(BaseModel):
+    """Ошибка одной строки пакетной загрузки событий.
+
+    Attributes:
+        index (int): Номер строки в запросе (с нуля)
+        error (str): Причина отказа
+    """
+
+    index: int
+    error: str
+
+
+class BulkEventResult(BaseModel):
+    """Результат пакетной загрузки событий.
+
+    Attributes:
+        accepted (int): Записано событий
+        rejected (int): Отклонено строк
+        errors (List[BulkEventError]): Ошибки отклонённых строк
+    """
+
+    accepted: int
+    rejected: int
+    errors: List[BulkEventError]
+
+
 # Схемы для рекомендаций
 class RecommendedItem(BaseModel):
     """Схема рекомендуемого товара.
@@ -295,3 +321,15 @@ class RecommendedItems(BaseModel):
     """
 
     items: List[RecommendedItem]
+
+
+class BatchRecommendationRequest(BaseModel):
+    """Запрос рекомендаций для группы пользователей.
+
+    Attributes:
+        user_ids (List[int]): ID пользователей (до 10000 за запрос)
+        top_k (int): Количество рекомендаций на пользователя
+    """
+
+    user_ids: List[int] = Field(..., min_length=1, max_length=10000, description="ID пользователей")
+    top_k: int = Field(10, ge=1, le=100, description="Количество рекомендаций на пользователя")
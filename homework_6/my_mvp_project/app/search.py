@@ -0,0 +1,338 @@
+"""Поиск товаров каталога по свойствам.
+
+Поиск идёт по срезу последних значений свойств (item_properties_current).
+Товар найден, если запрос — подстрока (без учёта регистра) названия или
+значения одного из его свойств; оба бэкенда находят одни и те же товары:
+- InvertedIndex — инвертированный индекс в памяти процесса
+  (токен → товары с частотой токена), для SQLite, разработки и тестов;
+- поиск в PostgreSQL по триграммным GIN индексам (pg_trgm) с ILIKE
+  и ранжированием по similarity().
+Оценки релевантности у бэкендов разные.
+
+Результаты ранжируются по релевантности. Вместо точного COUNT на каждой
+странице возвращается оценка общего числа: индекс в памяти знает его
+точно, а для PostgreSQL берётся оценка планировщика.
+"""
+
+import math
+import re
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import Float, and_, cast, desc, func, or_, select
+from sqlalchemy.orm import Session
+
+from .common_utils import get_search_backend
+from .models import ItemPropertyCurrent
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(value: str) -> List[str]:
+    """Разбить строку на токены в нижнем регистре."""
+    return _TOKEN_RE.findall(value.lower())
+
+
+def _trigrams(token: str) -> Set[str]:
+    """Триграммы токена (пустое множество для токенов короче трёх символов)."""
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchResult:
+    """Страница результатов поиска.
+
+    hits — пары (item_id, оценка) по убыванию релевантности;
+    total — число найденных товаров, точное или оценка (total_is_estimate);
+    has_more — есть ли следующая страница.
+    """
+
+    def __init__(
+        self,
+        hits: List[Tuple[int, float]],
+        total: int,
+        total_is_estimate: bool = False,
+        has_more: bool = False,
+    ):
+        self.hits = hits
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+        self.has_more = has_more
+
+
+class InvertedIndex:
+    """Инвертированный индекс свойств товаров в памяти.
+
+    Совпадение то же, что у поиска в PostgreSQL: запрос — подстрока
+    (без учёта регистра) названия или значения одного из свойств товара.
+    Кандидаты отбираются по токенам: крайние токены запроса ищутся как
+    подстроки токенов через триграммы, средние — целиком; затем подстрока
+    проверяется по текстам товара. Оценка — сумма tf * idf по токенам запроса.
+    """
+
+    def __init__(self):
+        # token -> {item_id: число вхождений}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # item_id -> токены товара, чтобы снимать старые записи при обновлении
+        self._documents: Dict[int, Counter] = {}
+        # item_id -> названия и значения свойств в нижнем регистре
+        self._texts: Dict[int, List[str]] = {}
+        # Триграмма -> токены, в которых она встречается, для поиска подстрок
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> "InvertedIndex":
+        """Построить индекс по срезу свойств."""
+        started = time.perf_counter()
+        texts: Dict[int, List[str]] = {}
+        rows = db.query(
+            ItemPropertyCurrent.item_id, ItemPropertyCurrent.property, ItemPropertyCurrent.value
+        ).yield_per(10000)
+        for item_id, property_name, value in rows:
+            texts.setdefault(item_id, []).extend((property_name, value))
+
+        index = cls()
+        for item_id, item_texts in texts.items():
+            index._add(item_id, item_texts)
+        logger.info(
+            f"Поисковый индекс построен за {time.perf_counter() - started:.2f}s: "
+            f"{len(texts)} товаров, {len(index._postings)} токенов."
+        )
+        return index
+
+    def _add(self, item_id: int, texts: List[str]):
+        if not texts:
+            return
+        document = Counter()
+        for value in texts:
+            document.update(tokenize(value))
+        self._texts[item_id] = [value.lower() for value in texts]
+        if not document:
+            return
+        self._documents[item_id] = document
+        for token, count in document.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                for trigram in _trigrams(token):
+                    self._trigrams.setdefault(trigram, set()).add(token)
+            posting[item_id] = count
+
+    def _remove(self, item_id: int):
+        self._texts.pop(item_id, None)
+        document = self._documents.pop(item_id, None)
+        if not document:
+            return
+        for token in document:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(item_id, None)
+            if not posting:
+                del self._postings[token]
+                for trigram in _trigrams(token):
+                    tokens = self._trigrams[trigram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[trigram]
+
+    def index_item(self, item_id: int, texts: List[str]):
+        """Заменить тексты товара (пустой список удаляет товар из индекса)."""
+        with self._lock:
+            self._remove(item_id)
+            self._add(item_id, texts)
+
+    def _containing(self, fragment: str) -> List[str]:
+        """Токены индекса, содержащие fragment."""
+        trigrams = _trigrams(fragment)
+        if not trigrams:
+            # Короткий фрагмент: триграмм нет, перебираем словарь
+            return [token for token in self._postings if fragment in token]
+        candidates = sorted((self._trigrams.get(trigram, set()) for trigram in trigrams), key=len)
+        return [token for token in candidates[0].intersection(*candidates[1:]) if fragment in token]
+
+    def search(
+        self, query: str, limit: int, offset: int = 0, after: Optional[Tuple[float, int]] = None
+    ) -> SearchResult:
+        """Найти товары по запросу: страница результатов и точное число найденных.
+
+        after — (оценка, item_id) последнего результата предыдущей страницы
+        для курсорной пагинации, вместо offset.
+        """
+        needle = query.lower()
+        tokens = tokenize(query)
+        with self._lock:
+            n_documents = max(len(self._documents), 1)
+            scores: Optional[Dict[int, float]] = None
+            for position, token in enumerate(tokens):
+                # Крайние токены запроса могут быть частью слова, средние — только целым словом
+                edge = position in (0, len(tokens) - 1)
+                variants = self._containing(token) if edge else [token]
+                token_scores: Dict[int, float] = {}
+                for variant in variants:
+                    posting = self._postings.get(variant, {})
+                    idf = math.log(1 + n_documents / len(posting)) if posting else 0.0
+                    for item_id, count in posting.items():
+                        score = count * idf
+                        if score > token_scores.get(item_id, 0.0):
+                            token_scores[item_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        item_id: score + token_scores[item_id]
+                        for item_id, score in scores.items()
+                        if item_id in token_scores
+                    }
+                if not scores:
+                    return SearchResult([], 0)
+            if scores is None:
+                # В запросе нет слов (пробелы, знаки): проверяются все товары
+                scores = dict.fromkeys(self._texts, 0.0)
+            if tokens != [needle]:
+                # Токены лишь сужают выбор: совпадение — подстрока одного текста товара.
+                # Запрос из одного слова уже найден внутри токена текста
+                scores = {
+                    item_id: score
+                    for item_id, score in scores.items()
+                    if any(needle in text for text in self._texts[item_id])
+                }
+
+        ranked = sorted(scores.items(), key=lambda hit: (-hit[1], hit[0]))
+        if after is not None:
+            offset = bisect_right(ranked, (-after[0], after[1]), key=lambda hit: (-hit[1], hit[0]))
+        return SearchResult(ranked[offset:offset + limit], len(ranked), has_more=offset + limit < len(ranked))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_condition(query: str):
+    """Условие совпадения товара: запрос — подстрока названия или значения свойства."""
+    pattern = f"%{_escape_like(query)}%"
+    return or_(
+        ItemPropertyCurrent.value.ilike(pattern, escape="\\"),
+        ItemPropertyCurrent.property.ilike(pattern, escape="\\"),
+    )
+
+
+def _planner_row_estimate(db: Session, statement) -> int:
+    """Оценка числа строк запроса по плану PostgreSQL, без выполнения."""
+    compiled = statement.compile(dialect=db.get_bind().dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def search_database(
+    db: Session, query: str, limit: int, offset: int = 0, after: Optional[Tuple[float, int]] = None
+) -> SearchResult:
+    """Поиск в PostgreSQL по триграммным индексам среза свойств.
+
+    Совпадение — подстрока в названии или значении свойства (ILIKE
+    использует GIN индекс pg_trgm), релевантность — наибольшая
+    триграммная похожесть свойства товара на запрос.
+    """
+    # similarity() возвращает float4, а клиент получает его округлённым:
+    # сравнение с курсором повторило бы последнюю строку страницы. Оценка
+    # приводится к double precision и в сортировке, и в условии курсора
+    score = func.max(
+        cast(
+            func.greatest(
+                func.similarity(ItemPropertyCurrent.value, query),
+                func.similarity(ItemPropertyCurrent.property, query),
+            ),
+            Float,
+        )
+    )
+    matches = (
+        select(ItemPropertyCurrent.item_id, score.label("score"))
+        .where(match_condition(query))
+        .group_by(ItemPropertyCurrent.item_id)
+    )
+    page = matches.order_by(desc("score"), ItemPropertyCurrent.item_id)
+    if after is not None:
+        # Строго после (оценка, item_id) в порядке убывания оценки
+        page = page.having(
+            or_(score < after[0], and_(score == after[0], ItemPropertyCurrent.item_id > after[1]))
+        )
+    else:
+        page = page.offset(offset)
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = db.execute(page.limit(limit + 1)).all()
+    hits = [(row.item_id, float(row.score)) for row in rows[:limit]]
+    if len(rows) <= limit and after is None:
+        # Последняя страница: общее число известно точно
+        return SearchResult(hits, offset + len(hits))
+    estimate = _planner_row_estimate(db, matches)
+    return SearchResult(
+        hits, max(estimate, offset + len(rows)), total_is_estimate=True, has_more=len(rows) > limit
+    )
+
+
+_index: Optional[InvertedIndex] = None
+_index_lock = threading.Lock()
+# Предупреждение о SEARCH_BACKEND=database без PostgreSQL пишется один раз
+_backend_warned = False
+
+
+def uses_database(db: Session) -> bool:
+    """Выполнять поиск в БД (PostgreSQL), а не в индексе процесса."""
+    backend = get_search_backend()
+    if backend == "memory":
+        return False
+    global _backend_warned
+    is_postgres = db.get_bind().dialect.name == "postgresql"
+    if backend == "database" and not is_postgres and not _backend_warned:
+        _backend_warned = True
+        logger.warning("SEARCH_BACKEND=database требует PostgreSQL, используется индекс в памяти.")
+    return is_postgres
+
+
+def get_search_index(db: Session) -> InvertedIndex:
+    """Получить индекс в памяти, построив его при первом обращении."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = InvertedIndex.build(db)
+    return _index
+
+
+def refresh_search_index(db: Session) -> Optional[InvertedIndex]:
+    """Перестроить индекс в памяти и атомарно заменить текущий."""
+    global _index
+    if uses_database(db):
+        return None
+    index = InvertedIndex.build(db)
+    _index = index
+    return index
+
+
+def record_item_changed(db: Session, item_id: int):
+    """Переиндексировать товар после изменения его свойств."""
+    if _index is None:
+        return
+    rows = db.query(ItemPropertyCurrent.property, ItemPropertyCurrent.value).filter(
+        ItemPropertyCurrent.item_id == item_id
+    )
+    _index.index_item(item_id, [value for row in rows for value in row])
+
+
+def reset_search_index():
+    """Сбросить индекс (используется в тестах)."""
+    global _index
+    _index = None
+
+
+def search_items(
+    db: Session, query: str, limit: int, offset: int = 0, after: Optional[Tuple[float, int]] = None
+) -> SearchResult:
+    """Найти товары по свойствам выбранным бэкендом."""
+    if uses_database(db):
+        return search_database(db, query, limit, offset, after)
+    return get_search_index(db).search(query, limit, offset, after)
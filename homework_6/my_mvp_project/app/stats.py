@@ -0,0 +1,216 @@
+"""Системная статистика для /analytics/stats.
+
+Счётчики пользователей, товаров, событий, категорий и типов событий
+хранятся в памяти процесса и обновляются инкрементально из CRUD после
+коммита, поэтому запрос статистики не обращается к БД. Изменения
+в обход CRUD (populate_db.py, другие воркеры) учитываются периодической
+сверкой с таблицами. Удаление категории каскадно удаляет подкатегории,
+поэтому после него счётчики помечаются устаревшими и пересчитываются
+при следующем запросе. Изменения, записанные во время сверки, копятся
+в журнале и после неё применяются к новым счётчикам, если записаны
+после запроса соответствующего счётчика.
+
+В PostgreSQL доступен приближённый режим: размеры таблиц берутся
+из pg_class.reltuples (оценка после ANALYZE/VACUUM) без сканирования.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from .models import Category, Event, Item, User
+
+# Счётчик → модель, по таблице которой он сверяется
+COUNTERS = {
+    "total_users": User,
+    "total_items": Item,
+    "total_events": Event,
+    "total_categories": Category,
+}
+
+
+class SystemStats:
+    """Счётчики строк таблиц и событий по типам."""
+
+    def __init__(
+        self,
+        totals: Dict[str, int],
+        event_types: Dict[str, int],
+        counted_at: Optional[Dict[str, float]] = None,
+    ):
+        self.totals = totals
+        self.event_types = event_types
+        # Время (time.monotonic) начала запроса каждого счётчика и "event_types"
+        self.counted_at = counted_at or {}
+        self.built_at = time.time()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db: Session) -> "SystemStats":
+        """Посчитать статистику точными запросами к таблицам."""
+        started = time.perf_counter()
+        totals: Dict[str, int] = {}
+        counted_at: Dict[str, float] = {}
+        for name, model in COUNTERS.items():
+            counted_at[name] = time.monotonic()
+            totals[name] = db.query(func.count()).select_from(model).scalar()
+        counted_at["event_types"] = time.monotonic()
+        event_types = dict(db.query(Event.event_type, func.count()).group_by(Event.event_type).all())
+        logger.info(f"Системная статистика пересчитана за {time.perf_counter() - started:.3f}s: {totals}")
+        return cls(totals, event_types, counted_at)
+
+    def add(self, name: str, delta: int = 1):
+        """Изменить счётчик таблицы."""
+        with self._lock:
+            self.totals[name] = max(0, self.totals[name] + delta)
+
+    def add_event(self, event_type, delta: int = 1):
+        """Изменить число событий и счётчик их типа."""
+        event_type = getattr(event_type, "value", event_type)
+        with self._lock:
+            self.totals["total_events"] = max(0, self.totals["total_events"] + delta)
+            count = self.event_types.get(event_type, 0) + delta
+            if count > 0:
+                self.event_types[event_type] = count
+            else:
+                self.event_types.pop(event_type, None)
+
+    def replay(self, journal: List[Tuple[float, str, Any, int]]):
+        """Применить изменения, записанные после запроса своего счётчика.
+
+        Более ранние изменения уже вошли в результат запроса.
+        """
+        with self._lock:
+            for recorded_at, counter, event_type, delta in journal:
+                if recorded_at < self.counted_at.get(counter, 0.0):
+                    continue
+                if counter == "event_types":
+                    count = self.event_types.get(event_type, 0) + delta
+                    if count > 0:
+                        self.event_types[event_type] = count
+                    else:
+                        self.event_types.pop(event_type, None)
+                else:
+                    self.totals[counter] = max(0, self.totals[counter] + delta)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Статистика в формате ответа /analytics/stats."""
+        with self._lock:
+            result: Dict[str, Any] = dict(self.totals)
+            result["event_types"] = [
+                {"type": event_type, "count": count} for event_type, count in sorted(self.event_types.items())
+            ]
+        return result
+
+
+_stats: Optional[SystemStats] = None
+_stats_lock = threading.Lock()
+# Изменения во время refresh_stats: (time.monotonic, счётчик, тип события, delta)
+_journal: Optional[List[Tuple[float, str, Any, int]]] = None
+# Защищает журнал и замену _stats: изменение попадает либо в журнал, либо в новые счётчики
+_journal_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def get_stats(db: Session) -> SystemStats:
+    """Получить счётчики, посчитав их при первом обращении."""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = SystemStats.build(db)
+    return _stats
+
+
+def refresh_stats(db: Session) -> SystemStats:
+    """Сверить счётчики с таблицами и атомарно заменить текущие.
+
+    Изменения, записанные CRUD во время сверки, применяются к новым
+    счётчикам перед заменой.
+    """
+    global _stats, _journal
+    with _refresh_lock:
+        with _journal_lock:
+            _journal = []
+        try:
+            stats = SystemStats.build(db)
+        except Exception:
+            with _journal_lock:
+                _journal = None
+            raise
+        with _journal_lock:
+            stats.replay(_journal)
+            _journal = None
+            _stats = stats
+    return stats
+
+
+def _record(counter: str, event_type, delta: int):
+    """Записать изменение в журнал идущей сверки (под _journal_lock)."""
+    if _journal is not None:
+        _journal.append((time.monotonic(), counter, event_type, delta))
+
+
+def record_created(name: str, delta: int = 1):
+    """Учесть созданную (delta > 0) или удалённую (delta < 0) строку таблицы."""
+    with _journal_lock:
+        _record(name, None, delta)
+        if _stats is not None:
+            _stats.add(name, delta)
+
+
+def record_event(event_type, delta: int = 1):
+    """Учесть созданное (delta > 0) или удалённое (delta < 0) событие."""
+    event_type = getattr(event_type, "value", event_type)
+    with _journal_lock:
+        _record("total_events", None, delta)
+        _record("event_types", event_type, delta)
+        if _stats is not None:
+            _stats.add_event(event_type, delta)
+
+
+def record_event_type_changed(old_type, new_type):
+    """Перенести событие между счётчиками типов."""
+    old_type = getattr(old_type, "value", old_type)
+    new_type = getattr(new_type, "value", new_type)
+    with _journal_lock:
+        _record("event_types", old_type, -1)
+        _record("event_types", new_type, 1)
+        if _stats is not None:
+            _stats.add_event(old_type, -1)
+            _stats.add_event(new_type, 1)
+
+
+def reset_stats():
+    """Сбросить счётчики: следующий запрос посчитает их заново."""
+    global _stats
+    _stats = None
+
+
+def _approximate_totals(db: Session) -> Dict[str, int]:
+    """Оценки размеров таблиц из pg_class.reltuples (-1 — таблица не анализировалась)."""
+    tables = {model.__tablename__: name for name, model in COUNTERS.items()}
+    rows = db.execute(
+        text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relname = ANY(:tables)"),
+        {"tables": list(tables)},
+    )
+    return {tables[relname]: int(reltuples) for relname, reltuples in rows}
+
+
+def get_system_stats(db: Session, approximate: bool = False) -> Dict[str, Any]:
+    """Статистика системы из памяти процесса.
+
+    approximate=True в PostgreSQL подставляет оценки reltuples вместо
+    счётчиков таблиц; в других СУБД возвращаются обычные счётчики.
+    """
+    result = get_stats(db).snapshot()
+    result["approximate"] = False
+    if approximate and db.get_bind().dialect.name == "postgresql":
+        estimates = {name: value for name, value in _approximate_totals(db).items() if value >= 0}
+        result.update(estimates)
+        result["approximate"] = bool(estimates)
+    return result
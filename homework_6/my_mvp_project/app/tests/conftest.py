@@ -8,10 +8,16 @@ import pytest
 import pytest_asyncio
 from httpx import AsyncClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-from app.database import Base, get_db
+from app.database import Base, get_async_db, get_db
 from app.main import app
+from app.recommend.cache import LRUCacheBackend, RecommendationCache, configure_recommendation_cache
+from app.recommend.user_features import LRUFeatureStore, UserFeatureCache, configure_user_feature_cache
+from app.search import reset_search_index
+from app.stats import reset_stats
 
 
 # Создаем временную базу данных для тестов
@@ -48,17 +54,72 @@ def db_session(temp_db):
         session.close()
 
 
+@pytest.fixture(scope="session")
+def temp_async_db(temp_db):
+    """Асинхронный движок для той же временной базы."""
+    # NullPool: соединение не переживает event loop теста
+    return create_async_engine(f"sqlite+aiosqlite:///{temp_db.url.database}", poolclass=NullPool)
+
+
 @pytest.fixture
-def override_get_db(db_session):
-    """Переопределить зависимость get_db для тестов."""
+def override_get_db(db_session, temp_async_db):
+    """Переопределить зависимости get_db и get_async_db для тестов."""
     def _override_get_db():
         yield db_session
-    
+
+    TestingAsyncSessionLocal = async_sessionmaker(bind=temp_async_db, autoflush=False, expire_on_commit=False)
+
+    async def _override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = _override_get_db
+    app.dependency_overrides[get_async_db] = _override_get_async_db
     yield
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(autouse=True)
+def recommendation_cache():
+    """Свежий кэш рекомендаций в памяти на каждый тест.
+
+    Тестовые данные добавляются в БД напрямую, минуя CRUD,
+    поэтому кэш не должен переживать тест.
+    """
+    cache = RecommendationCache(LRUCacheBackend(), ttl=300)
+    configure_recommendation_cache(cache)
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def user_feature_cache():
+    """Свежий кэш признаков пользователей в памяти на каждый тест.
+
+    Тестовые события добавляются в БД напрямую, минуя CRUD.
+    """
+    cache = UserFeatureCache(LRUFeatureStore(), ttl=600)
+    configure_user_feature_cache(cache)
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def search_index():
+    """Поисковый индекс в памяти строится заново в каждом тесте."""
+    reset_search_index()
+    yield
+    reset_search_index()
+
+
+@pytest.fixture(autouse=True)
+def system_stats():
+    """Счётчики статистики пересчитываются в каждом тесте."""
+    reset_stats()
+    yield
+    reset_stats()
+
+
 @pytest_asyncio.fixture
 async def async_client(override_get_db) -> AsyncGenerator[AsyncClient, None]:
     """Создать асинхронный HTTP клиент для тестов."""
@@ -74,6 +135,24 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(scope="session")
+def tiny_model():
+    """Небольшая CatBoost модель на синтетических данных с признаками FEATURE_COLS."""
+    import numpy as np
+    import pandas as pd
+    from catboost import CatBoostClassifier
+    from app.routers.recommendations import FEATURE_COLS
+
+    rng = np.random.default_rng(42)
+    X = pd.DataFrame(rng.integers(0, 20, size=(200, len(FEATURE_COLS))), columns=FEATURE_COLS)
+    y = (X["item_n_buy"] + X["n_view"] > 18).astype(int)
+    model = CatBoostClassifier(
+        iterations=20, depth=3, verbose=False, random_seed=0, allow_writing_files=False
+    )
+    model.fit(X, y)
+    return model
+
+
 def create_test_user(db_session):
     """Создать тестового пользователя."""
     from app.models import User
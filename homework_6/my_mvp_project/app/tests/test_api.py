@@ -25,6 +25,35 @@ async def test_health_check(async_client: AsyncClient):
     assert data["status"] == "healthy"
 
 
+@pytest.mark.asyncio
+async def test_liveness_and_readiness(async_client: AsyncClient, tiny_model, monkeypatch, tmp_path):
+    """Готовность сообщается только после загрузки и прогрева модели."""
+    from app.recommend import utils
+    from app.recommend.registry import ModelRegistry
+    from app.routers import recommendations
+
+    response = await async_client.get("/health/live")
+    assert response.status_code == 200
+
+    response = await async_client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+    tiny_model.save_model(str(tmp_path / "v1.cbm"))
+    monkeypatch.setattr(recommendations, "model_registry", ModelRegistry(tmp_path))
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    try:
+        recommendations.preload_model()
+        response = await async_client.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+
+        response = await async_client.get("/health")
+        assert response.json()["model"] == "ready"
+    finally:
+        utils._model_ready.clear()
+
+
 @pytest.mark.asyncio
 async def test_api_version(async_client: AsyncClient):
     """Тест получения версии API."""
@@ -76,6 +105,19 @@ async def test_create_and_read_user(async_client: AsyncClient):
     assert response.json()["id"] == user["id"]
 
 
+def test_async_db_url(monkeypatch):
+    """Асинхронный драйвер подставляется в DATABASE_URL."""
+    from app.common_utils import get_async_db_url
+
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    monkeypatch.setenv("DATABASE_URL", "postgresql://user:pass@db:5432/recs")
+    assert get_async_db_url() == "postgresql+asyncpg://user:pass@db:5432/recs"
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///./test.db")
+    assert get_async_db_url() == "sqlite+aiosqlite:///./test.db"
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "postgresql+asyncpg://other/recs")
+    assert get_async_db_url() == "postgresql+asyncpg://other/recs"
+
+
 @pytest.mark.asyncio
 async def test_create_item_and_read(async_client: AsyncClient):
     """Тест создания и чтения товара."""
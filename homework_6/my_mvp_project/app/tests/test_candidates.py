@@ -0,0 +1,60 @@
+"""Тесты индекса отбора кандидатов."""
+
+from app.recommend.candidates import CandidateIndex
+from app.tests.conftest import create_test_user, create_test_item, create_test_event
+
+
+def test_candidates_use_cooccurrence_and_exclude_seen(db_session):
+    """Товары, купленные после просмотра того же товара, идут первыми."""
+    buyer = create_test_user(db_session)
+    viewer = create_test_user(db_session)
+    viewed = create_test_item(db_session, item_id=9101)
+    bought = create_test_item(db_session, item_id=9102)
+
+    create_test_event(db_session, buyer.id, viewed.id, "view")
+    create_test_event(db_session, buyer.id, bought.id, "transaction")
+    create_test_event(db_session, viewer.id, viewed.id, "view")
+
+    index = CandidateIndex.build(db_session)
+    candidates = index.candidates(viewer.id, pool_size=50)
+
+    assert candidates[0] == bought.id
+    assert viewed.id not in candidates
+    assert len(candidates) == len(set(candidates)) <= 50
+
+
+def test_candidates_pool_size_and_recorded_events(db_session):
+    """Размер пула ограничен, а новые события сразу исключают товар."""
+    user = create_test_user(db_session)
+    items = [create_test_item(db_session, item_id=9110 + i) for i in range(3)]
+    create_test_event(db_session, user.id, items[0].id, "view")
+
+    index = CandidateIndex.build(db_session)
+    assert len(index.candidates(user.id, pool_size=2)) == 2
+
+    index.record_event(user.id, items[1].id)
+    candidates = index.candidates(user.id, pool_size=10000)
+    assert items[0].id not in candidates
+    assert items[1].id not in candidates
+    assert items[2].id in candidates
+
+
+def test_candidates_tolerate_events_recorded_during_selection(db_session):
+    """Событие, пришедшее во время отбора, не ломает обход виденных товаров."""
+    user = create_test_user(db_session)
+    items = [create_test_item(db_session) for _ in range(3)]
+    for item in items[:2]:
+        create_test_event(db_session, user.id, item.id, "view")
+    index = CandidateIndex.build(db_session)
+
+    class RecordingNeighbours(dict):
+        """Соседи, при обращении к которым приходит новое событие пользователя."""
+
+        def get(self, item_id, default=None):
+            index.record_event(user.id, items[2].id)
+            return super().get(item_id, default)
+
+    index.neighbours = RecordingNeighbours(index.neighbours)
+    candidates = index.candidates(user.id, pool_size=10000)
+    assert items[0].id not in candidates and items[1].id not in candidates
+    assert items[2].id in index.seen[user.id]
@@ -0,0 +1,55 @@
+"""Тесты настроек пула соединений."""
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import create_engine, exc
+
+from app.common_utils import get_db_pool_settings
+from app.database import MeteredQueuePool
+
+
+def test_pool_settings_scale_with_workers(monkeypatch):
+    """Бюджет соединений делится между воркерами, явные размеры важнее."""
+    for name in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_PRE_PING"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "80")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    settings = get_db_pool_settings()
+    assert settings["pool_size"] == 5
+    assert settings["max_overflow"] == 5
+    assert settings["pool_pre_ping"] is True
+
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    settings = get_db_pool_settings()
+    assert (settings["pool_size"], settings["max_overflow"]) == (3, 0)
+    assert settings["pool_pre_ping"] is False
+
+
+def test_metered_pool_records_waits_and_timeouts(tmp_path):
+    """Пул считает выдачи соединений и таймауты ожидания."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=MeteredQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    metrics = engine.pool.metrics.snapshot()
+    assert metrics["checkouts"] == 1
+    assert metrics["timeouts"] == 1
+    assert metrics["wait_max_ms"] >= 50
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pool_status_endpoint(async_client: AsyncClient):
+    """Эндпоинт /health/db отдаёт состояние обоих пулов."""
+    response = await async_client.get("/health/db")
+    assert response.status_code == 200
+    assert set(response.json()) == {"sync", "async"}
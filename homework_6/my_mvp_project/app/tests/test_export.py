@@ -0,0 +1,73 @@
+"""Тесты потоковой выгрузки событий и свойств товаров."""
+
+import csv
+import io
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.models import Event
+from app.tests.conftest import create_test_item, create_test_item_property, create_test_user
+
+
+# База общая для всех тестов: события теста лежат в своём диапазоне времени
+_BASE_TS = 5_000_000
+
+
+def _add_events(db_session, offsets):
+    """Добавить события нового пользователя с timestamp = _BASE_TS + offset."""
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+    db_session.add_all(
+        [Event(user_id=user_id, item_id=item_id, event_type="view", timestamp=_BASE_TS + o) for o in offsets]
+    )
+    db_session.commit()
+    return user_id
+
+
+@pytest.mark.asyncio
+async def test_export_events_ndjson_and_time_range(async_client: AsyncClient, db_session):
+    """NDJSON содержит все события, диапазон [start_ts, end_ts) фильтрует по времени."""
+    user_id = _add_events(db_session, [0, 1000, 2000, 3000])
+
+    response = await async_client.get("/export/events")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    ours = [row for row in rows if row["user_id"] == user_id]
+    assert [row["timestamp"] - _BASE_TS for row in ours] == [0, 1000, 2000, 3000]
+    assert ours[0]["event_type"] == "view"
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+    params = {"start_ts": _BASE_TS + 1000, "end_ts": _BASE_TS + 3000}
+    response = await async_client.get("/export/events", params=params)
+    timestamps = [json.loads(line)["timestamp"] - _BASE_TS for line in response.text.splitlines()]
+    assert timestamps == [1000, 2000]
+
+
+@pytest.mark.asyncio
+async def test_export_item_properties_csv(async_client: AsyncClient, db_session):
+    """CSV начинается с заголовка и содержит по строке на свойство."""
+    item_id = create_test_item(db_session).id
+    for value in ("a", "b,c", 'd"e'):
+        create_test_item_property(db_session, item_id, value=value)
+
+    response = await async_client.get("/export/item_properties", params={"format": "csv"})
+    assert response.status_code == 200
+    assert "item_properties.csv" in response.headers["content-disposition"]
+    rows = [row for row in csv.DictReader(io.StringIO(response.text)) if int(row["item_id"]) == item_id]
+    assert [row["value"] for row in rows] == ["a", "b,c", 'd"e']
+
+
+@pytest.mark.asyncio
+async def test_export_events_arrow(async_client: AsyncClient, db_session):
+    """Arrow IPC поток читается pyarrow и совпадает с таблицей."""
+    pa = pytest.importorskip("pyarrow")
+    _add_events(db_session, [5000, 6000])
+
+    params = {"format": "arrow", "start_ts": _BASE_TS + 5000, "end_ts": _BASE_TS + 7000}
+    response = await async_client.get("/export/events", params=params)
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("timestamp").to_pylist() == [_BASE_TS + 5000, _BASE_TS + 6000]
@@ -0,0 +1,183 @@
+"""Тесты отложенной записи событий через очередь."""
+
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.orm import sessionmaker
+
+from app import ingest
+from app.models import Event, ItemStats
+from app.tests.conftest import create_test_item, create_test_user
+
+
+@pytest.fixture
+def event_queue(temp_db):
+    """Очередь событий с записью во временную базу."""
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=temp_db)
+    event_queue = ingest.EventIngestQueue(session_factory, max_size=100, batch_size=3, flush_ms=20)
+    ingest.configure_event_queue(event_queue)
+    yield event_queue
+    event_queue.stop()
+    ingest.configure_event_queue(None)
+
+
+def _user_events(db_session, user_id):
+    db_session.expire_all()
+    return db_session.query(Event).filter(Event.user_id == user_id).order_by(Event.timestamp).all()
+
+
+@pytest.mark.asyncio
+async def test_queued_events_flushed_in_batches(async_client: AsyncClient, db_session, event_queue):
+    """В режиме очереди ответ 202, события записываются пачкой и при остановке."""
+    event_queue.start()
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+
+    for offset, event_type in enumerate(["view", "view", "addtocart", "transaction"]):
+        response = await async_client.post(
+            "/events/",
+            json={"user_id": user_id, "item_id": item_id, "event_type": event_type, "timestamp": 1000 + offset},
+        )
+        assert response.status_code == 202
+
+    event_queue.stop()
+    events = _user_events(db_session, user_id)
+    assert [event.event_type for event in events] == ["view", "view", "addtocart", "transaction"]
+    stats = db_session.query(ItemStats).filter(ItemStats.item_id == item_id).one()
+    assert (stats.item_n_view, stats.item_n_cart, stats.item_n_buy, stats.item_n_unique_users) == (2, 1, 1, 1)
+    assert event_queue.flushed == 4
+
+
+@pytest.mark.asyncio
+async def test_sync_flag_returns_created_event(async_client: AsyncClient, db_session, event_queue):
+    """sync=true записывает событие сразу и возвращает его ID."""
+    event_queue.start()
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+
+    response = await async_client.post(
+        "/events/", params={"sync": True}, json={"user_id": user_id, "item_id": item_id, "event_type": "view"}
+    )
+    assert response.status_code == 201
+    assert response.json()["id"] == _user_events(db_session, user_id)[0].id
+
+    response = await async_client.post(
+        f"/catalog/items/{item_id}/event", params={"sync": True}, json={"user_id": user_id, "event_type": "addtocart"}
+    )
+    assert response.status_code == 200
+    assert int(response.json()["event_id"]) == _user_events(db_session, user_id)[-1].id
+
+
+class _StalledQueue(ingest.EventIngestQueue):
+    """Очередь, поток записи которой не забирает события до остановки."""
+
+    def _run(self):
+        self._stopping.wait()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejected_with_503(async_client: AsyncClient, db_session, temp_db):
+    """Заполненная очередь отвечает 503 с Retry-After, остановка дописывает события."""
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+    event = {"user_id": user_id, "item_id": item_id, "event_type": "view"}
+    event_queue = _StalledQueue(sessionmaker(bind=temp_db), max_size=1, put_timeout_ms=10)
+    event_queue.start()
+    ingest.configure_event_queue(event_queue)
+    try:
+        assert (await async_client.post("/events/", json=event)).status_code == 202
+        response = await async_client.post("/events/", json=event)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+    finally:
+        ingest.configure_event_queue(None)
+        event_queue.stop()
+    assert len(_user_events(db_session, user_id)) == 1
+
+
+@pytest.mark.asyncio
+async def test_queued_event_checked_and_stamped_on_submit(async_client: AsyncClient, db_session, temp_db):
+    """Событие с неизвестным товаром не принимается, время ставится при приёме, а не при записи."""
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+    event_queue = _StalledQueue(sessionmaker(bind=temp_db), max_size=10)
+    event_queue.start()
+    ingest.configure_event_queue(event_queue)
+    try:
+        response = await async_client.post(
+            "/events/", json={"user_id": user_id, "item_id": item_id + 1000000, "event_type": "view"}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Товар не найден"
+        assert event_queue.qsize() == 0
+
+        before = int(time.time() * 1000)
+        response = await async_client.post("/events/", json={"user_id": user_id, "item_id": item_id, "event_type": "view"})
+        after = int(time.time() * 1000)
+        assert response.status_code == 202
+    finally:
+        ingest.configure_event_queue(None)
+        event_queue.stop()
+    [event] = _user_events(db_session, user_id)
+    assert before <= event.timestamp <= after
+
+
+@pytest.mark.asyncio
+async def test_bulk_json_array_rejects_rows_individually(async_client: AsyncClient, db_session):
+    """Ошибочные строки пакета отклоняются по отдельности, остальные записываются."""
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+    records = [
+        {"user_id": user_id, "item_id": item_id, "event_type": "view", "timestamp": 2000},
+        {"user_id": user_id, "item_id": item_id, "event_type": "click"},
+        {"user_id": 0, "item_id": item_id, "event_type": "view"},
+        {"user_id": user_id, "item_id": 10**9, "event_type": "view"},
+        {"user_id": "abc", "item_id": item_id, "event_type": "view"},
+        "not an object",
+        {"user_id": user_id, "item_id": item_id, "event_type": "transaction", "transaction_id": "t-1"},
+    ]
+
+    response = await async_client.post("/events/bulk", json=records)
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (2, 5)
+    errors = {error["index"]: error["error"] for error in result["errors"]}
+    assert sorted(errors) == [1, 2, 3, 4, 5]
+    assert errors[1].startswith("event_type") and errors[3] == "Товар не найден"
+
+    events = _user_events(db_session, user_id)
+    assert [(event.event_type, event.transaction_id) for event in events] == [("view", None), ("transaction", "t-1")]
+    stats = db_session.query(ItemStats).filter(ItemStats.item_id == item_id).one()
+    assert (stats.item_n_view, stats.item_n_buy, stats.item_n_unique_users) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_bulk_ndjson(async_client: AsyncClient, db_session):
+    """NDJSON разбирается построчно, сломанная строка отклоняется."""
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+    body = "\n".join(
+        [
+            f'{{"user_id": {user_id}, "item_id": {item_id}, "event_type": "view"}}',
+            '{"user_id": ',
+            "",
+            f'{{"user_id": {user_id}, "item_id": {item_id}, "event_type": "addtocart"}}',
+        ]
+    )
+    response = await async_client.post(
+        "/events/bulk", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (2, 1)
+    assert result["errors"][0]["index"] == 1
+    assert len(_user_events(db_session, user_id)) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_rejects_bad_body_and_oversized_batch(async_client: AsyncClient):
+    """Тело не массив — 400, пакет больше MAX_BULK_EVENTS — 413."""
+    response = await async_client.post("/events/bulk", json={"user_id": 1})
+    assert response.status_code == 400
+    response = await async_client.post("/events/bulk", json=[{}] * (ingest.MAX_BULK_EVENTS + 1))
+    assert response.status_code == 413
@@ -105,3 +105,85 @@ async def test_properties_pagination(async_client: AsyncClient, db_session):
     properties_data = response.json()
     assert isinstance(properties_data, list)
     assert len(properties_data) <= 2
+
+
+@pytest.mark.asyncio
+async def test_current_snapshot_tracks_latest_value(async_client: AsyncClient, db_session):
+    """Срез хранит последнее значение свойства, as_of читает журнал."""
+    item = create_test_item(db_session)
+    now = int(time.time() * 1000)
+    created = {}
+    # Более позднее значение создаётся первым: побеждает timestamp, а не порядок
+    for value, timestamp in (("new", now), ("old", now - 10000)):
+        response = await async_client.post(
+            "/item_properties/",
+            json={"timestamp": timestamp, "item_id": item.id, "property": "price", "value": value},
+        )
+        assert response.status_code == 201
+        created[value] = response.json()["id"]
+
+    response = await async_client.get(f"/catalog/items/{item.id}")
+    assert response.status_code == 200
+    assert response.json()["properties"] == [{"property": "price", "value": "new", "timestamp": now}]
+
+    response = await async_client.get(f"/catalog/items/{item.id}?as_of={now - 5000}")
+    assert [prop["value"] for prop in response.json()["properties"]] == ["old"]
+
+    response = await async_client.get("/catalog/search?q=new")
+    assert item.id in [found["id"] for found in response.json()["items"]]
+    response = await async_client.get("/catalog/search?q=old")
+    assert item.id not in [found["id"] for found in response.json()["items"]]
+
+    # После удаления последней версии срез возвращается к предыдущей
+    response = await async_client.delete(f"/item_properties/{created['new']}")
+    assert response.status_code == 200
+    response = await async_client.get(f"/catalog/items/{item.id}")
+    assert [prop["value"] for prop in response.json()["properties"]] == ["old"]
+
+
+def test_rebuild_snapshot_matches_incremental(db_session):
+    """Полный пересчёт среза совпадает с инкрементальным обновлением."""
+    from app.models import ItemProperty, ItemPropertyCurrent
+    from app.recommend.property_snapshot import rebuild_item_properties_current, refresh_keys
+
+    item = create_test_item(db_session)
+    rows = [
+        ItemProperty(item_id=item.id, property="color", value=value, timestamp=timestamp)
+        for value, timestamp in (("red", 100), ("blue", 300), ("green", 200))
+    ]
+    rows.append(ItemProperty(item_id=item.id, property="size", value="L", timestamp=100))
+    db_session.add_all(rows)
+    db_session.flush()
+    refresh_keys(db_session, [(item.id, "color"), (item.id, "size")])
+    db_session.commit()
+
+    def snapshot():
+        query = db_session.query(ItemPropertyCurrent).filter(ItemPropertyCurrent.item_id == item.id)
+        return sorted((row.property, row.value, row.timestamp) for row in query)
+
+    incremental = snapshot()
+    assert incremental == [("color", "blue", 300), ("size", "L", 100)]
+    rebuild_item_properties_current(db_session)
+    assert snapshot() == incremental
+
+
+def test_refresh_keys_overwrites_row_added_concurrently(db_session, temp_db):
+    """Строка среза, добавленная другой транзакцией, обновляется, а не вставляется повторно."""
+    from app.models import ItemProperty, ItemPropertyCurrent
+    from app.recommend.property_snapshot import refresh_keys
+
+    item = create_test_item(db_session)
+    with temp_db.begin() as connection:
+        connection.execute(
+            ItemPropertyCurrent.__table__.insert().values(
+                item_id=item.id, property="color", value="red", timestamp=100, property_id=0
+            )
+        )
+    latest = ItemProperty(item_id=item.id, property="color", value="blue", timestamp=300)
+    db_session.add(latest)
+    db_session.flush()
+
+    refresh_keys(db_session, [(item.id, "color"), (item.id, "size")])
+    db_session.commit()
+    rows = db_session.query(ItemPropertyCurrent).filter(ItemPropertyCurrent.item_id == item.id).all()
+    assert [(row.property, row.value, row.property_id) for row in rows] == [("color", "blue", latest.id)]
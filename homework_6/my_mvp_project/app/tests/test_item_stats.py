@@ -0,0 +1,102 @@
+"""Тесты предрассчитанной статистики товаров."""
+
+from app import schemas
+from app.models import ItemStats
+from app.recommend import item_stats
+from app.routers import crud
+from app.tests.conftest import create_test_user, create_test_item
+
+
+def _stats_row(db_session, item_id):
+    db_session.expire_all()
+    return db_session.query(ItemStats).filter(ItemStats.item_id == item_id).first()
+
+
+def test_item_stats_updated_on_event_create_and_delete(db_session):
+    """Статистика товара обновляется при создании и удалении событий."""
+    user = create_test_user(db_session)
+    other_user = create_test_user(db_session)
+    item = create_test_item(db_session, item_id=9001)
+
+    first = crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="view"))
+    crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="addtocart"))
+    crud.create_event(db_session, schemas.EventCreate(user_id=other_user.id, item_id=item.id, event_type="transaction"))
+
+    row = _stats_row(db_session, item.id)
+    assert (row.item_n_view, row.item_n_cart, row.item_n_buy, row.item_n_unique_users) == (1, 1, 1, 2)
+
+    # Удаление одного из двух событий пользователя не меняет число уникальных пользователей
+    crud.delete_event(db_session, first.id)
+    row = _stats_row(db_session, item.id)
+    assert (row.item_n_view, row.item_n_unique_users) == (0, 2)
+
+
+def test_item_stats_event_type_change(db_session):
+    """Изменение типа события переносит его между счётчиками."""
+    user = create_test_user(db_session)
+    item = create_test_item(db_session, item_id=9002)
+    event = crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="view"))
+
+    crud.update_event(db_session, event.id, event_type="transaction")
+    row = _stats_row(db_session, item.id)
+    assert (row.item_n_view, row.item_n_buy) == (0, 1)
+
+
+def test_rebuild_matches_incremental(db_session):
+    """Полный пересчёт совпадает с инкрементальными обновлениями."""
+    user = create_test_user(db_session)
+    item = create_test_item(db_session, item_id=9003)
+    for event_type in ["view", "view", "transaction"]:
+        crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type=event_type))
+
+    incremental = item_stats.get_item_stats(db_session, [item.id])
+    item_stats.rebuild_item_stats(db_session)
+    assert item_stats.get_item_stats(db_session, [item.id]) == incremental
+    assert incremental[item.id] == {
+        "item_n_view": 2,
+        "item_n_cart": 0,
+        "item_n_buy": 1,
+        "item_n_unique_users": 1,
+    }
+
+
+def test_item_stats_missing_items_are_zero(db_session):
+    """Товары без событий получают нулевые признаки."""
+    features = item_stats.get_item_stats(db_session, [987654])
+    assert features[987654] == dict.fromkeys(item_stats.ITEM_FEATURE_COLS, 0)
+
+
+def test_item_feature_matrix_aligned_with_ids(db_session):
+    """Матрица признаков выровнена с порядком переданных товаров."""
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="addtocart"))
+
+    matrix = item_stats.get_item_feature_matrix(db_session, [987655, item.id])
+    assert matrix.shape == (2, len(item_stats.ITEM_FEATURE_COLS))
+    assert matrix[0].tolist() == [0, 0, 0, 0]
+    assert matrix[1].tolist() == [0, 1, 0, 1]
+
+
+def test_item_stats_upsert_adds_to_existing_row(db_session, temp_db):
+    """Строка, созданная другой транзакцией, дополняется, а не вставляется повторно."""
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    other_item = create_test_item(db_session)
+    with temp_db.begin() as connection:
+        connection.execute(
+            ItemStats.__table__.insert().values(
+                item_id=item.id, item_n_view=5, item_n_cart=0, item_n_buy=0, item_n_unique_users=3
+            )
+        )
+
+    item_stats.record_events_created(db_session, [(user.id, item.id, "view"), (user.id, item.id, "addtocart")])
+    db_session.commit()
+    row = _stats_row(db_session, item.id)
+    assert (row.item_n_view, row.item_n_cart, row.item_n_unique_users) == (6, 1, 4)
+
+    # Отрицательная прибавка для товара без строки не делает счётчик отрицательным
+    item_stats.record_event_type_changed(db_session, other_item.id, "view", "transaction")
+    db_session.commit()
+    row = _stats_row(db_session, other_item.id)
+    assert (row.item_n_view, row.item_n_buy) == (0, 1)
@@ -0,0 +1,80 @@
+"""Тесты реестра версий модели и горячей замены."""
+
+import pytest
+from httpx import AsyncClient
+
+from app.recommend import utils
+from app.recommend.registry import ModelRegistry, ModelValidationError
+from app.routers import admin, recommendations
+from app.tests.conftest import create_test_user
+
+
+@pytest.fixture
+def registry(tmp_path, tiny_model, monkeypatch):
+    """Реестр во временном каталоге с двумя версиями модели."""
+    tiny_model.save_model(str(tmp_path / "v1.cbm"))
+    tiny_model.save_model(str(tmp_path / "v2.cbm"))
+    registry = ModelRegistry(tmp_path)
+    monkeypatch.setattr(recommendations, "model_registry", registry)
+    monkeypatch.setattr(admin, "model_registry", registry)
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    yield registry
+    utils._model_ready.clear()
+
+
+def test_registry_versions_and_activation(registry):
+    """Без CURRENT активна последняя версия, activate переключает все воркеры."""
+    assert registry.available_versions() == ["v1", "v2"]
+    assert registry.current().version == "v2"
+
+    registry.activate("v1", validate=recommendations.validate_model)
+    assert registry.current_version == "v1"
+    assert registry.target_version() == "v1"
+    assert registry.reload_if_changed() is None
+
+
+def test_registry_keeps_model_when_validation_fails(registry):
+    """Версия, не прошедшая проверку, не заменяет текущую модель."""
+    registry.reload("v1")
+
+    def broken(model):
+        raise ValueError("broken")
+
+    with pytest.raises(ModelValidationError):
+        registry.reload("v2", validate=broken)
+    assert registry.current_version == "v1"
+    assert registry.reload_if_changed(validate=broken) is None
+
+
+@pytest.mark.asyncio
+async def test_admin_reload_and_version_header(async_client: AsyncClient, db_session, registry, monkeypatch):
+    """Перезагрузка через админ-API и заголовок с версией модели в ответе."""
+    response = await async_client.post("/admin/model/reload", params={"version": "v1"})
+    assert response.status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    response = await async_client.post("/admin/model/reload", params={"version": "v1"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["version"] == "v1"
+
+    response = await async_client.post("/admin/model/reload", params={"version": "v9"}, headers=headers)
+    assert response.status_code == 404
+
+    user = create_test_user(db_session)
+    response = await async_client.get(f"/recommendations/{user.id}")
+    assert response.status_code == 200
+    assert response.headers[recommendations.MODEL_VERSION_HEADER] == "v1"
+
+
+def test_registry_rejects_versions_outside_directory(registry, tmp_path, tiny_model):
+    """Версия вне каталога реестра не загружается и не попадает в CURRENT."""
+    outside = tmp_path.parent / f"{tmp_path.name}-outside"
+    outside.mkdir()
+    tiny_model.save_model(str(outside / "evil.cbm"))
+
+    for version in (f"../{outside.name}/evil", "v1/../v2", "/etc/passwd"):
+        with pytest.raises(FileNotFoundError):
+            registry.activate(version)
+    assert not (tmp_path / "CURRENT").exists()
+    assert registry.current_version is None
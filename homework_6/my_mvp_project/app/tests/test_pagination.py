@@ -0,0 +1,89 @@
+"""Тесты курсорной (keyset) пагинации списков."""
+
+import pytest
+from httpx import AsyncClient
+
+from app.models import Event
+from app.pagination import NEXT_CURSOR_HEADER, encode_cursor
+from app.tests.conftest import create_test_event, create_test_item, create_test_item_property, create_test_user
+
+
+async def _walk(async_client: AsyncClient, path: str, limit: int) -> list:
+    """Пройти весь список по курсорам, собрав строки всех страниц."""
+    rows, cursor = [], ""
+    while cursor is not None:
+        response = await async_client.get(path, params={"limit": limit, "cursor": cursor})
+        assert response.status_code == 200
+        rows.extend(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_events_cursor_walks_all_rows_in_order(async_client: AsyncClient, db_session):
+    """Курсор по (timestamp, id) проходит все события без пропусков и повторов."""
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    for _ in range(5):
+        create_test_event(db_session, user.id, item.id)
+    # Одинаковый timestamp: порядок различает id
+    db_session.add_all([Event(user_id=user.id, item_id=item.id, event_type="view", timestamp=1000) for _ in range(3)])
+    db_session.commit()
+
+    events = await _walk(async_client, "/events/", limit=2)
+    keys = [(event["timestamp"], event["id"]) for event in events]
+    assert keys == sorted(keys)
+    assert len(keys) == len(set(keys)) == db_session.query(Event).count()
+
+
+@pytest.mark.asyncio
+async def test_list_cursors_match_offset_pages(async_client: AsyncClient, db_session):
+    """Курсорные страницы users/items/item_properties совпадают со списком по id."""
+    item = create_test_item(db_session)
+    for _ in range(3):
+        create_test_user(db_session)
+        create_test_item_property(db_session, item.id)
+
+    for path in ("/users/", "/items/", "/item_properties/"):
+        walked = [row["id"] for row in await _walk(async_client, path, limit=2)]
+        assert walked == sorted(walked) and len(walked) == len(set(walked))
+        first_page = (await async_client.get(path, params={"limit": 100})).json()
+        assert set(row["id"] for row in first_page) <= set(walked)
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_rejected(async_client: AsyncClient):
+    """Повреждённый или чужой курсор — ошибка 400."""
+    response = await async_client.get("/events/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    response = await async_client.get("/events/", params={"cursor": encode_cursor("users", [1])})
+    assert response.status_code == 400
+    for values in (["x", 1], [None, 1], [1, True], [[1], 2]):
+        response = await async_client.get("/events/", params={"cursor": encode_cursor("events", values)})
+        assert response.status_code == 400
+    response = await async_client.get(
+        "/catalog/search", params={"q": "acme", "cursor": encode_cursor("catalog_search", ["x", 1])}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_catalog_search_cursor(async_client: AsyncClient, db_session):
+    """Курсор поиска каталога проходит все результаты по убыванию релевантности."""
+    for i in range(5):
+        item = create_test_item(db_session)
+        response = await async_client.post(
+            "/item_properties/",
+            json={"timestamp": 1000, "item_id": item.id, "property": "brand", "value": "acme " * (i + 1)},
+        )
+        assert response.status_code == 201
+
+    found, cursor = [], ""
+    while cursor is not None:
+        response = await async_client.get("/catalog/search", params={"q": "acme", "limit": 2, "cursor": cursor})
+        data = response.json()
+        found.extend((hit["score"], hit["id"]) for hit in data["items"])
+        cursor = data["next_cursor"]
+
+    assert len(found) == 5 == len(set(found))
+    assert found == sorted(found, key=lambda hit: (-hit[0], hit[1]))
@@ -0,0 +1,66 @@
+"""Тесты рейтинга популярности товаров."""
+
+import pytest
+from sqlalchemy import case, desc, func
+
+from app.models import Event
+from app.recommend.popularity import PopularityLeaderboard
+from app.tests.conftest import create_test_user, create_test_item, create_test_event
+
+
+def test_incremental_updates_match_rebuild(db_session):
+    """Инкрементальный рейтинг совпадает с перестроенным и с агрегатом в БД."""
+    user = create_test_user(db_session)
+    items = [create_test_item(db_session, item_id=9201 + i) for i in range(3)]
+    leaderboard = PopularityLeaderboard.build(db_session)
+
+    for item, event_type in ((items[0], "view"), (items[1], "transaction"), (items[1], "view"), (items[2], "addtocart")):
+        event = create_test_event(db_session, user.id, item.id, event_type)
+        leaderboard.record_event(event.item_id, event.event_type, event.timestamp)
+
+    rebuilt = PopularityLeaderboard.build(db_session)
+    for ranking in ("raw", "weighted"):
+        assert leaderboard.top(20, ranking) == rebuilt.top(20, ranking)
+    assert [score for _, score in leaderboard.top(20, "decayed")] == pytest.approx(
+        [score for _, score in rebuilt.top(20, "decayed")]
+    )
+
+    weighted_score = (
+        func.count(case((Event.event_type == "transaction", 1))) * 3
+        + func.count(case((Event.event_type == "addtocart", 1))) * 2
+        + func.count(case((Event.event_type == "view", 1)))
+    )
+    expected = (
+        db_session.query(Event.item_id, weighted_score.label("score"))
+        .group_by(Event.item_id)
+        .order_by(desc("score"), Event.item_id)
+        .limit(5)
+        .all()
+    )
+    assert rebuilt.top(5, "weighted") == [(item_id, score) for item_id, score in expected]
+
+
+def test_decayed_ranking_prefers_recent_events():
+    """Свежий просмотр обгоняет давнюю покупку, взвешенный рейтинг — нет."""
+    hour = 3600 * 1000
+    leaderboard = PopularityLeaderboard(half_life_ms=hour, anchor_ts=0)
+    leaderboard.record_event(1, "transaction", timestamp=0)
+    leaderboard.record_event(2, "view", timestamp=10 * hour)
+
+    assert [item_id for item_id, _ in leaderboard.top(2, "weighted")] == [1, 2]
+    decayed = leaderboard.top(2, "decayed")
+    assert [item_id for item_id, _ in decayed] == [2, 1]
+    # Оценки приведены к моменту последнего события
+    assert decayed[0][1] == pytest.approx(1.0)
+    assert decayed[1][1] == pytest.approx(3 * 2 ** -10)
+
+
+def test_decayed_ranking_reanchors_far_future_events():
+    """Событие далеко после опорного момента не переполняет оценки."""
+    hour = 3600 * 1000
+    leaderboard = PopularityLeaderboard(half_life_ms=hour, anchor_ts=0)
+    leaderboard.record_event(1, "transaction", timestamp=0)
+    leaderboard.record_event(2, "view", timestamp=2000 * hour)
+
+    assert leaderboard.anchor_ts == 2000 * hour
+    assert leaderboard.top(2, "decayed") == [(2, pytest.approx(1.0)), (1, pytest.approx(0.0))]
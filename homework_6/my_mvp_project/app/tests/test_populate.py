@@ -0,0 +1,180 @@
+"""Тесты загрузки данных scripts/populate_db.py."""
+
+import pytest
+from sqlalchemy import create_engine, func, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Event, IngestCheckpoint, Item, ItemProperty, ItemStats, User
+from scripts import populate_db
+
+EVENTS_HEADER = "timestamp,visitorid,event,itemid,transactionid\n"
+PROPS_HEADER = "timestamp,itemid,property,value\n"
+
+
+@pytest.fixture
+def populate_env(tmp_path, monkeypatch):
+    """Отдельная база и файлы данных: скрипт работает с глобальным engine."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'populate.db'}")
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(populate_db, "engine", engine)
+    monkeypatch.setattr(populate_db, "SessionLocal", sessionmaker(bind=engine))
+
+    paths = {
+        "events": tmp_path / "events.csv",
+        "props": tmp_path / "item_properties_part1.csv",
+        "categories": tmp_path / "category_tree.csv",
+    }
+    paths["events"].write_text(EVENTS_HEADER)
+    paths["props"].write_text(PROPS_HEADER)
+    paths["categories"].write_text("categoryid,parentid\n1,\n")
+    monkeypatch.setattr(populate_db, "EVENTS_FILE", str(paths["events"]))
+    monkeypatch.setattr(populate_db, "CATEGORY_FILE", str(paths["categories"]))
+    yield engine, paths
+    engine.dispose()
+
+
+def _count(engine, model) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar()
+
+
+def _checkpoint(engine, source: str):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(IngestCheckpoint.byte_offset, IngestCheckpoint.rows_loaded).where(IngestCheckpoint.source == source)
+        ).first()
+
+
+def test_incremental_resumes_from_checkpoint(populate_env):
+    """Повторный запуск дочитывает только новые целые строки файла."""
+    engine, paths = populate_env
+    with paths["events"].open("a") as f:
+        f.write("1000,1,view,10,\n2000,1,addtocart,10,\n")
+
+    assert populate_db.ingest_events_incremental(str(paths["events"])) == 2
+    assert _checkpoint(engine, "events.csv") == (paths["events"].stat().st_size, 2)
+    assert populate_db.ingest_events_incremental(str(paths["events"])) == 0
+
+    # Недописанная строка без перевода строки ждёт следующего запуска
+    complete = paths["events"].stat().st_size
+    with paths["events"].open("a") as f:
+        f.write("3000,2,view,11,\n4000,2,vi")
+    assert populate_db.ingest_events_incremental(str(paths["events"])) == 1
+    assert _checkpoint(engine, "events.csv") == (complete + len("3000,2,view,11,\n"), 3)
+
+    with paths["events"].open("a") as f:
+        f.write("ew,11,\n")
+    assert populate_db.ingest_events_incremental(str(paths["events"])) == 1
+    assert _count(engine, Event) == 4
+
+
+def test_incremental_rebuilds_derived_tables_after_crash(populate_env, monkeypatch):
+    """Прерванный до пересчёта запуск пересчитывает таблицы при повторе без новых строк."""
+    engine, paths = populate_env
+    with paths["events"].open("a") as f:
+        f.write("1000,1,view,10,\n2000,2,view,10,\n")
+    with paths["props"].open("a") as f:
+        f.write("1000,10,color,red\n")
+
+    rebuild = populate_db.rebuild_derived_tables
+
+    def crash(session, rollups=True):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(populate_db, "rebuild_derived_tables", crash)
+    with pytest.raises(KeyboardInterrupt):
+        populate_db.run_incremental([str(paths["props"])])
+    assert _count(engine, Event) == 2 and _count(engine, ItemProperty) == 1
+    assert _count(engine, ItemStats) == 0
+    assert populate_db.derived_dirty()
+
+    monkeypatch.setattr(populate_db, "rebuild_derived_tables", rebuild)
+    populate_db.run_incremental([str(paths["props"])])
+    with engine.connect() as connection:
+        views = connection.execute(select(ItemStats.item_n_view).where(ItemStats.item_id == 10)).scalar()
+    assert views == 2
+    assert not populate_db.derived_dirty()
+    assert _count(engine, Event) == 2
+
+
+def test_full_load_marks_only_files_it_loaded(populate_env):
+    """Файлы уже заполненных таблиц не отмечаются, инкрементальная загрузка их не задваивает."""
+    engine, paths = populate_env
+    with paths["events"].open("a") as f:
+        f.write("1000,1,view,10,\n")
+    with paths["props"].open("a") as f:
+        f.write("1000,10,color,red\n")
+    # База заполнена до появления ingest_checkpoints
+    with engine.begin() as connection:
+        connection.execute(Event.__table__.insert().values(timestamp=1000, user_id=1, item_id=10, event_type="view"))
+
+    sources = {str(paths["events"]): Event.__table__, str(paths["props"]): ItemProperty.__table__}
+    file_sizes = populate_db.unloaded_file_sizes(sources)
+    assert file_sizes == {str(paths["props"]): paths["props"].stat().st_size}
+    populate_db.mark_files_loaded(file_sizes)
+    assert _checkpoint(engine, "events.csv") is None
+
+    with pytest.raises(RuntimeError, match="events.csv"):
+        populate_db.ensure_checkpoints(sources)
+    assert _count(engine, Event) == 1
+
+
+def test_csv_blocks_split_at_every_offset(tmp_path):
+    """Диапазоны с границей в любом байте вместе дают каждую строку ровно один раз."""
+    path = tmp_path / "props.csv"
+    rows = [f"{1000 + i},{i},prop{i % 3},{'v' * (i % 4)}\n" for i in range(12)]
+    path.write_text(PROPS_HEADER + "".join(rows))
+    size = path.stat().st_size
+
+    def read(start, end, block_bytes):
+        return b"".join(populate_db.iter_csv_blocks(str(path), start, end, block_bytes)).decode()
+
+    expected = "".join(rows)
+    for split in range(size + 1):
+        for block_bytes in (1, 7, size):
+            assert read(0, split, block_bytes) + read(split, size, block_bytes) == expected, (split, block_bytes)
+
+    for shard_bytes in range(1, size + 1):
+        shards = populate_db.plan_shards([str(path)], shard_bytes)
+        assert shards[0][1] == 0 and shards[-1][2] == size
+        assert all(prev[2] == nxt[1] for prev, nxt in zip(shards, shards[1:]))
+        assert "".join(read(start, end, 5) for _, start, end in shards) == expected, shard_bytes
+
+
+def test_fast_property_load_drops_staging_tables_on_failure(populate_env, monkeypatch):
+    """Ошибка воркера не оставляет промежуточных таблиц."""
+    engine, paths = populate_env
+    with paths["props"].open("a") as f:
+        f.write("1000,10,color,red\n2000,11,color,blue\n")
+    monkeypatch.setattr(populate_db, "SHARD_BYTES", 16)
+
+    def fail(task):
+        raise RuntimeError("воркер упал")
+
+    monkeypatch.setattr(populate_db, "_load_property_shard", fail)
+    with pytest.raises(RuntimeError, match="воркер упал"):
+        populate_db.load_item_properties_fast([str(paths["props"])], {10, 11}, workers=1)
+    assert not [name for name in inspect(engine).get_table_names() if name.startswith("item_properties_stage_")]
+
+
+def test_transaction_id_same_in_classic_and_incremental_load(populate_env):
+    """Классическая и инкрементальная загрузка сохраняют transaction_id одинаково."""
+    engine, paths = populate_env
+    with paths["events"].open("a") as f:
+        f.write("1000,1,view,10,\n2000,1,transaction,10,4000\n")
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert().values(id=1))
+        connection.execute(Item.__table__.insert().values(id=10))
+
+    with populate_db.SessionLocal() as session:
+        populate_db.load_events(session, str(paths["events"]), use_test_split=True)
+    with engine.connect() as connection:
+        classic = connection.execute(select(Event.transaction_id).order_by(Event.timestamp)).scalars().all()
+        connection.execute(Event.__table__.delete())
+        connection.commit()
+
+    populate_db.ingest_events_incremental(str(paths["events"]))
+    with engine.connect() as connection:
+        incremental = connection.execute(select(Event.transaction_id).order_by(Event.timestamp)).scalars().all()
+    assert classic == incremental == [None, "4000"]
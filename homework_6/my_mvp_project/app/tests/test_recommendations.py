@@ -1,5 +1,9 @@
 """Тесты для рекомендаций."""
 
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
 import pytest
 from httpx import AsyncClient
 from app.tests.conftest import create_test_user, create_test_item, create_test_event
@@ -73,4 +77,415 @@ async def test_recommendations_different_event_types(async_client: AsyncClient,
     if response.status_code == 200:
         recs = response.json()
         assert "items" in recs
-        assert isinstance(recs["items"], list) 
\ No newline at end of file
+        assert isinstance(recs["items"], list)
+
+
+def test_prepare_prediction_data_matches_dataframe(tiny_model):
+    """Матрица признаков совпадает с прежним DataFrame и даёт те же предсказания."""
+    from app.routers.recommendations import FEATURE_COLS, _prepare_prediction_data, _predict_scores
+
+    candidate_ids = [11, 12, 13]
+    user_features = {"n_view": 5, "n_cart": 1, "n_buy": 0, "user_lifetime_days": 30}
+    item_features = np.array([[3, 1, 0, 2], [0, 0, 0, 0], [10, 4, 2, 7]], dtype=np.float32)
+    temporal_features = {"is_weekend": 1, "is_evening": 0}
+
+    matrix = _prepare_prediction_data(candidate_ids, user_features, item_features, temporal_features)
+    assert matrix.shape == (3, len(FEATURE_COLS))
+    assert matrix.dtype == np.float32
+
+    df = pd.DataFrame([
+        {**user_features, **dict(zip(FEATURE_COLS[4:8], row)), **temporal_features}
+        for row in item_features.tolist()
+    ])[FEATURE_COLS]
+    assert np.array_equal(df.to_numpy(dtype=np.float32), matrix)
+    assert np.array_equal(tiny_model.predict_proba(df)[:, 1], _predict_scores(matrix, tiny_model))
+
+
+def test_select_top_k_matches_full_sort_with_stable_ties():
+    """Отбор топа совпадает с полной сортировкой, равные оценки — в исходном порядке."""
+    from app.routers.recommendations import _select_top_k
+
+    scores = np.array([0.5, 0.9, 0.5, 0.1, 0.9, 0.5, 0.7])
+    assert _select_top_k(scores, 3).tolist() == [1, 4, 6]
+    assert _select_top_k(scores, 4).tolist() == [1, 4, 6, 0]
+    assert _select_top_k(scores, 5).tolist() == [1, 4, 6, 0, 2]
+    assert _select_top_k(scores, 100).tolist() == [1, 4, 6, 0, 2, 5, 3]
+
+    rng = np.random.default_rng(1)
+    random_scores = rng.random(5000)
+    expected = sorted(range(5000), key=lambda i: -random_scores[i])[:100]
+    assert _select_top_k(random_scores, 100).tolist() == expected
+
+
+def test_cbm_model_and_fast_predictor(tiny_model, tmp_path):
+    """Модель в формате .cbm даёт те же вероятности, что и predict_proba."""
+    from app.recommend.utils import load_model_file, predict_proba
+
+    path = tmp_path / "model.cbm"
+    tiny_model.save_model(str(path), format="cbm")
+    model = load_model_file(path)
+
+    features = np.random.default_rng(2).integers(0, 20, size=(50, 10)).astype(np.float32)
+    assert np.array_equal(predict_proba(model, features), tiny_model.predict_proba(features)[:, 1])
+
+
+def test_recommendation_cache_invalidated_by_new_event(db_session, tiny_model, recommendation_cache, monkeypatch):
+    """Повторный запрос берётся из кэша, новое событие пользователя сбрасывает кэш."""
+    from app import schemas
+    from app.recommend.registry import LoadedModel
+    from app.routers import crud
+    from app.routers.recommendations import _generate_recommendations
+
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    loaded = LoadedModel(version="v1", model=tiny_model)
+    temporal = {"is_weekend": 0, "is_evening": 1}
+    user = create_test_user(db_session)
+    items = [create_test_item(db_session) for _ in range(3)]
+    create_test_event(db_session, user.id, items[0].id, "view")
+
+    first = _generate_recommendations(user.id, 5, db_session, loaded, temporal)
+    assert recommendation_cache.get_user(user.id, 5, "v1", "w0e1") == first
+    # Другая версия модели и другой временной бакет — другие ключи
+    assert recommendation_cache.get_user(user.id, 5, "v2", "w0e1") is None
+    assert recommendation_cache.get_user(user.id, 5, "v1", "w1e1") is None
+
+    crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=items[1].id, event_type="addtocart"))
+    assert recommendation_cache.get_user(user.id, 5, "v1", "w0e1") is None
+
+
+def test_cold_start_cache_shared_between_users(db_session, tiny_model, recommendation_cache):
+    """Пользователи без истории получают общий закэшированный холодный старт."""
+    from app.recommend.registry import LoadedModel
+    from app.routers.recommendations import _generate_recommendations
+
+    loaded = LoadedModel(version="v1", model=tiny_model)
+    temporal = {"is_weekend": 1, "is_evening": 0}
+    first_user, second_user = create_test_user(db_session), create_test_user(db_session)
+
+    first = _generate_recommendations(first_user.id, 3, db_session, loaded, temporal)
+    assert recommendation_cache.get_cold_start(3, "w1e0") == first
+    assert recommendation_cache.get_user(first_user.id, 3, "v1", "w1e0") is None
+    assert _generate_recommendations(second_user.id, 3, db_session, loaded, temporal) == first
+
+
+def test_redis_cache_backend_expiry_and_invalidation(monkeypatch):
+    """Общий бэкенд: TTL на пространство имён, срок записи и сброс пользователя."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.recommend import cache as cache_module
+    from app.recommend.cache import RecommendationCache, RedisCacheBackend
+    from app.schemas import RecommendedItem, RecommendedItems
+
+    client = fakeredis.FakeRedis()
+    cache = RecommendationCache(RedisCacheBackend(client), ttl=60)
+    recs = RecommendedItems(items=[RecommendedItem(id=1, name="Item 1", score=0.5)])
+
+    cache.set_user(7, 10, "v1", "w0e0", recs)
+    cache.set_cold_start(10, "w0e0", recs)
+    assert 0 < client.ttl("mvp:recs:user:7") <= 60
+    assert cache.get_user(7, 10, "v1", "w0e0") == recs
+
+    cache.invalidate_user(7)
+    assert cache.get_user(7, 10, "v1", "w0e0") is None
+    assert cache.get_cold_start(10, "w0e0") == recs
+
+    # Запись старше TTL не отдаётся, даже если ключ ещё жив
+    now = cache_module.time.time()
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now + 61))
+    assert cache.get_cold_start(10, "w0e0") is None
+
+
+@pytest.mark.parametrize("backend_name", ["memory", "redis"])
+def test_cache_skips_recommendations_computed_before_invalidation(backend_name):
+    """Результат, рассчитанный до сброса кэша пользователя, не записывается."""
+    from app.recommend.cache import LRUCacheBackend, RecommendationCache, RedisCacheBackend
+    from app.schemas import RecommendedItem, RecommendedItems
+
+    if backend_name == "redis":
+        backend = RedisCacheBackend(pytest.importorskip("fakeredis").FakeRedis())
+    else:
+        backend = LRUCacheBackend()
+    cache = RecommendationCache(backend, ttl=60)
+    stale = RecommendedItems(items=[RecommendedItem(id=1, name="Item 1", score=0.5)])
+    fresh = RecommendedItems(items=[RecommendedItem(id=2, name="Item 2", score=0.7)])
+
+    # Запрос начал расчёт, затем пришло событие пользователя
+    generation = cache.user_generation(7)
+    cache.invalidate_user(7)
+    cache.set_user(7, 10, "v1", "w0e0", stale, generation)
+    assert cache.get_user(7, 10, "v1", "w0e0") is None
+
+    cache.set_user(7, 10, "v1", "w0e0", fresh, cache.user_generation(7))
+    assert cache.get_user(7, 10, "v1", "w0e0") == fresh
+
+
+def test_batch_recommendations_match_single_user_path(db_session, tiny_model, monkeypatch):
+    """Пакетный путь даёт те же рекомендации, что и запрос по одному пользователю."""
+    from app.recommend.cache import configure_recommendation_cache
+    from app.recommend.registry import LoadedModel
+    from app.routers import recommendations
+
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    monkeypatch.setattr(recommendations, "BATCH_CHUNK_SIZE", 2)
+    configure_recommendation_cache(None)
+    loaded = LoadedModel(version="v1", model=tiny_model)
+    temporal = {"is_weekend": 0, "is_evening": 0}
+
+    users = [create_test_user(db_session) for _ in range(3)]
+    items = [create_test_item(db_session) for _ in range(3)]
+    create_test_event(db_session, users[0].id, items[0].id, "view")
+    create_test_event(db_session, users[1].id, items[1].id, "transaction")
+    create_test_event(db_session, users[1].id, items[2].id, "view")
+    user_ids = [users[0].id, 999999, users[1].id, users[2].id]
+
+    batch = list(recommendations._generate_batch_recommendations(user_ids, 5, db_session, loaded, temporal))
+    assert [user_id for user_id, _ in batch] == user_ids
+    assert batch[1][1] is None
+    for user_id, result in batch:
+        if result is not None:
+            expected = recommendations._generate_recommendations(user_id, 5, db_session, loaded, temporal)
+            assert result == expected
+
+
+@pytest.mark.asyncio
+async def test_batch_recommendations_endpoint_streams_ndjson(async_client: AsyncClient, db_session, tiny_model, monkeypatch, tmp_path):
+    """POST /recommendations/batch отдаёт по строке NDJSON на пользователя."""
+    import json
+
+    from app.recommend.registry import ModelRegistry
+    from app.routers import recommendations
+
+    tiny_model.save_model(str(tmp_path / "v1.cbm"))
+    monkeypatch.setattr(recommendations, "model_registry", ModelRegistry(tmp_path))
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    user = create_test_user(db_session)
+
+    response = await async_client.post("/recommendations/batch", json={"user_ids": [user.id, 999999], "top_k": 3})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["X-Model-Version"] == "v1"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["user_id"] for line in lines] == [user.id, 999999]
+    assert len(lines[0]["items"]) <= 3
+    assert lines[1] == {"user_id": 999999, "error": "not_found"}
+
+
+@pytest.mark.asyncio
+async def test_precomputed_recommendations_served_when_fresh(async_client: AsyncClient, db_session, tiny_model, monkeypatch, tmp_path):
+    """Режим precomputed отдаёт свежий готовый список, иначе считает на запросе."""
+    from app import schemas
+    from app.recommend import precomputed
+    from app.recommend.registry import ModelRegistry
+    from app.routers import crud, recommendations
+
+    tiny_model.save_model(str(tmp_path / "v1.cbm"))
+    monkeypatch.setattr(recommendations, "model_registry", ModelRegistry(tmp_path))
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    stored = schemas.RecommendedItems(items=[
+        schemas.RecommendedItem(id=item.id, name=f"Item {item.id}", score=0.9),
+    ])
+    watermarks = precomputed.event_watermarks(db_session, [user.id])
+    precomputed.save_precomputed(db_session, [(user.id, stored)], top_n=1, model_version="v1", watermarks=watermarks)
+    db_session.commit()
+
+    response = await async_client.get(f"/recommendations/{user.id}?top_k=1&mode=precomputed")
+    assert response.headers["X-Recommendations-Source"] == "precomputed"
+    assert response.json() == stored.model_dump()
+
+    # Запрошено больше, чем рассчитано, или другая версия модели — расчёт на запросе
+    response = await async_client.get(f"/recommendations/{user.id}?top_k=5&mode=precomputed")
+    assert response.headers["X-Recommendations-Source"] == "online"
+    assert precomputed.get_precomputed(db_session, user.id, 1, "v2") is None
+
+    # Новое событие пользователя делает готовый список устаревшим
+    crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="view"))
+    assert precomputed.get_precomputed(db_session, user.id, 1, "v1") is None
+    assert precomputed.fresh_user_ids(db_session, "v1", top_n=1) == set()
+
+
+def test_precomputed_list_stale_after_event_during_scoring(db_session):
+    """Событие между расчётом и сохранением списка не даёт отдать его как свежий."""
+    from app import schemas
+    from app.models import UserRecommendation
+    from app.recommend import precomputed
+    from app.routers import crud
+
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="view"))
+    stored = schemas.RecommendedItems(items=[
+        schemas.RecommendedItem(id=item.id, name=f"Item {item.id}", score=0.9),
+    ])
+
+    # Отметка снята до расчёта, событие пришло до сохранения
+    watermarks = precomputed.event_watermarks(db_session, [user.id])
+    event = crud.create_event(db_session, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="view"))
+    precomputed.save_precomputed(db_session, [(user.id, stored)], top_n=1, model_version="v1", watermarks=watermarks)
+    db_session.commit()
+    assert precomputed.get_precomputed(db_session, user.id, 1, "v1") is None
+    assert user.id not in precomputed.fresh_user_ids(db_session, "v1", top_n=1)
+
+    # Смена типа и удаление события тоже меняют отметку; строка при этом не удаляется
+    watermarks = precomputed.event_watermarks(db_session, [user.id])
+    precomputed.save_precomputed(db_session, [(user.id, stored)], top_n=1, model_version="v1", watermarks=watermarks)
+    db_session.commit()
+    assert precomputed.get_precomputed(db_session, user.id, 1, "v1") == stored
+    crud.update_event(db_session, event.id, event_type="addtocart")
+    assert precomputed.get_precomputed(db_session, user.id, 1, "v1") is None
+    crud.delete_event(db_session, event.id)
+    assert precomputed.get_precomputed(db_session, user.id, 1, "v1") is None
+    assert db_session.get(UserRecommendation, user.id) is not None
+
+
+def test_candidate_reload_seen_reads_new_events(db_session):
+    """Воркер офлайн-расчёта перечитывает просмотренные товары пачки из БД."""
+    from app.models import Event
+    from app.recommend.candidates import CandidateIndex
+
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    index = CandidateIndex(np.array([item.id], dtype=np.int64), {}, {})
+    assert index.candidates(user.id, pool_size=1) == [item.id]
+
+    db_session.add(Event(timestamp=1000, user_id=user.id, item_id=item.id, event_type="view"))
+    db_session.flush()
+    index.reload_seen(db_session, [user.id])
+    assert index.candidates(user.id, pool_size=1) == []
+
+
+def test_user_feature_cache_follows_crud_events(db_session, user_feature_cache):
+    """Кэш признаков загружается из БД при промахе и дальше обновляется CRUD."""
+    from app import schemas
+    from app.recommend.user_features import load_user_stats
+    from app.routers import crud
+
+    user = create_test_user(db_session)
+    items = [create_test_item(db_session) for _ in range(2)]
+    first = create_test_event(db_session, user.id, items[0].id, "view")
+    assert user_feature_cache.get(db_session, user.id) == {
+        "n_view": 1, "n_cart": 0, "n_buy": 0, "n_events": 1, "first_event_ts": first.timestamp
+    }
+
+    earlier = first.timestamp - 1000
+    created = crud.create_event(
+        db_session,
+        schemas.EventCreate(user_id=user.id, item_id=items[1].id, event_type="addtocart", timestamp=earlier),
+    )
+    crud.create_events(db_session, [schemas.EventCreate(user_id=user.id, item_id=items[0].id, event_type="rate")])
+    crud.update_event(db_session, created.id, event_type="transaction")
+    cached = user_feature_cache.store.get_many([user.id])[user.id]
+    assert cached == load_user_stats(db_session, [user.id])[user.id]
+    assert cached == {"n_view": 1, "n_cart": 0, "n_buy": 1, "n_events": 3, "first_event_ts": earlier}
+
+    # Удаление может сдвинуть время первого события — запись сбрасывается
+    crud.delete_event(db_session, created.id)
+    assert user_feature_cache.store.get_many([user.id]) == {}
+    assert user_feature_cache.get(db_session, user.id)["first_event_ts"] == first.timestamp
+
+
+def test_warm_user_recommendations_skip_event_queries(db_session, tiny_model, monkeypatch):
+    """Для пользователей из кэша признаков рекомендации не читают таблицу events."""
+    import re
+
+    from sqlalchemy import event
+
+    from app.recommend.cache import configure_recommendation_cache
+    from app.recommend.registry import LoadedModel
+    from app.routers.recommendations import _generate_recommendations
+
+    monkeypatch.setenv("RECS_CANDIDATE_POOL", "50")
+    configure_recommendation_cache(None)
+    loaded = LoadedModel(version="v1", model=tiny_model)
+    temporal = {"is_weekend": 0, "is_evening": 0}
+    user, cold_user = create_test_user(db_session), create_test_user(db_session)
+    item = create_test_item(db_session)
+    create_test_event(db_session, user.id, item.id, "view")
+
+    # Первый запрос строит индексы и загружает признаки в кэш
+    expected = {
+        user_id: _generate_recommendations(user_id, 5, db_session, loaded, temporal)
+        for user_id in (user.id, cold_user.id)
+    }
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for user_id, result in expected.items():
+            assert _generate_recommendations(user_id, 5, db_session, loaded, temporal) == result
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert not [statement for statement in statements if re.search(r"\bevents\b", statement)]
+
+
+def test_prepare_prediction_data_requires_every_feature():
+    """Отсутствующий признак — ошибка, а не неинициализированный столбец."""
+    from app.routers.recommendations import _prepare_prediction_data
+
+    item_features = np.zeros((2, 4), dtype=np.float32)
+    with pytest.raises(ValueError, match="user_lifetime_days"):
+        _prepare_prediction_data(
+            [1, 2], {"n_view": 1, "n_cart": 0, "n_buy": 0}, item_features, {"is_weekend": 0, "is_evening": 0}
+        )
+
+
+def _feature_store(backend_name):
+    """Хранилище кэша признаков: в памяти или в Redis (fakeredis)."""
+    from app.recommend.user_features import LRUFeatureStore, RedisFeatureStore
+
+    if backend_name == "redis":
+        return RedisFeatureStore(pytest.importorskip("fakeredis").FakeRedis())
+    return LRUFeatureStore()
+
+
+@pytest.mark.parametrize("backend_name", ["memory", "redis"])
+def test_feature_store_updates_and_clamps(backend_name):
+    """Хранилище прибавляет счётчики к существующим записям и не уходит ниже нуля."""
+    from app.recommend.user_features import UserFeatureCache
+
+    store = _feature_store(backend_name)
+    record = {"n_view": 1, "n_cart": 0, "n_buy": 0, "n_events": 1, "first_event_ts": 5000}
+    store.set_many({1: record}, 60, store.versions([1]))
+    cache = UserFeatureCache(store, ttl=60)
+
+    cache.record_events([(1, "addtocart", 4000), (1, "rate", 6000), (2, "view", 1)])
+    cache.record_event_type_changed(1, "transaction", "view")
+    assert store.get_many([1, 2]) == {
+        1: {"n_view": 2, "n_cart": 1, "n_buy": 0, "n_events": 3, "first_event_ts": 4000}
+    }
+
+    cache.invalidate_user(1)
+    assert store.get_many([1]) == {}
+
+
+@pytest.mark.parametrize("backend_name", ["memory", "redis"])
+def test_feature_cache_keeps_event_written_during_load(db_session, backend_name, monkeypatch):
+    """Событие, записанное между запросом к БД и сохранением записи, не теряется."""
+    from app import schemas
+    from app.recommend import user_features
+    from app.recommend.user_features import UserFeatureCache
+    from app.routers import crud
+
+    cache = UserFeatureCache(_feature_store(backend_name), ttl=60)
+    user_features.configure_user_feature_cache(cache)
+    user = create_test_user(db_session)
+    item = create_test_item(db_session)
+    load_user_stats = user_features.load_user_stats
+
+    def load_then_write_event(db, user_ids):
+        loaded = load_user_stats(db, user_ids)
+        crud.create_event(db, schemas.EventCreate(user_id=user.id, item_id=item.id, event_type="view"))
+        return loaded
+
+    monkeypatch.setattr(user_features, "load_user_stats", load_then_write_event)
+    assert cache.get(db_session, user.id)["n_events"] == 0
+    monkeypatch.setattr(user_features, "load_user_stats", load_user_stats)
+
+    # Устаревшая нулевая запись (холодный старт) не сохранена
+    assert cache.store.get_many([user.id]) == {}
+    assert cache.get(db_session, user.id)["n_events"] == 1
+    assert cache.store.get_many([user.id])[user.id]["n_events"] == 1
@@ -0,0 +1,124 @@
+"""Тесты агрегатов событий по времени."""
+
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func
+
+from app import rollups
+from app.models import EventRollupItem, EventRollupType, EventRollupUser
+from app.routers import crud
+from app.tests.conftest import create_test_item, create_test_user
+
+HOUR = rollups.GRANULARITIES["hour"]
+DAY = rollups.GRANULARITIES["day"]
+# База общая для всех тестов: события теста лежат в своих сутках
+_BASE_TS = 1000 * DAY
+
+
+async def _post_event(async_client, user_id, item_id, event_type, timestamp):
+    response = await async_client.post(
+        "/events/",
+        json={"user_id": user_id, "item_id": item_id, "event_type": event_type, "timestamp": timestamp},
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def _rollup_rows(db_session, start, end):
+    """Все строки агрегатов за [start, end) для сравнения, шарды типов просуммированы."""
+    rows = {
+        model.__tablename__: sorted(
+            tuple(getattr(row, column.name) for column in model.__table__.columns)
+            for row in db_session.query(model).filter(model.bucket >= start, model.bucket < end)
+        )
+        for model in (EventRollupItem, EventRollupUser)
+    }
+    type_rows = (
+        db_session.query(
+            EventRollupType.granularity,
+            EventRollupType.bucket,
+            EventRollupType.event_type,
+            func.sum(EventRollupType.n_events),
+        )
+        .filter(EventRollupType.bucket >= start, EventRollupType.bucket < end)
+        .group_by(EventRollupType.granularity, EventRollupType.bucket, EventRollupType.event_type)
+    )
+    rows[EventRollupType.__tablename__] = sorted(tuple(row) for row in type_rows if row[-1])
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_crud_and_match_rebuild(async_client: AsyncClient, db_session):
+    """CRUD поддерживает агрегаты так же, как полный пересчёт."""
+    user_id = create_test_user(db_session).id
+    item_ids = [create_test_item(db_session).id for _ in range(2)]
+    await _post_event(async_client, user_id, item_ids[0], "view", _BASE_TS + 10)
+    await _post_event(async_client, user_id, item_ids[0], "view", _BASE_TS + HOUR + 10)
+    changed = await _post_event(async_client, user_id, item_ids[1], "view", _BASE_TS + HOUR + 20)
+    deleted = await _post_event(async_client, user_id, item_ids[1], "transaction", _BASE_TS + 2 * HOUR)
+    await async_client.delete(f"/events/{deleted}")
+    crud.update_event(db_session, changed, event_type="addtocart")
+
+    response = await async_client.get(
+        "/analytics/timeseries", params={"granularity": "hour", "from": _BASE_TS, "to": _BASE_TS + 3 * HOUR}
+    )
+    assert response.status_code == 200
+    series = response.json()
+    assert [point["bucket"] for point in series] == [_BASE_TS, _BASE_TS + HOUR, _BASE_TS + 2 * HOUR]
+    assert [point["total"] for point in series] == [1, 2, 0]
+    assert series[1]["event_types"] == {"view": 1, "addtocart": 1}
+
+    incremental = _rollup_rows(db_session, _BASE_TS, _BASE_TS + DAY)
+    rollups.rebuild_event_rollups(db_session, _BASE_TS, _BASE_TS + DAY)
+    assert _rollup_rows(db_session, _BASE_TS, _BASE_TS + DAY) == incremental
+
+
+@pytest.mark.asyncio
+async def test_popular_items_window(async_client: AsyncClient, db_session):
+    """Окно popular-items учитывает только события внутри окна."""
+    user_id = create_test_user(db_session).id
+    recent, old = create_test_item(db_session).id, create_test_item(db_session).id
+    now = _BASE_TS + 10 * DAY
+    for _ in range(2):
+        await _post_event(async_client, user_id, recent, "view", now - HOUR)
+    for _ in range(3):
+        await _post_event(async_client, user_id, old, "view", now - 5 * DAY)
+
+    top = rollups.get_popular_items_window(db_session, rollups.parse_window("24h"), 10, end_ts=now)
+    assert {row["item_id"]: row["event_count"] for row in top} == {recent: 2}
+    top = rollups.get_popular_items_window(db_session, rollups.parse_window("7d"), 10, end_ts=now)
+    assert [row["item_id"] for row in top[:2]] == [old, recent]
+
+
+@pytest.mark.asyncio
+async def test_analytics_rejects_bad_window_and_range(async_client: AsyncClient):
+    """Неверное окно и слишком длинный ряд — ошибка 400."""
+    response = await async_client.get("/analytics/popular-items", params={"window": "week"})
+    assert response.status_code == 400
+    response = await async_client.get(
+        "/analytics/timeseries", params={"granularity": "hour", "from": 0, "to": 10**12}
+    )
+    assert response.status_code == 400
+    response = await async_client.get("/analytics/popular-items", params={"window": "24h"})
+    assert response.status_code == 200
+
+
+def test_type_rollup_shards_sum_to_event_count(db_session, monkeypatch):
+    """Создание и удаление события в разных шардах типа дают верную сумму."""
+    start = _BASE_TS + 20 * DAY
+    shards = iter([1, 2, 3])
+    monkeypatch.setattr(rollups, "random", SimpleNamespace(randrange=lambda stop: next(shards)))
+
+    rollups.record_events(db_session, [(1, 1, "view", start + 10)])
+    rollups.record_events(db_session, [(1, 1, "view", start + 10)], sign=-1)
+    rollups.record_events(db_session, [(1, 2, "view", start + 20), (2, 2, "transaction", start + 30)])
+    db_session.commit()
+
+    stored = db_session.query(EventRollupType.shard, EventRollupType.n_events).filter(
+        EventRollupType.granularity == "hour", EventRollupType.bucket == start
+    )
+    assert sorted(stored) == [(1, 1), (2, -1), (3, 1), (3, 1)]
+    [point] = rollups.get_timeseries(db_session, "hour", start, start + HOUR)
+    assert point["total"] == 2 and point["event_types"] == {"view": 1, "transaction": 1}
@@ -0,0 +1,147 @@
+"""Тесты поиска товаров каталога."""
+
+import time
+
+import pytest
+from httpx import AsyncClient
+from loguru import logger
+
+from app import search
+from app.search import InvertedIndex
+from app.tests.conftest import create_test_item
+
+
+def test_inverted_index_ranking_and_substring():
+    """Запрос ищется как подстрока текста товара, редкие токены весомее."""
+    index = InvertedIndex()
+    index.index_item(1, ["color", "red cotton"])
+    index.index_item(2, ["color", "red wool"])
+    index.index_item(3, ["color", "blue cotton cotton"])
+
+    result = index.search("red", limit=10)
+    assert sorted(item_id for item_id, _ in result.hits) == [1, 2]
+    assert result.total == 2 and not result.total_is_estimate
+
+    assert [item_id for item_id, _ in index.search("red cott", limit=10).hits] == [1]
+    # Два вхождения токена дают большую оценку
+    assert [item_id for item_id, _ in index.search("cotton", limit=10).hits] == [3, 1]
+
+    page = index.search("color", limit=2, offset=2)
+    assert len(page.hits) == 1 and page.total == 3
+
+
+def test_database_backend_outside_postgres_warns_once(db_session, monkeypatch):
+    """Без PostgreSQL SEARCH_BACKEND=database предупреждает один раз, а не на каждый запрос."""
+    monkeypatch.setenv("SEARCH_BACKEND", "database")
+    monkeypatch.setattr(search, "_backend_warned", False)
+    messages = []
+    sink = logger.add(messages.append, level="WARNING")
+    try:
+        assert not search.uses_database(db_session)
+        assert not search.uses_database(db_session)
+    finally:
+        logger.remove(sink)
+    assert len(messages) == 1
+
+
+def test_inverted_index_reindex_item():
+    """Переиндексация заменяет токены товара, пустой список удаляет его."""
+    index = InvertedIndex()
+    index.index_item(1, ["red"])
+    index.index_item(1, ["green"])
+    assert index.search("red", limit=10).hits == []
+    assert [item_id for item_id, _ in index.search("green", limit=10).hits] == [1]
+
+    index.index_item(1, [])
+    assert index.search("gre", limit=10).total == 0
+
+
+def test_inverted_index_matches_database_condition(db_session):
+    """Индекс в памяти находит те же товары, что и условие ILIKE поиска в БД."""
+    from app.models import ItemPropertyCurrent
+    from app.search import match_condition
+
+    texts = {
+        "material": "Red Cotton",
+        "color": "blue cotton cotton",
+        "size": "n-100 XL",
+        "note": "redo_later",
+        "brand": "Ёлка",
+    }
+    items = [create_test_item(db_session) for _ in texts]
+    db_session.add_all(
+        ItemPropertyCurrent(item_id=item.id, property=name, value=value, timestamp=1, property_id=0)
+        for item, (name, value) in zip(items, texts.items())
+    )
+    db_session.commit()
+    item_ids = [item.id for item in items]
+    index = InvertedIndex.build(db_session)
+
+    queries = ["red", "otto", "ed cot", "cotton red", "material red", "d c", "-10", "n-1", "xl", "o_l", "ze", " "]
+    for query in queries:
+        expected = {
+            item_id
+            for (item_id,) in db_session.query(ItemPropertyCurrent.item_id).filter(
+                match_condition(query), ItemPropertyCurrent.item_id.in_(item_ids)
+            )
+        }
+        found = {item_id for item_id, _ in index.search(query, limit=1000).hits if item_id in item_ids}
+        assert found == expected, query
+    # lower() в SQLite знает только ASCII, ILIKE в PostgreSQL — любой регистр
+    assert [item_id for item_id, _ in index.search("ЁЛ", limit=1000).hits if item_id in item_ids] == [items[-1].id]
+
+
+@pytest.mark.asyncio
+async def test_catalog_search_uses_index(async_client: AsyncClient, db_session):
+    """Поиск каталога видит текущие значения свойств, в том числе после изменения."""
+    item = create_test_item(db_session)
+    response = await async_client.post(
+        "/item_properties/",
+        json={"timestamp": int(time.time() * 1000), "item_id": item.id, "property": "material", "value": "Suede"},
+    )
+    assert response.status_code == 201
+    property_id = response.json()["id"]
+
+    response = await async_client.get("/catalog/search?q=sue")
+    data = response.json()
+    assert [found["id"] for found in data["items"]] == [item.id]
+    assert data["items"][0]["score"] > 0
+    assert data["total"] == 1 and data["total_is_estimate"] is False
+
+    # Индекс уже построен: изменение попадает в него из CRUD
+    response = await async_client.put(f"/item_properties/{property_id}", json={"value": "Leather"})
+    assert response.status_code == 200
+    assert (await async_client.get("/catalog/search?q=suede")).json()["total"] == 0
+    assert [found["id"] for found in (await async_client.get("/catalog/search?q=leather")).json()["items"]] == [item.id]
+
+
+def test_database_search_cursor_with_tied_scores(db_session, monkeypatch):
+    """Курсор поиска в БД проходит товары с равными оценками без повторов и пропусков."""
+    from app import search
+    from app.models import ItemPropertyCurrent
+    from app.pagination import decode_cursor, encode_cursor
+
+    # В SQLite нет pg_trgm: similarity() с «неудобной» дробью и greatest()
+    connection = db_session.connection().connection.driver_connection
+    connection.create_function("similarity", 2, lambda value, query: 2 / 7 if query in value.lower() else 0.0)
+    connection.create_function("greatest", 2, max)
+    monkeypatch.setattr(search, "_planner_row_estimate", lambda db, statement: 0)
+
+    items = [create_test_item(db_session) for _ in range(5)]
+    db_session.add_all(
+        ItemPropertyCurrent(item_id=item.id, property="brand", value="Tiedscore", timestamp=1, property_id=0)
+        for item in items
+    )
+    db_session.commit()
+
+    found, after = [], None
+    while True:
+        result = search.search_database(db_session, "tiedscore", limit=2, after=after)
+        found.extend(result.hits)
+        if not result.has_more:
+            break
+        # Курсор проходит через JSON, как в ответе API
+        after = decode_cursor("catalog_search", encode_cursor("catalog_search", found[-1][::-1]), 2)
+
+    assert [item_id for item_id, _ in found] == [item.id for item in items]
+    assert {score for _, score in found} == {2 / 7}
@@ -0,0 +1,82 @@
+"""Тесты системной статистики в памяти."""
+
+import pytest
+from httpx import AsyncClient
+
+from app import stats
+from app.models import Event, User
+from app.tests.conftest import create_test_item, create_test_user
+
+
+def _event_count(body, event_type):
+    return next((row["count"] for row in body["event_types"] if row["type"] == event_type), 0)
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_crud_without_recount(async_client: AsyncClient, db_session):
+    """Счётчики меняются при создании и удалении через API и совпадают с таблицами."""
+    user_id = create_test_user(db_session).id
+    item_id = create_test_item(db_session).id
+    before = (await async_client.get("/analytics/stats")).json()
+    assert before["approximate"] is False
+    assert before["total_users"] == db_session.query(User).count()
+
+    await async_client.post("/users/", json={})
+    response = await async_client.post(
+        "/events/", json={"user_id": user_id, "item_id": item_id, "event_type": "addtocart"}
+    )
+    event_id = response.json()["id"]
+    after = (await async_client.get("/analytics/stats")).json()
+    assert after["total_users"] == before["total_users"] + 1
+    assert after["total_events"] == before["total_events"] + 1
+    assert _event_count(after, "addtocart") == _event_count(before, "addtocart") + 1
+
+    await async_client.delete(f"/events/{event_id}")
+    final = (await async_client.get("/analytics/stats")).json()
+    assert final["total_events"] == before["total_events"] == db_session.query(Event).count()
+    assert _event_count(final, "addtocart") == _event_count(before, "addtocart")
+
+
+@pytest.mark.asyncio
+async def test_stats_served_from_memory_until_refresh(async_client: AsyncClient, db_session):
+    """Записи в обход CRUD видны только после сверки с таблицами."""
+    before = (await async_client.get("/analytics/stats")).json()
+    create_test_user(db_session)
+    assert (await async_client.get("/analytics/stats")).json()["total_users"] == before["total_users"]
+
+    stats.refresh_stats(db_session)
+    assert (await async_client.get("/analytics/stats")).json()["total_users"] == before["total_users"] + 1
+
+
+def test_refresh_replays_deltas_recorded_during_build(db_session, monkeypatch):
+    """Изменения CRUD, записанные во время сверки, не теряются при замене счётчиков."""
+    stats.get_stats(db_session)
+    build = stats.SystemStats.build.__func__
+
+    def build_with_concurrent_writes(cls, db):
+        result = build(cls, db)
+        # Коммит CRUD после запросов сверки, но до замены счётчиков
+        stats.record_created("total_users")
+        stats.record_event("view")
+        return result
+
+    monkeypatch.setattr(stats.SystemStats, "build", classmethod(build_with_concurrent_writes))
+    users = db_session.query(User).count()
+    views = db_session.query(Event).filter(Event.event_type == "view").count()
+    snapshot = stats.refresh_stats(db_session).snapshot()
+    assert snapshot["total_users"] == users + 1
+    assert _event_count(snapshot, "view") == views + 1
+
+    # Вне сверки журнал не копится
+    monkeypatch.undo()
+    stats.record_created("total_users")
+    snapshot = stats.refresh_stats(db_session).snapshot()
+    assert snapshot["total_users"] == users
+
+
+@pytest.mark.asyncio
+async def test_approximate_falls_back_outside_postgres(async_client: AsyncClient):
+    """В SQLite приближённый режим отдаёт обычные счётчики."""
+    response = await async_client.get("/analytics/stats", params={"approximate": True})
+    assert response.status_code == 200
+    assert response.json()["approximate"] is False
@@ -0,0 +1,67 @@
+"""Пересчёт агрегатов событий (event_rollups_*) по таблице events.
+
+Диапазон обрабатывается пачками по --chunk-days суток, каждая пачка
+коммитится отдельно: прерванный пересчёт можно запустить заново
+с нужной даты. Без --from/--to пересчитывается весь диапазон событий.
+
+Использование:
+    python scripts/backfill_rollups.py
+    python scripts/backfill_rollups.py --from 2015-06-01 --to 2015-07-01 --chunk-days 7
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from sqlalchemy import func
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine
+from app.models import Event
+from app.rollups import GRANULARITIES, bucket_start, rebuild_event_rollups
+
+
+def _parse_date(value: str) -> int:
+    """Дата YYYY-MM-DD (UTC) или timestamp в мс."""
+    if value.isdigit():
+        return int(value)
+    date = datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    return int(date.timestamp() * 1000)
+
+
+def main():
+    """Разбор аргументов и пересчёт агрегатов."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", type=_parse_date, help="Начало: YYYY-MM-DD или мс")
+    parser.add_argument("--to", dest="end", type=_parse_date, help="Конец (не включительно): YYYY-MM-DD или мс")
+    parser.add_argument("--chunk-days", type=int, default=30, help="Суток в одной транзакции")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, checkfirst=True)
+    day = GRANULARITIES["day"]
+    with SessionLocal() as db:
+        first_ts, last_ts = db.query(func.min(Event.timestamp), func.max(Event.timestamp)).one()
+        if first_ts is None:
+            print("[backfill] В базе нет событий.")
+            return
+        start = bucket_start(args.start if args.start is not None else first_ts, "day")
+        end = args.end if args.end is not None else last_ts + 1
+        print(f"[backfill] Пересчёт агрегатов с {start} по {end} пачками по {args.chunk_days} суток")
+
+        started = time.perf_counter()
+        written = 0
+        for chunk_start in range(start, end, args.chunk_days * day):
+            chunk_end = min(chunk_start + args.chunk_days * day, end)
+            written += rebuild_event_rollups(db, chunk_start, chunk_end)
+            elapsed = time.perf_counter() - started
+            done_days = (chunk_end - start) / day
+            print(f"[backfill] {done_days:.0f} суток, {written} строк агрегатов, {elapsed:.1f}s")
+
+    print(f"[backfill] Готово: {written} строк агрегатов за {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+"""Микро-бенчмарки горячих участков сервиса рекомендаций.
+
+Использование:
+    python scripts/benchmark.py features --candidates 10000
+    python scripts/benchmark.py ranking --top-k 100
+    python scripts/benchmark.py model-load --pkl app/recommend/model.pkl --cbm app/recommend/model.cbm
+    python scripts/benchmark.py db-load --clients 200 --requests 20
+    python scripts/benchmark.py batch --users 2000
+    python scripts/benchmark.py populate --events 200000
+    python scripts/benchmark.py export --table events
+    python scripts/benchmark.py ingest --events 5000
+    python scripts/benchmark.py user-features --users 500
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.recommend.item_stats import ITEM_FEATURE_COLS
+from app.routers.recommendations import FEATURE_COLS, _prepare_prediction_data, _select_top_k
+
+
+def _report(name: str, seconds: float, repeat: int):
+    """Вывести среднее время одного прогона."""
+    print(f"[benchmark] {name:<32} {seconds / repeat * 1000:9.3f} ms")
+
+
+def _synthetic_features(n_candidates: int, seed: int = 0):
+    """Сгенерировать признаки пользователя, товаров и временные признаки."""
+    rng = np.random.default_rng(seed)
+    candidate_ids = list(range(1, n_candidates + 1))
+    item_matrix = rng.integers(0, 500, size=(n_candidates, len(ITEM_FEATURE_COLS))).astype(np.float32)
+    user_features = {"n_view": 12, "n_cart": 3, "n_buy": 1, "user_lifetime_days": 40}
+    temporal_features = {"is_weekend": 0, "is_evening": 1}
+    return candidate_ids, user_features, item_matrix, temporal_features
+
+
+def _legacy_prepare_prediction_data(user_id, candidate_ids, user_features, item_features_map, temporal_features):
+    """Прежний путь: словарь на кандидата и pd.DataFrame."""
+    rows = []
+    for item_id in candidate_ids:
+        rows.append({
+            "user_id": user_id,
+            "item_id": item_id,
+            **user_features,
+            **item_features_map[item_id],
+            **temporal_features,
+        })
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df = df[FEATURE_COLS]
+    return df
+
+
+def bench_features(args):
+    """Сравнить сборку признаков через dict→DataFrame и через NumPy."""
+    candidate_ids, user_features, item_matrix, temporal_features = _synthetic_features(args.candidates)
+    item_features_map = {
+        item_id: dict(zip(ITEM_FEATURE_COLS, row.tolist()))
+        for item_id, row in zip(candidate_ids, item_matrix)
+    }
+
+    legacy = _legacy_prepare_prediction_data(1, candidate_ids, user_features, item_features_map, temporal_features)
+    vectorized = _prepare_prediction_data(candidate_ids, user_features, item_matrix, temporal_features)
+    assert np.array_equal(legacy.to_numpy(dtype=np.float32), vectorized), "Матрицы признаков различаются"
+
+    print(f"[benchmark] Сборка признаков для {args.candidates} кандидатов (repeat={args.repeat})")
+    legacy_time = timeit.timeit(
+        lambda: _legacy_prepare_prediction_data(1, candidate_ids, user_features, item_features_map, temporal_features),
+        number=args.repeat,
+    )
+    vectorized_time = timeit.timeit(
+        lambda: _prepare_prediction_data(candidate_ids, user_features, item_matrix, temporal_features),
+        number=args.repeat,
+    )
+    _report("dict -> DataFrame", legacy_time, args.repeat)
+    _report("NumPy matrix", vectorized_time, args.repeat)
+    print(f"[benchmark] Ускорение: x{legacy_time / vectorized_time:.1f}")
+
+
+def _legacy_top_k(candidate_ids, scores, top_k):
+    """Прежний путь: список пар и полная сортировка."""
+    item_score_pairs = list(zip(candidate_ids, scores))
+    item_score_pairs.sort(key=lambda x: x[1], reverse=True)
+    return item_score_pairs[:top_k]
+
+
+def bench_ranking(args):
+    """Сравнить полную сортировку и отбор топа через argpartition."""
+    rng = np.random.default_rng(0)
+    print(f"[benchmark] Отбор топ-{args.top_k} (repeat={args.repeat})")
+    for n_candidates in args.sizes:
+        candidate_ids = np.arange(1, n_candidates + 1)
+        scores = rng.random(n_candidates)
+        scores_list = scores.tolist()
+        ids_list = candidate_ids.tolist()
+
+        expected = [item_id for item_id, _ in _legacy_top_k(ids_list, scores_list, args.top_k)]
+        assert candidate_ids[_select_top_k(scores, args.top_k)].tolist() == expected
+
+        legacy_time = timeit.timeit(lambda: _legacy_top_k(ids_list, scores_list, args.top_k), number=args.repeat)
+        argpartition_time = timeit.timeit(
+            lambda: candidate_ids[_select_top_k(scores, args.top_k)], number=args.repeat
+        )
+        _report(f"{n_candidates:>7} list.sort", legacy_time, args.repeat)
+        _report(f"{n_candidates:>7} argpartition", argpartition_time, args.repeat)
+
+
+def _rss_kb() -> int:
+    """Текущий RSS процесса в КБ (Linux), иначе пиковый RSS."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure_model_load(path: str, queue):
+    """Загрузить модель в чистом процессе и вернуть время и прирост RSS."""
+    from app.recommend.utils import load_model_file
+
+    rss_before = _rss_kb()
+    started = time.perf_counter()
+    load_model_file(path)
+    queue.put((time.perf_counter() - started, _rss_kb() - rss_before))
+
+
+def bench_model_load(args):
+    """Сравнить время загрузки и память модели в форматах pickle и .cbm."""
+    context = multiprocessing.get_context("spawn")
+    print(f"[benchmark] Загрузка модели в новом процессе (repeat={args.repeat})")
+    for label, path in (("pickle", args.pkl), ("cbm", args.cbm)):
+        if not path or not os.path.exists(path):
+            print(f"[benchmark] {label:<8} файл не найден: {path}")
+            continue
+        results = []
+        for _ in range(args.repeat):
+            queue = context.Queue()
+            process = context.Process(target=_measure_model_load, args=(path, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+        load_time = min(result[0] for result in results)
+        rss_mb = max(result[1] for result in results) / 1024
+        print(f"[benchmark] {label:<8} загрузка {load_time * 1000:9.1f} ms, RSS на воркер +{rss_mb:.1f} MB")
+
+
+async def _run_clients(n_clients: int, n_requests: int, fetch) -> list:
+    """Запустить n_clients конкурентных клиентов и собрать задержки запросов."""
+    latencies = []
+
+    async def client(client_id: int):
+        for i in range(n_requests):
+            started = time.perf_counter()
+            await fetch(client_id * n_requests + i)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(client(client_id) for client_id in range(n_clients)))
+    return latencies
+
+
+def _report_latencies(name: str, latencies: list, elapsed: float):
+    """Вывести пропускную способность и перцентили задержки."""
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(
+        f"[benchmark] {name:<12} {len(latencies) / elapsed:9.0f} req/s, "
+        f"p50 {p50:7.2f} ms, p99 {p99:7.2f} ms"
+    )
+
+
+def bench_db_load(args):
+    """Сравнить чтение через синхронную сессию в пуле потоков и через AsyncSession.
+
+    Синхронный путь повторяет обычный def-эндпоинт FastAPI: запрос
+    уходит в пул потоков anyio (по умолчанию 40 потоков).
+    """
+    import anyio.to_thread
+
+    from app.database import AsyncSessionLocal, SessionLocal
+    from app.routers import async_crud, crud
+
+    with SessionLocal() as db:
+        user_ids = [user.id for user in crud.get_users(db, limit=1000)]
+    if not user_ids:
+        print("[benchmark] В базе нет пользователей, заполните её: python scripts/populate_db.py")
+        return
+
+    def sync_read(user_id: int):
+        with SessionLocal() as db:
+            crud.get_user(db, user_id)
+            crud.get_user_events(db, user_id, limit=10)
+
+    async def sync_fetch(n: int):
+        await anyio.to_thread.run_sync(sync_read, user_ids[n % len(user_ids)])
+
+    async def async_fetch(n: int):
+        user_id = user_ids[n % len(user_ids)]
+        async with AsyncSessionLocal() as db:
+            await async_crud.get_user(db, user_id)
+            await async_crud.get_user_events(db, user_id, limit=10)
+
+    print(f"[benchmark] {args.clients} клиентов x {args.requests} запросов")
+    for name, fetch in (("threadpool", sync_fetch), ("async", async_fetch)):
+        started = time.perf_counter()
+        latencies = asyncio.run(_run_clients(args.clients, args.requests, fetch))
+        _report_latencies(name, latencies, time.perf_counter() - started)
+
+
+def bench_batch(args):
+    """Сравнить пропускную способность (пользователей/с): по одному и пакетом."""
+    from app.database import SessionLocal
+    from app.models import Event
+    from app.recommend.cache import configure_recommendation_cache
+    from app.routers.recommendations import (
+        _generate_batch_recommendations,
+        _generate_recommendations,
+        get_model,
+    )
+    from app.common_utils import get_temporal_features
+
+    # Без кэша: измеряется полный путь построения рекомендаций
+    configure_recommendation_cache(None)
+    loaded = get_model()
+    temporal_features = get_temporal_features()
+
+    with SessionLocal() as db:
+        user_ids = [user_id for (user_id,) in db.query(Event.user_id).distinct().limit(args.users)]
+        if not user_ids:
+            print("[benchmark] В базе нет событий, заполните её: python scripts/populate_db.py")
+            return
+        print(f"[benchmark] Рекомендации для {len(user_ids)} пользователей, top_k={args.top_k}")
+
+        single_users = user_ids[: args.single_users]
+        started = time.perf_counter()
+        for user_id in single_users:
+            _generate_recommendations(user_id, args.top_k, db, loaded, temporal_features)
+        single_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in _generate_batch_recommendations(user_ids, args.top_k, db, loaded, temporal_features):
+            pass
+        batch_elapsed = time.perf_counter() - started
+
+    print(f"[benchmark] {'по одному':<12} {len(single_users) / single_elapsed:9.1f} users/s")
+    print(f"[benchmark] {'batch':<12} {len(user_ids) / batch_elapsed:9.1f} users/s")
+
+
+def _write_synthetic_dataset(data_dir: str, n_events: int, seed: int = 0):
+    """Сгенерировать CSV в формате RetailRocket для бенчмарка загрузки."""
+    rng = np.random.default_rng(seed)
+    n_users = max(10, n_events // 20)
+    n_items = max(10, n_events // 50)
+    n_categories = 100
+
+    parents = [""] * 10 + [str(rng.integers(0, 10)) for _ in range(10, n_categories)]
+    pd.DataFrame({"categoryid": range(n_categories), "parentid": parents}).to_csv(
+        os.path.join(data_dir, "category_tree.csv"), index=False
+    )
+
+    events = rng.choice(["view", "addtocart", "transaction"], size=n_events, p=[0.9, 0.07, 0.03])
+    transaction_ids = np.where(events == "transaction", rng.integers(0, 10**6, size=n_events).astype(str), "")
+    pd.DataFrame(
+        {
+            "timestamp": np.sort(rng.integers(1_430_000_000_000, 1_440_000_000_000, size=n_events)),
+            "visitorid": rng.integers(0, n_users, size=n_events),
+            "event": events,
+            "itemid": rng.integers(0, n_items, size=n_events),
+            "transactionid": transaction_ids,
+        }
+    ).to_csv(os.path.join(data_dir, "events.csv"), index=False)
+
+    # Свойств товаров в RetailRocket примерно в 7 раз больше, чем событий
+    n_properties = n_events * 7
+    properties = pd.DataFrame(
+        {
+            "timestamp": rng.integers(1_430_000_000_000, 1_440_000_000_000, size=n_properties),
+            "itemid": rng.integers(0, n_items * 2, size=n_properties),
+            "property": rng.choice(["categoryid", "available", "790", "888"], size=n_properties),
+            "value": rng.integers(0, 1000, size=n_properties).astype(str),
+        }
+    )
+    half = n_properties // 2
+    properties.iloc[:half].to_csv(os.path.join(data_dir, "item_properties_part1.csv"), index=False)
+    properties.iloc[half:].to_csv(os.path.join(data_dir, "item_properties_part2.csv"), index=False)
+
+
+def bench_populate(args):
+    """Сравнить время загрузки populate_db.py: построчный путь против --fast."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "populate_db.py")
+    with tempfile.TemporaryDirectory() as data_dir:
+        _write_synthetic_dataset(data_dir, args.events)
+        print(f"[benchmark] Синтетический набор: {args.events} событий, {args.events * 7} свойств товаров")
+        for label, extra in (("построчно", []), ("fast", ["--fast"])):
+            db_path = os.path.join(data_dir, f"populate_{extra and 'fast' or 'classic'}.db")
+            env = dict(os.environ, DATA_DIR=data_dir, DATABASE_URL=f"sqlite:///{db_path}")
+            started = time.perf_counter()
+            subprocess.run([sys.executable, script, *extra], env=env, check=True, stdout=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - started
+            with sqlite3.connect(db_path) as connection:
+                counts = {
+                    table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("users", "items", "item_properties", "events")
+                }
+            rows = sum(counts.values())
+            print(f"[benchmark] {label:<10} {elapsed:8.1f}s {rows / elapsed:10.0f} rows/s {counts}")
+
+
+def bench_export(args):
+    """Сравнить выгрузку таблицы: постраничный ORM список против потока /export."""
+    from app.database import SessionLocal
+    from app.models import Event, ItemProperty
+    from app.routers.export import export_chunks
+
+    model = Event if args.table == "events" else ItemProperty
+    with SessionLocal() as db:
+        total = db.query(model).count()
+    if not total:
+        print("[benchmark] Таблица пуста, заполните базу: python scripts/populate_db.py")
+        return
+    print(f"[benchmark] Выгрузка {args.table}: {total} строк")
+
+    # Прежний способ: страницы по 100 ORM объектов через limit/offset
+    started = time.perf_counter()
+    rows = 0
+    with SessionLocal() as db:
+        while rows < min(total, args.legacy_rows):
+            page = db.query(model).order_by(model.id).offset(rows).limit(100).all()
+            if not page:
+                break
+            rows += len(page)
+    elapsed = time.perf_counter() - started
+    print(f"[benchmark] {'orm/offset':<10} {rows / elapsed:10.0f} rows/s ({rows} строк)")
+
+    for fmt in args.formats:
+        started = time.perf_counter()
+        size = 0
+        with SessionLocal() as db:
+            try:
+                for chunk in export_chunks(db, args.table, fmt):
+                    size += len(chunk)
+            except ImportError as e:
+                print(f"[benchmark] {fmt:<10} пропущен: {e}")
+                continue
+        elapsed = time.perf_counter() - started
+        print(f"[benchmark] {fmt:<10} {total / elapsed:10.0f} rows/s, {size / 2**20:.1f} MiB")
+
+
+def bench_ingest(args):
+    """Сравнить запись событий: коммит на событие против очереди с пачками.
+
+    Пишет во временную SQLite базу с синхронной записью на диск.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app import schemas
+    from app.database import Base
+    from app.ingest import EventIngestQueue, ingest_event_batch, validate_event_batch
+    from app.models import Event, Item, User
+    from app.recommend.cache import configure_recommendation_cache
+    from app.routers import crud
+
+    configure_recommendation_cache(None)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'ingest.db')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        with session_factory() as db:
+            db.add_all([User(id=i) for i in range(1, 1001)] + [Item(id=i) for i in range(1, 1001)])
+            db.commit()
+        events = [
+            schemas.EventCreate(user_id=int(user_id), item_id=int(item_id), event_type="view")
+            for user_id, item_id in rng.integers(1, 1001, size=(args.events, 2))
+        ]
+
+        sync_events = events[: args.sync_events]
+        started = time.perf_counter()
+        with session_factory() as db:
+            for event in sync_events:
+                crud.create_event(db, event)
+        elapsed = time.perf_counter() - started
+        print(f"[benchmark] {'sync':<10} {len(sync_events) / elapsed:10.0f} events/s")
+
+        for batch_size in args.batch_sizes:
+            event_queue = EventIngestQueue(session_factory, max_size=len(events), batch_size=batch_size)
+            event_queue.start()
+            started = time.perf_counter()
+            for event in events:
+                event_queue.put(event)
+            event_queue.stop()
+            elapsed = time.perf_counter() - started
+            print(f"[benchmark] {f'queue/{batch_size}':<10} {event_queue.flushed / elapsed:10.0f} events/s")
+        # Пакетная загрузка: проверка по столбцам и один INSERT на пакет
+        records = [event.model_dump(mode="json", exclude_none=True) for event in events]
+        with session_factory() as db:
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                [schemas.EventCreate(**record) for record in records]
+            pydantic_elapsed = (time.perf_counter() - started) / args.repeat
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                validate_event_batch(db, records)
+            batch_elapsed = (time.perf_counter() - started) / args.repeat
+            print(
+                f"[benchmark] Проверка {len(records)} событий: EventCreate {pydantic_elapsed * 1000:.1f} ms, "
+                f"по столбцам {batch_elapsed * 1000:.1f} ms (с запросами существования)"
+            )
+            started = time.perf_counter()
+            accepted = sum(
+                ingest_event_batch(db, records[start:start + args.bulk_size]).accepted
+                for start in range(0, len(records), args.bulk_size)
+            )
+            elapsed = time.perf_counter() - started
+            print(f"[benchmark] {f'bulk/{args.bulk_size}':<10} {accepted / elapsed:10.0f} events/s")
+            print(f"[benchmark] В базе {db.query(Event).count()} событий")
+
+
+def bench_user_features(args):
+    """Сравнить получение агрегатов пользователя: запрос к events против кэша."""
+    from app.database import SessionLocal
+    from app.models import Event
+    from app.recommend.user_features import LRUFeatureStore, UserFeatureCache, load_user_stats
+
+    cache = UserFeatureCache(LRUFeatureStore(), ttl=3600)
+    with SessionLocal() as db:
+        user_ids = [user_id for (user_id,) in db.query(Event.user_id).distinct().limit(args.users)]
+        if not user_ids:
+            print("[benchmark] В базе нет событий, заполните её: python scripts/populate_db.py")
+            return
+        print(f"[benchmark] Агрегаты {len(user_ids)} пользователей по одному")
+
+        started = time.perf_counter()
+        for user_id in user_ids:
+            load_user_stats(db, [user_id])
+        _report("запрос к events", time.perf_counter() - started, len(user_ids))
+
+        started = time.perf_counter()
+        for user_id in user_ids:
+            cache.get(db, user_id)
+        _report("кэш, промах (загрузка)", time.perf_counter() - started, len(user_ids))
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            for user_id in user_ids:
+                cache.get(db, user_id)
+        _report("кэш, попадание", time.perf_counter() - started, len(user_ids) * args.repeat)
+
+
+def main():
+    """Разбор аргументов и запуск выбранного бенчмарка."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    features = subparsers.add_parser("features", help="Сборка матрицы признаков")
+    features.add_argument("--candidates", type=int, default=10000)
+    features.add_argument("--repeat", type=int, default=20)
+    features.set_defaults(func=bench_features)
+
+    ranking = subparsers.add_parser("ranking", help="Отбор топ-k кандидатов")
+    ranking.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ranking.add_argument("--top-k", type=int, default=100)
+    ranking.add_argument("--repeat", type=int, default=20)
+    ranking.set_defaults(func=bench_ranking)
+
+    model_load = subparsers.add_parser("model-load", help="Время загрузки и RSS модели")
+    model_load.add_argument("--pkl", default="app/recommend/model.pkl")
+    model_load.add_argument("--cbm", default="app/recommend/model.cbm")
+    model_load.add_argument("--repeat", type=int, default=3)
+    model_load.set_defaults(func=bench_model_load)
+
+    db_load = subparsers.add_parser("db-load", help="Конкурентное чтение из БД: пул потоков против async")
+    db_load.add_argument("--clients", type=int, default=200)
+    db_load.add_argument("--requests", type=int, default=20)
+    db_load.set_defaults(func=bench_db_load)
+
+    batch = subparsers.add_parser("batch", help="Пакетные рекомендации: пользователей в секунду")
+    batch.add_argument("--users", type=int, default=2000)
+    batch.add_argument("--single-users", type=int, default=200, help="Пользователей для пути по одному")
+    batch.add_argument("--top-k", type=int, default=10)
+    batch.set_defaults(func=bench_batch)
+
+    populate = subparsers.add_parser("populate", help="Загрузка CSV в SQLite: построчно против --fast")
+    populate.add_argument("--events", type=int, default=200000)
+    populate.set_defaults(func=bench_populate)
+
+    export = subparsers.add_parser("export", help="Выгрузка таблицы: ORM страницы против потока")
+    export.add_argument("--table", choices=["events", "item_properties"], default="events")
+    export.add_argument("--formats", nargs="+", default=["ndjson", "csv", "arrow"])
+    export.add_argument("--legacy-rows", type=int, default=100000, help="Строк для постраничного пути")
+    export.set_defaults(func=bench_export)
+
+    ingest = subparsers.add_parser("ingest", help="Запись событий: по одному против очереди")
+    ingest.add_argument("--events", type=int, default=5000)
+    ingest.add_argument("--sync-events", type=int, default=1000, help="Событий для записи по одному")
+    ingest.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 500])
+    ingest.add_argument("--bulk-size", type=int, default=5000, help="Событий в пакетном запросе")
+    ingest.add_argument("--repeat", type=int, default=5)
+    ingest.set_defaults(func=bench_ingest)
+
+    user_features = subparsers.add_parser("user-features", help="Агрегаты пользователя: запрос против кэша")
+    user_features.add_argument("--users", type=int, default=500)
+    user_features.add_argument("--repeat", type=int, default=20)
+    user_features.set_defaults(func=bench_user_features)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Конвертация pickle-модели CatBoost в нативный формат .cbm.
+
+Использование:
+    python scripts/convert_model.py [путь_к_model.pkl] [путь_к_model.cbm]
+"""
+
+import os
+import pickle
+import sys
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.recommend.utils import _LEGACY_MODEL_PATH, _MODEL_PATH
+
+
+def main():
+    """Основная функция скрипта конвертации."""
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else _LEGACY_MODEL_PATH
+    target = Path(sys.argv[2]) if len(sys.argv) > 2 else _MODEL_PATH
+
+    if not source.exists():
+        raise FileNotFoundError(f"Модель не найдена по пути {source}")
+
+    with open(source, "rb") as f:
+        model = pickle.load(f)
+
+    model.save_model(str(target), format="cbm")
+    print(f"[convert_model] {source} → {target} ({target.stat().st_size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
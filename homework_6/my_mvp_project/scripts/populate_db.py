@@ -6,28 +6,57 @@
 - Свойства товаров  
 - События пользователей
 
+Режим --fast читает CSV потоково пачками по CHUNK_ROWS строк, фильтрует
+их векторизованными масками pandas и пишет через COPY FROM STDIN
+(PostgreSQL) или executemany (SQLite). Свойства товаров загружаются
+параллельно: файлы делятся на диапазоны байт, каждый диапазон пишется
+в свою промежуточную таблицу, которые в конце сливаются в item_properties.
+Вторичные индексы events и item_properties на время загрузки удаляются
+и создаются заново.
+
+Полная загрузка отмечает в ingest_checkpoints, до какого байта прочитан
+каждый файл. Режим --incremental дочитывает только строки, дописанные
+после отметки, и коммитит каждую пачку вместе с новой отметкой.
+
 Использование:
     python scripts/populate_db.py
+    python scripts/populate_db.py --fast --workers 4
+    python scripts/populate_db.py --incremental
 """
 
+import argparse
 import csv
+import io
+import multiprocessing
 import os
 import sys
 import time
+from contextlib import contextmanager
 from pathlib import Path
 import pandas as pd
 
-from sqlalchemy import text
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, Text, delete, event, select, text
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import Base, SessionLocal, engine
-from app.models import Category, Event, Item, ItemProperty, User
+from app.models import Category, Event, IngestCheckpoint, Item, ItemProperty, User
+from app.recommend.item_stats import rebuild_item_stats
+from app.recommend.property_snapshot import rebuild_item_properties_current
+from app.rollups import rebuild_event_rollups, record_events
 
 BATCH_SIZE = 5000
+# Размер пачки строк CSV в быстром режиме
+CHUNK_ROWS = int(os.getenv("CHUNK_ROWS", "500000"))
+# Диапазон байт файла свойств на одну задачу и блок чтения внутри него
+SHARD_BYTES = int(os.getenv("SHARD_BYTES", str(64 * 1024 * 1024)))
+SHARD_BLOCK_BYTES = int(os.getenv("SHARD_BLOCK_BYTES", str(16 * 1024 * 1024)))
+# Строка ingest_checkpoints, отмечающая, что item_stats и срез свойств устарели
+DERIVED_DIRTY_SOURCE = ":derived_tables"
 
 # Пути к файлам данных
 DATA_DIR = os.getenv("DATA_DIR", "data")
@@ -326,7 +355,8 @@ def load_events(session: Session, path_csv: str, use_test_split: bool = True):
     if use_test_split:
         # Загружаем ограниченное количество событий каждого пользователя из тестового набора
         print("[populate_db] Загрузка последних 5 событий каждого пользователя из тестового набора...")
-        events_df = pd.read_csv(path_csv)
+        # transactionid читается строкой, как в быстрой и инкрементальной загрузке ("4000", а не "4000.0")
+        events_df = pd.read_csv(path_csv, dtype={"transactionid": "string"})
         
         # Получаем пользователей из тестового набора (которые уже загружены в базу)
         test_user_ids = existing_user_ids
@@ -354,7 +384,7 @@ def load_events(session: Session, path_csv: str, use_test_split: bool = True):
                     "user_id": user_id,
                     "item_id": item_id,
                     "event_type": row['event'],
-                    "transaction_id": row['transactionid'] if pd.notna(row['transactionid']) and str(row['transactionid']).strip() else None,
+                    "transaction_id": row['transactionid'].strip() if pd.notna(row['transactionid']) and row['transactionid'].strip() else None,
                 }
                 batch.append(mapping)
 
@@ -449,34 +479,655 @@ def train_test_split_events(events, test_size=1):
     return train_events, test_events
 
 
+class Progress:
+    """Счётчик загруженных строк со скоростью загрузки."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def rate(self) -> float:
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+    def add(self, rows: int):
+        self.rows += rows
+        print(f"[populate_db]  → {self.label}: {self.rows} строк, {self.rate():.0f} rows/s")
+
+    def done(self):
+        elapsed = time.perf_counter() - self.started
+        print(
+            f"[populate_db]  → {self.label}: загружено {self.rows} строк за {elapsed:.1f}s "
+            f"({self.rate():.0f} rows/s)."
+        )
+
+
+def write_dataframe(connection, table, df: pd.DataFrame) -> int:
+    """Записать DataFrame в таблицу: COPY для PostgreSQL, executemany для остальных БД.
+
+    Имена колонок DataFrame должны совпадать с колонками таблицы.
+    """
+    if df.empty:
+        return 0
+    if connection.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        # Пустое поле в CSV без кавычек COPY читает как NULL
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        columns = ", ".join(df.columns)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+    else:
+        # executemany драйвера напрямую, без обработки параметров в SQLAlchemy
+        placeholder = "?" if connection.dialect.paramstyle == "qmark" else "%s"
+        columns = ", ".join(df.columns)
+        values = ", ".join([placeholder] * len(df.columns))
+        # tolist() отдаёт нативные типы Python, пропуски заменяются на None
+        rows = list(zip(*(df[column].astype(object).where(df[column].notna(), None).tolist() for column in df.columns)))
+        connection.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) VALUES ({values})", rows)
+    return len(df)
+
+
+@contextmanager
+def indexes_dropped(table):
+    """Удалить вторичные индексы таблицы на время загрузки и создать заново."""
+    indexes = list(table.indexes)
+    for index in indexes:
+        index.drop(bind=engine, checkfirst=True)
+    print(f"[populate_db] Индексы {table.name} удалены на время загрузки: {len(indexes)}")
+    try:
+        yield
+    finally:
+        started = time.perf_counter()
+        for index in indexes:
+            index.create(bind=engine, checkfirst=True)
+        print(f"[populate_db]  → Индексы {table.name} созданы заново за {time.perf_counter() - started:.1f}s")
+
+
+def _read_events_chunks(path_csv: str):
+    """Потоковое чтение events.csv пачками по CHUNK_ROWS строк."""
+    return pd.read_csv(
+        path_csv,
+        chunksize=CHUNK_ROWS,
+        dtype={
+            "timestamp": "int64",
+            "visitorid": "int64",
+            "event": "string",
+            "itemid": "int64",
+            "transactionid": "string",
+        },
+    )
+
+
+def collect_unique_ids_fast(events_csv: str) -> tuple[set, set]:
+    """Собирает пользователей и товары тестового набора за один потоковый проход.
+
+    Тестовый набор тот же, что в train_test_split_events: последняя
+    по порядку в файле покупка каждого пользователя.
+    """
+    print("[populate_db] Потоковый сбор тестового набора из событий...")
+    last_transactions = []
+    for chunk in _read_events_chunks(events_csv):
+        transactions = chunk.loc[chunk["event"] == "transaction", ["visitorid", "itemid"]]
+        last_transactions.append(transactions.drop_duplicates("visitorid", keep="last"))
+
+    test_events = pd.concat(last_transactions).drop_duplicates("visitorid", keep="last")
+    unique_visitors = set(test_events["visitorid"].tolist())
+    unique_items = set(test_events["itemid"].tolist())
+    print(f"[populate_db] Из test набора: {len(unique_visitors)} пользователей, {len(unique_items)} товаров")
+    return unique_visitors, unique_items
+
+
+def load_items_and_users_fast(unique_visitors: set, unique_items: set):
+    """Загружает пользователей и товары пачками через write_dataframe."""
+    for model, ids in ((User, unique_visitors), (Item, unique_items)):
+        table = model.__table__
+        with engine.connect() as connection:
+            if connection.execute(table.select().limit(1)).first() is not None:
+                print(f"[populate_db] Таблица '{table.name}' уже заполнена, пропуск.")
+                continue
+        progress = Progress(table.name)
+        frame = pd.DataFrame({"id": sorted(ids)})
+        for start in range(0, len(frame), CHUNK_ROWS):
+            with engine.begin() as connection:
+                progress.add(write_dataframe(connection, table, frame.iloc[start:start + CHUNK_ROWS]))
+        progress.done()
+
+
+def plan_shards(paths: list[str], shard_bytes: int) -> list[tuple[str, int, int]]:
+    """Разбить файлы на диапазоны байт (path, start, end) размером около shard_bytes."""
+    shards = []
+    for path in paths:
+        size = os.path.getsize(path)
+        for start in range(0, max(size, 1), shard_bytes):
+            shards.append((path, start, min(start + shard_bytes, size)))
+    return shards
+
+
+def iter_csv_blocks(path: str, start: int, end: int, block_bytes: int):
+    """Блоки целых строк CSV, начинающихся в диапазоне байт [start, end).
+
+    Строка принадлежит диапазону, в котором лежит её первый байт, поэтому
+    соседние диапазоны не теряют и не дублируют строки. Заголовок пропускается.
+    Значения с переводом строки внутри кавычек не поддерживаются.
+    """
+    with open(path, "rb") as f:
+        if start == 0:
+            f.readline()
+        else:
+            # Дочитываем строку, начатую в предыдущем диапазоне
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < end:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            block += f.readline()
+            if position + len(block) > end:
+                # Отбрасываем строки, которые начинаются за концом диапазона
+                cut = block.find(b"\n", end - position - 1)
+                block = block[: cut + 1] if cut >= 0 else block
+                yield block
+                break
+            position += len(block)
+            yield block
+
+
+def _staging_table(shard_no: int, dialect: str) -> Table:
+    """Промежуточная таблица шарда без индексов и ограничений."""
+    return Table(
+        f"item_properties_stage_{shard_no}",
+        MetaData(),
+        Column("timestamp", BigInteger),
+        Column("item_id", Integer),
+        Column("property", String),
+        Column("value", Text),
+        # UNLOGGED: промежуточные данные не пишутся в WAL
+        prefixes=["UNLOGGED"] if dialect == "postgresql" else [],
+    )
+
+
+def _parse_properties_block(block: bytes, known_items: pd.Index) -> tuple[pd.DataFrame, int]:
+    """Разобрать блок строк файла свойств и оставить свойства известных товаров.
+
+    Возвращает строки для item_properties и число прочитанных строк.
+    """
+    chunk = pd.read_csv(
+        io.BytesIO(block),
+        header=None,
+        names=["timestamp", "itemid", "property", "value"],
+        dtype={"timestamp": "Int64", "itemid": "Int64", "property": "string", "value": "string"},
+        keep_default_na=False,
+        na_values={"timestamp": [""], "itemid": [""]},
+    )
+    rows_read = len(chunk)
+    chunk = chunk.dropna(subset=["timestamp", "itemid"])
+    chunk = chunk[chunk["itemid"].isin(known_items)]
+    return chunk.rename(columns={"itemid": "item_id"}), rows_read
+
+
+# Товары, свойства которых загружаются, — заполняются в каждом воркере
+_known_items = None
+
+
+def _init_property_worker(item_ids: list[int]):
+    """Подготовить процесс пула: свои соединения с БД и набор товаров."""
+    global _known_items
+    # Соединения, унаследованные от родителя при fork, не переиспользуются
+    engine.dispose(close=False)
+    if engine.dialect.name == "sqlite":
+        # Запись в SQLite сериализуется: ждём блокировку вместо ошибки
+        @event.listens_for(engine, "connect")
+        def _busy_timeout(dbapi_connection, _):
+            dbapi_connection.execute("PRAGMA busy_timeout = 600000")
+
+    _known_items = pd.Index(item_ids)
+
+
+def _load_property_shard(task) -> tuple[int, int, int]:
+    """Отфильтровать диапазон файла свойств и записать его в промежуточную таблицу."""
+    shard_no, path, start, end = task
+    table = _staging_table(shard_no, engine.dialect.name)
+    rows_read = rows_written = 0
+    for block in iter_csv_blocks(path, start, end, SHARD_BLOCK_BYTES):
+        chunk, read = _parse_properties_block(block, _known_items)
+        rows_read += read
+        with engine.begin() as connection:
+            rows_written += write_dataframe(connection, table, chunk)
+    return shard_no, rows_read, rows_written
+
+
+def load_item_properties_fast(paths: list[str], item_ids: set, workers: int = 1):
+    """Параллельно загружает свойства товаров, которые есть в базе.
+
+    Файлы делятся на диапазоны байт по SHARD_BYTES; каждый диапазон читается
+    блоками по SHARD_BLOCK_BYTES, фильтруется по itemid и пишется своим
+    потоком COPY в промежуточную таблицу. В конце промежуточные таблицы
+    по порядку переносятся в item_properties и удаляются. Память воркера
+    ограничена размером блока, а не файла.
+    """
+    table = ItemProperty.__table__
+    with engine.connect() as connection:
+        if connection.execute(table.select().limit(1)).first() is not None:
+            print("[populate_db] Таблица 'item_properties' уже заполнена, пропуск.")
+            return
+
+    shards = plan_shards(paths, SHARD_BYTES)
+    staging = [_staging_table(shard_no, engine.dialect.name) for shard_no in range(len(shards))]
+    try:
+        for stage in staging:
+            stage.drop(bind=engine, checkfirst=True)
+            stage.create(bind=engine)
+        print(f"[populate_db] Загрузка свойств товаров: {len(shards)} диапазонов, {workers} процессов")
+
+        tasks = [(shard_no, *shard) for shard_no, shard in enumerate(shards)]
+        known_items = sorted(item_ids)
+        pool = None
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=_init_property_worker, initargs=(known_items,))
+            results = pool.imap_unordered(_load_property_shard, tasks)
+        else:
+            _init_property_worker(known_items)
+            results = map(_load_property_shard, tasks)
+
+        progress = Progress("item_properties (чтение CSV)")
+        written = 0
+        try:
+            for _, rows_read, rows_written in results:
+                written += rows_written
+                progress.add(rows_read)
+        finally:
+            if pool is not None:
+                # Все результаты получены или воркер упал: оставшиеся задачи не нужны
+                pool.terminate()
+                pool.join()
+        progress.done()
+        print(f"[populate_db]  → В промежуточные таблицы записано {written} строк, перенос в item_properties...")
+
+        started = time.perf_counter()
+        columns = "timestamp, item_id, property, value"
+        with indexes_dropped(table):
+            for stage in staging:
+                with engine.begin() as connection:
+                    connection.execute(
+                        text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {stage.name}")
+                    )
+                stage.drop(bind=engine)
+    finally:
+        # Промежуточные таблицы не остаются в базе и при ошибке воркера или переноса
+        for stage in staging:
+            stage.drop(bind=engine, checkfirst=True)
+    print(f"[populate_db]  → Перенос завершён за {time.perf_counter() - started:.1f}s")
+
+
+def load_events_fast(path_csv: str, user_ids: set, item_ids: set):
+    """Потоково загружает последние 5 событий каждого пользователя тестового набора."""
+    table = Event.__table__
+    with engine.connect() as connection:
+        if connection.execute(table.select().limit(1)).first() is not None:
+            print("[populate_db] Таблица 'events' уже заполнена, пропуск.")
+            return
+
+    known_users = pd.Index(sorted(user_ids))
+    known_items = pd.Index(sorted(item_ids))
+    user_events = [
+        chunk[chunk["visitorid"].isin(known_users)] for chunk in _read_events_chunks(path_csv)
+    ]
+    user_events = pd.concat(user_events, ignore_index=True)
+    # Устойчивая сортировка: при равном времени сохраняется порядок в файле
+    user_events = user_events.sort_values("timestamp", kind="stable").groupby("visitorid").tail(5)
+    user_events = user_events[user_events["itemid"].isin(known_items)]
+    user_events = user_events.rename(
+        columns={
+            "visitorid": "user_id",
+            "itemid": "item_id",
+            "event": "event_type",
+            "transactionid": "transaction_id",
+        }
+    )[["timestamp", "user_id", "item_id", "event_type", "transaction_id"]]
+    print(f"[populate_db] Найдено {len(user_events)} событий для {len(user_ids)} пользователей")
+
+    progress = Progress("events")
+    with indexes_dropped(table):
+        for start in range(0, len(user_events), CHUNK_ROWS):
+            with engine.begin() as connection:
+                progress.add(write_dataframe(connection, table, user_events.iloc[start:start + CHUNK_ROWS]))
+    progress.done()
+
+
+def _dialect_insert(connection, table):
+    """INSERT с ON CONFLICT для PostgreSQL и SQLite."""
+    if connection.dialect.name == "postgresql":
+        return insert(table)
+    return sqlite_insert(table)
+
+
+def get_checkpoint(connection, path: str) -> tuple[int, int | None, int]:
+    """Отметка файла: (byte_offset, max_timestamp, rows_loaded)."""
+    row = connection.execute(
+        select(
+            IngestCheckpoint.byte_offset, IngestCheckpoint.max_timestamp, IngestCheckpoint.rows_loaded
+        ).where(IngestCheckpoint.source == os.path.basename(path))
+    ).first()
+    return tuple(row) if row is not None else (0, None, 0)
+
+
+def save_checkpoint(connection, path: str, byte_offset: int, max_timestamp: int | None, rows_loaded: int):
+    """Сохранить отметку файла в текущей транзакции."""
+    values = {
+        "source": os.path.basename(path),
+        "byte_offset": byte_offset,
+        "max_timestamp": max_timestamp,
+        "rows_loaded": rows_loaded,
+        "updated_at": int(time.time() * 1000),
+    }
+    stmt = _dialect_insert(connection, IngestCheckpoint.__table__).values(**values)
+    stmt = stmt.on_conflict_do_update(index_elements=["source"], set_=values)
+    connection.execute(stmt)
+
+
+def _table_is_empty(connection, table) -> bool:
+    """Пуста ли таблица."""
+    return connection.execute(table.select().limit(1)).first() is None
+
+
+def unloaded_file_sizes(sources: dict[str, Table]) -> dict[str, int]:
+    """Размеры файлов, таблицы которых пусты и будут заполнены полной загрузкой.
+
+    Файлы уже заполненных таблиц полная загрузка пропускает: их строки,
+    дописанные после прошлой загрузки, не попадают в базу и не отмечаются.
+    """
+    with engine.connect() as connection:
+        return {
+            path: os.path.getsize(path) for path, table in sources.items() if _table_is_empty(connection, table)
+        }
+
+
+def mark_files_loaded(file_sizes: dict[str, int]):
+    """Отметить файлы полной загрузки прочитанными до размеров file_sizes.
+
+    Передаются только файлы, таблицы которых заполнила эта загрузка
+    (см. unloaded_file_sizes), поэтому прежние отметки перезаписываются.
+    """
+    with engine.begin() as connection:
+        for path, size in file_sizes.items():
+            save_checkpoint(connection, path, size, None, 0)
+
+
+def ensure_checkpoints(sources: dict[str, Table]):
+    """Создать нулевые отметки файлов, таблицы которых ещё пусты.
+
+    Если таблица заполнена, а отметки файла нет (база загружена до появления
+    ingest_checkpoints), неизвестно, какие строки файла уже в базе:
+    загрузка останавливается, чтобы не задвоить данные.
+    """
+    with engine.begin() as connection:
+        for path, table in sources.items():
+            source = os.path.basename(path)
+            exists = connection.execute(
+                select(IngestCheckpoint.source).where(IngestCheckpoint.source == source)
+            ).first()
+            if exists is not None:
+                continue
+            if not _table_is_empty(connection, table):
+                raise RuntimeError(
+                    f"Таблица {table.name} заполнена, но отметки загрузки {source} нет: "
+                    "неизвестно, какие строки файла уже загружены. Выполните полную загрузку "
+                    "в пустую базу или добавьте строку в ingest_checkpoints вручную"
+                )
+            save_checkpoint(connection, path, 0, None, 0)
+
+
+def mark_derived_dirty(connection):
+    """Отметить в текущей транзакции, что производные таблицы устарели."""
+    stmt = _dialect_insert(connection, IngestCheckpoint.__table__).values(
+        source=DERIVED_DIRTY_SOURCE, byte_offset=0, rows_loaded=0, updated_at=int(time.time() * 1000)
+    )
+    connection.execute(stmt.on_conflict_do_nothing(index_elements=["source"]))
+
+
+def derived_dirty() -> bool:
+    """Есть ли загруженные строки, по которым производные таблицы не пересчитаны."""
+    with engine.connect() as connection:
+        return connection.execute(
+            select(IngestCheckpoint.source).where(IngestCheckpoint.source == DERIVED_DIRTY_SOURCE)
+        ).first() is not None
+
+
+def clear_derived_dirty():
+    """Снять отметку после пересчёта производных таблиц."""
+    with engine.begin() as connection:
+        connection.execute(delete(IngestCheckpoint).where(IngestCheckpoint.source == DERIVED_DIRTY_SOURCE))
+
+
+def iter_new_blocks(path: str, byte_offset: int):
+    """Новые блоки целых строк файла после byte_offset: (блок, смещение после блока).
+
+    Недописанная последняя строка без перевода строки не читается,
+    она будет загружена при следующем запуске.
+    """
+    size = os.path.getsize(path)
+    if byte_offset > size:
+        raise RuntimeError(
+            f"Файл {path} короче отметки загрузки ({size} < {byte_offset} байт): "
+            "файл был заменён, удалите его строку из ingest_checkpoints"
+        )
+    if byte_offset == 0:
+        with open(path, "rb") as f:
+            byte_offset = len(f.readline())
+    for block in iter_csv_blocks(path, byte_offset, size, SHARD_BLOCK_BYTES):
+        if not block.endswith(b"\n"):
+            block = block[: block.rfind(b"\n") + 1]
+            if not block:
+                break
+        byte_offset += len(block)
+        yield block, byte_offset
+
+
+def _ignore_existing(connection, model, ids) -> None:
+    """Вставить отсутствующие id (пользователей или товаров), существующие пропустить."""
+    rows = [{"id": int(row_id)} for row_id in ids]
+    for start in range(0, len(rows), BATCH_SIZE):
+        stmt = _dialect_insert(connection, model.__table__).on_conflict_do_nothing(index_elements=["id"])
+        connection.execute(stmt, rows[start:start + BATCH_SIZE])
+
+
+def ingest_events_incremental(path_csv: str) -> int:
+    """Дозагрузить события, дописанные в файл после отметки.
+
+    Загружаются все новые события; новые пользователи и товары
+    добавляются upsert'ом. Каждая пачка коммитится вместе с отметкой,
+    поэтому прерванный запуск продолжается с последней пачки.
+    Предрассчитанные рекомендации затронутых пользователей удаляются.
+    """
+    with engine.connect() as connection:
+        byte_offset, max_timestamp, rows_loaded = get_checkpoint(connection, path_csv)
+    print(f"[populate_db] Инкрементальная загрузка событий из {path_csv} с байта {byte_offset}")
+
+    progress = Progress("events (инкрементально)")
+    for block, block_end in iter_new_blocks(path_csv, byte_offset):
+        chunk = pd.read_csv(
+            io.BytesIO(block),
+            header=None,
+            names=["timestamp", "visitorid", "event", "itemid", "transactionid"],
+            dtype={
+                "timestamp": "int64",
+                "visitorid": "int64",
+                "event": "string",
+                "itemid": "int64",
+                "transactionid": "string",
+            },
+        )
+        user_ids = chunk["visitorid"].unique().tolist()
+        events = chunk.rename(
+            columns={
+                "visitorid": "user_id",
+                "itemid": "item_id",
+                "event": "event_type",
+                "transactionid": "transaction_id",
+            }
+        )
+        if len(chunk):
+            block_max = int(chunk["timestamp"].max())
+            max_timestamp = block_max if max_timestamp is None else max(max_timestamp, block_max)
+        with engine.begin() as connection:
+            _ignore_existing(connection, User, user_ids)
+            _ignore_existing(connection, Item, chunk["itemid"].unique().tolist())
+            write_dataframe(connection, Event.__table__, events)
+            # Агрегаты событий обновляются в той же транзакции, что и пачка
+            record_events(
+                connection,
+                events[["user_id", "item_id", "event_type", "timestamp"]].itertuples(index=False, name=None),
+            )
+            rows_loaded += len(events)
+            save_checkpoint(connection, path_csv, block_end, max_timestamp, rows_loaded)
+            if len(events):
+                mark_derived_dirty(connection)
+        progress.add(len(events))
+    progress.done()
+    return progress.rows
+
+
+def ingest_item_properties_incremental(paths: list[str]) -> int:
+    """Дозагрузить свойства товаров, дописанные в файлы после отметок.
+
+    Как и при полной загрузке, берутся только свойства товаров из базы.
+    """
+    with engine.connect() as connection:
+        known_items = pd.Index(sorted(item_id for (item_id,) in connection.execute(select(Item.id))))
+
+    progress = Progress("item_properties (инкрементально)")
+    for path in paths:
+        with engine.connect() as connection:
+            byte_offset, max_timestamp, rows_loaded = get_checkpoint(connection, path)
+        print(f"[populate_db] Инкрементальная загрузка свойств из {path} с байта {byte_offset}")
+        for block, block_end in iter_new_blocks(path, byte_offset):
+            chunk, _ = _parse_properties_block(block, known_items)
+            if len(chunk):
+                block_max = int(chunk["timestamp"].max())
+                max_timestamp = block_max if max_timestamp is None else max(max_timestamp, block_max)
+            with engine.begin() as connection:
+                write_dataframe(connection, ItemProperty.__table__, chunk)
+                rows_loaded += len(chunk)
+                save_checkpoint(connection, path, block_end, max_timestamp, rows_loaded)
+                if len(chunk):
+                    mark_derived_dirty(connection)
+            progress.add(len(chunk))
+    progress.done()
+    return progress.rows
+
+
+def rebuild_derived_tables(session: Session, rollups: bool = True):
+    """Пересчитать таблицы, которые CRUD поддерживает инкрементально.
+
+    rollups=False — агрегаты событий уже обновлены инкрементальной загрузкой.
+    """
+    print("[populate_db] Пересчёт статистики товаров (item_stats)...")
+    stats_count = rebuild_item_stats(session)
+    print(f"[populate_db]  → Статистика рассчитана для {stats_count} товаров.")
+    print("[populate_db] Пересчёт среза свойств товаров (item_properties_current)...")
+    started = time.perf_counter()
+    snapshot_count = rebuild_item_properties_current(session)
+    print(f"[populate_db]  → Срез содержит {snapshot_count} строк ({time.perf_counter() - started:.1f}s).")
+    if rollups:
+        print("[populate_db] Пересчёт агрегатов событий (event_rollups_*)...")
+        started = time.perf_counter()
+        rollup_count = rebuild_event_rollups(session)
+        print(f"[populate_db]  → Агрегаты содержат {rollup_count} строк ({time.perf_counter() - started:.1f}s).")
+
+
+def run_incremental(item_prop_files: list[str]):
+    """Инкрементальная загрузка: только строки после отметок ingest_checkpoints.
+
+    Пачки коммитятся вместе с отметкой «производные таблицы устарели»,
+    которая снимается только после пересчёта. Поэтому запуск, прерванный
+    между загрузкой и пересчётом, пересчитает таблицы при повторе, даже
+    если новых строк уже нет.
+    """
+    print("[populate_db] Начало инкрементальной загрузки...")
+    started = time.perf_counter()
+    create_schema_with_retry()
+    sources = {EVENTS_FILE: Event.__table__}
+    sources.update((path, ItemProperty.__table__) for path in item_prop_files)
+    ensure_checkpoints(sources)
+    with SessionLocal() as session:
+        load_categories(session, CATEGORY_FILE)
+        ingest_events_incremental(EVENTS_FILE)
+        ingest_item_properties_incremental(item_prop_files)
+        if derived_dirty():
+            rebuild_derived_tables(session, rollups=False)
+            update_sequences(session)
+            clear_derived_dirty()
+    print(f"[populate_db] === Инкрементальная загрузка завершена за {time.perf_counter() - started:.1f}s ===")
+
+
 def main():
     """Основная функция скрипта загрузки данных."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fast", action="store_true", help="Потоковая загрузка через COPY/executemany")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Дозагрузить строки, дописанные после прошлой загрузки"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Процессов для загрузки свойств товаров (--fast)"
+    )
+    args = parser.parse_args()
+
     # Проверка наличия файлов данных
     item_prop_files = [ITEM_PROPS_FILE1, ITEM_PROPS_FILE2]
     check_files_exist([CATEGORY_FILE, EVENTS_FILE] + item_prop_files)
 
+    if args.incremental:
+        run_incremental(item_prop_files)
+        return
+
     # Используем тестовый набор для честной оценки модели
     use_test_split = True
-    print(f"[populate_db] Начало загрузки данных (test_split={use_test_split})...")
+    print(f"[populate_db] Начало загрузки данных (test_split={use_test_split}, fast={args.fast})...")
+    started = time.perf_counter()
     session = SessionLocal()
     try:
         create_schema_with_retry()
+        # Размеры файлов до загрузки: с этих мест продолжит инкрементальная загрузка
+        sources = {EVENTS_FILE: Event.__table__}
+        sources.update((path, ItemProperty.__table__) for path in item_prop_files)
+        file_sizes = unloaded_file_sizes(sources)
         load_categories(session, CATEGORY_FILE, use_test_split=use_test_split)
 
-        # Сначала собираем все ID из тестового набора
-        unique_visitors, unique_items = collect_unique_ids(EVENTS_FILE, item_prop_files, use_test_split=use_test_split)
+        if args.fast:
+            unique_visitors, unique_items = collect_unique_ids_fast(EVENTS_FILE)
+            load_items_and_users_fast(unique_visitors, unique_items)
+            # Связанные данные фильтруются по тому, что реально есть в базе
+            user_ids = {user_id for (user_id,) in session.query(User.id)}
+            item_ids = {item_id for (item_id,) in session.query(Item.id)}
+            load_item_properties_fast(item_prop_files, item_ids, workers=args.workers)
+            load_events_fast(EVENTS_FILE, user_ids, item_ids)
+        else:
+            # Сначала собираем все ID из тестового набора
+            unique_visitors, unique_items = collect_unique_ids(EVENTS_FILE, item_prop_files, use_test_split=use_test_split)
+
+            # Загружаем пользователей и товары
+            load_items_and_users(session, unique_visitors, unique_items, use_test_split=use_test_split)
 
-        # Загружаем пользователей и товары
-        load_items_and_users(session, unique_visitors, unique_items, use_test_split=use_test_split)
+            # Загружаем остальные данные
+            load_item_properties(session, item_prop_files)
+            load_events(session, EVENTS_FILE, use_test_split=use_test_split)
 
-        # Загружаем остальные данные
-        load_item_properties(session, item_prop_files)
-        load_events(session, EVENTS_FILE, use_test_split=use_test_split)
+        # Данные загружены в обход CRUD, поэтому пересчитываем производные таблицы
+        rebuild_derived_tables(session)
 
         # Обновляем последовательности
         update_sequences(session)
+        mark_files_loaded(file_sizes)
 
-        print("[populate_db] === Все данные из тестового набора успешно импортированы! ===")
+        print(
+            f"[populate_db] === Все данные из тестового набора успешно импортированы "
+            f"за {time.perf_counter() - started:.1f}s! ==="
+        )
     except Exception as e:
         print(f"[populate_db] Ошибка: {e}")
         session.rollback()
@@ -0,0 +1,137 @@
+"""Офлайн-расчёт рекомендаций для всех пользователей.
+
+Пользователи делятся на пачки, пачки оцениваются в пуле процессов тем же
+пакетным путём, что и POST /recommendations/batch, а топ-N каждого
+пользователя записывается в таблицу user_recommendations вместе с версией
+модели и временем расчёта. Каждая пачка коммитится отдельно, поэтому
+прерванное задание можно перезапустить: пользователи со свежим списком
+текущей версии модели пропускаются.
+
+Использование:
+    python scripts/precompute_recommendations.py --top-n 100 --workers 4
+    python scripts/precompute_recommendations.py --no-resume
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from typing import Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.common_utils import get_temporal_features
+from app.database import Base, SessionLocal, engine
+from app.models import User
+from app.recommend import candidates, precomputed
+from app.recommend.cache import configure_recommendation_cache
+from app.routers.recommendations import _generate_batch_recommendations, get_model
+
+# Модель воркера: загружается один раз на процесс
+_loaded = None
+
+
+def _init_worker(model_version: str):
+    """Подготовить процесс пула: свои соединения с БД, модель, без кэша."""
+    global _loaded
+    # Соединения, унаследованные от родителя при fork, не переиспользуются
+    engine.dispose(close=False)
+    configure_recommendation_cache(None)
+    _loaded = get_model()
+    if _loaded.version != model_version:
+        raise RuntimeError(
+            f"Воркер загрузил версию модели {_loaded.version}, ожидалась {model_version}"
+        )
+
+
+def _score_chunk(task) -> Tuple[int, int]:
+    """Рассчитать и сохранить рекомендации пачки пользователей.
+
+    Возвращает (число пользователей пачки, число сохранённых списков).
+    """
+    user_ids, top_n, temporal_features = task
+    with SessionLocal() as db:
+        # Отметка снимается до чтения истории: событие, пришедшее во время
+        # расчёта, сделает сохранённый список устаревшим
+        watermarks = precomputed.event_watermarks(db, user_ids)
+        # Индекс унаследован от родителя и не получает новых событий
+        candidates.get_candidate_index(db).reload_seen(db, user_ids)
+        results = [
+            (user_id, result)
+            for user_id, result in _generate_batch_recommendations(
+                user_ids, top_n, db, _loaded, temporal_features
+            )
+            if result is not None
+        ]
+        saved = precomputed.save_precomputed(db, results, top_n, _loaded.version, watermarks)
+        db.commit()
+    return len(user_ids), saved
+
+
+def main():
+    """Разбор аргументов и запуск расчёта."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-n", type=int, default=100, help="Рекомендаций на пользователя")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Пользователей в пачке")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов в пуле")
+    parser.add_argument("--no-resume", dest="resume", action="store_false", help="Пересчитать всех пользователей")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine, checkfirst=True)
+    configure_recommendation_cache(None)
+    loaded = get_model()
+
+    with SessionLocal() as db:
+        user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id)]
+        done = precomputed.fresh_user_ids(db, loaded.version, args.top_n) if args.resume else set()
+        # Индекс кандидатов строится до запуска пула: при fork воркеры его наследуют
+        candidates.get_candidate_index(db)
+
+    todo = [user_id for user_id in user_ids if user_id not in done]
+    print(
+        f"[precompute] Модель {loaded.version}: {len(user_ids)} пользователей, "
+        f"{len(done)} уже рассчитаны, осталось {len(todo)}."
+    )
+    if not todo:
+        return
+
+    temporal_features = get_temporal_features()
+    tasks = [
+        (todo[start:start + args.chunk_size], args.top_n, temporal_features)
+        for start in range(0, len(todo), args.chunk_size)
+    ]
+
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(loaded.version,))
+        results = pool.imap_unordered(_score_chunk, tasks)
+    else:
+        _init_worker(loaded.version)
+        results = map(_score_chunk, tasks)
+
+    started = time.perf_counter()
+    processed = saved_total = 0
+    try:
+        for chunk_users, saved in results:
+            processed += chunk_users
+            saved_total += saved
+            elapsed = time.perf_counter() - started
+            print(
+                f"[precompute] {processed}/{len(todo)} пользователей, "
+                f"{processed / elapsed:.1f} users/s"
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"[precompute] Готово: сохранено {saved_total} списков за {elapsed:.1f}s "
+        f"({processed / elapsed:.1f} users/s)."
+    )
+
+
+if __name__ == "__main__":
+    main()